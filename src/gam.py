@@ -23,7 +23,7 @@ For more information, see https://github.com/taers232c/GAM-N
 """
 
 __author__ = u'Ross Scroggs <ross.scroggs@gmail.com>'
-__version__ = u'4.03.20'
+__version__ = u'4.03.45'
 __license__ = u'Apache License 2.0 (http://www.apache.org/licenses/LICENSE-2.0)'
 
 import sys
@@ -31,23 +31,31 @@ import os
 import string
 import time
 import base64
+import calendar
 import codecs
 import collections
 import ConfigParser
+import copy
+import cPickle
 import csv
 import datetime
 from htmlentitydefs import name2codepoint
 from HTMLParser import HTMLParser
+import itertools
 import json
 import mimetypes
+import multiprocessing
 import platform
 import random
 import re
 import socket
 import StringIO
+import tempfile
+import threading
 
 import googleapiclient
 import googleapiclient.discovery
+import googleapiclient.discovery_cache.base
 import googleapiclient.errors
 import googleapiclient.http
 import httplib2
@@ -119,16 +127,22 @@ FN_LAST_UPDATE_CHECK_TXT = u'lastupdatecheck.txt'
 FN_OAUTH2SERVICE_JSON = u'oauth2service.json'
 FN_OAUTH2_TXT = u'oauth2.txt'
 FN_GAMCOMMANDS_TXT = u'GamCommands.txt'
+FN_INDEX_SQLITE = u'index.sqlite'
 MY_CUSTOMER = u'my_customer'
 
 # Global variables
 
-# CL_argv is a copy of sys.argv
-# CL_argvI is an index into CL_argv
-# CL_argvLen is len(CL_arvgv)
-CL_argv = []
-CL_argvI = 0
-CL_argvLen = 0
+# CL.argv is a copy of sys.argv
+# CL.argvI is an index into CL.argv
+# CL.argvLen is len(CL.argv)
+# Each thread has its own copy so that gam batch commands run in threads don't interfere
+class _CommandLine(threading.local):
+  def __init__(self):
+    self.argv = []
+    self.argvI = 0
+    self.argvLen = 0
+
+CL = _CommandLine()
 # The following GM_XXX constants are arbitrary but must be unique
 # Most errors print a message and bail out with a return code
 # Some commands want to set a non-zero return code but not bail
@@ -158,12 +172,57 @@ GM_MAP_ROLE_ID_TO_NAME = u'ri2n'
 GM_MAP_ROLE_NAME_TO_ID = u'rn2i'
 # Dictionary mapping User ID to Name
 GM_MAP_USER_ID_TO_NAME = u'ui2n'
+# Dictionary mapping SKU list to dictionary mapping lowercase user email address to the user's licenses, for the current command
+GM_MAP_USER_TO_LICENSES = u'u2lc'
+# Dictionary mapping uid <UID> to email address and customer <Domain> to customer ID, for the current command when uid_cache_ttl is 0
+GM_UID_CACHE = u'uidc'
 # GAM cache directory. If no_cache is True, this variable will be set to None
 GM_CACHE_DIR = u'gacd'
 # Reset GAM cache directory after discovery
 GM_CACHE_DISCOVERY_ONLY = u'gcdo'
+# Is this thread running a command from gam batch/csv with batch_mode threads
+GM_BATCH_THREAD = u'bthr'
+# Throttling error counters of the gam batch|csv running this thread's command, see BatchConcurrency
+GM_BATCH_THROTTLE = u'bthl'
+# Dictionary mapping API to (credentials, service) built in this thread by buildGAPIObject
+GM_CACHED_SERVICES = u'csvc'
+# Dictionary mapping API version, e.g. admin-directory_v1, to requests per second from api_rate_limits
+GM_API_RATE_LIMITS = u'arlm'
+# Service account token warm-up for the users of the current command
+GM_SVCACCT_TOKEN_WARMUP = u'stwu'
 #
-GM_Globals = {
+# Each thread has its own copy of GM_Globals, initialized from the values in the main thread;
+# GM_CACHED_SERVICES is not copied as httplib2.Http objects can't be shared between threads
+class _ThreadGlobals(object):
+  def __init__(self, values):
+    self._mainValues = values
+    self._local = threading.local()
+    self._local.values = values
+
+  def _values(self):
+    try:
+      return self._local.values
+    except AttributeError:
+      values = self._local.values = self._mainValues.copy()
+      values[GM_CACHED_SERVICES] = {}
+      return values
+
+  def __getitem__(self, key):
+    return self._values()[key]
+
+  def __setitem__(self, key, value):
+    self._values()[key] = value
+
+  # A helper thread of a command, e.g. a page prefetch thread, starts with a copy of the values of the command's thread
+  def getThreadValues(self):
+    values = self._values().copy()
+    values[GM_CACHED_SERVICES] = {}
+    return values
+
+  def setThreadValues(self, values):
+    self._local.values = values
+
+GM_Globals = _ThreadGlobals({
   GM_SYSEXITRC: 0,
   GM_GAM_PATH: os.path.dirname(os.path.realpath(__file__)) if not getattr(sys, u'frozen', False) else os.path.dirname(sys.executable),
   GM_WINDOWS: os.name == u'nt',
@@ -178,23 +237,36 @@ GM_Globals = {
   GM_MAP_ROLE_ID_TO_NAME: None,
   GM_MAP_ROLE_NAME_TO_ID: None,
   GM_MAP_USER_ID_TO_NAME: None,
+  GM_MAP_USER_TO_LICENSES: None,
+  GM_UID_CACHE: {},
   GM_CACHE_DIR: None,
   GM_CACHE_DISCOVERY_ONLY: False,
-  }
+  GM_BATCH_THREAD: False,
+  GM_BATCH_THROTTLE: None,
+  GM_CACHED_SERVICES: {},
+  GM_API_RATE_LIMITS: {},
+  GM_SVCACCT_TOKEN_WARMUP: None,
+  })
 #
 # Global variables defined by environment variables/signal files
 #
 # When retrieving lists of Google Drive activities from API, how many should be retrieved in each chunk
 GC_ACTIVITY_MAX_RESULTS = u'activity_max_results'
+# Maximum requests per second for selected APIs, shared by all GAM processes using the same cache_dir
+GC_API_RATE_LIMITS = u'api_rate_limits'
 # Automatically generate gam batch command if number of users specified in gam users xxx command exceeds this number
 # Default: 0, don't automatically generate gam batch commands
 GC_AUTO_BATCH_MIN = u'auto_batch_min'
+# How gam batch/csv run commands; processes: each command runs in its own process; threads: commands run in threads of the gam process
+GC_BATCH_MODE = u'batch_mode'
 # GAM cache directory
 GC_CACHE_DIR = u'cache_dir'
 # Character set of batch, csv, data files
 GC_CHARSET = u'charset'
 # Path to client_secrets.json
 GC_CLIENT_SECRETS_JSON = u'client_secrets_json'
+# Unix domain socket used by gam serve and gamclient.py
+GC_SERVE_SOCKET = u'serve_socket'
 # GAM config directory containing client_secrets.json, oauth2.txt, oauth2service.json, extra_args.txt
 GC_CONFIG_DIR = u'config_dir'
 # Column delimiter in CSV input file
@@ -219,6 +291,8 @@ GC_DRIVE_DIR = u'drive_dir'
 GC_DRIVE_MAX_RESULTS = u'drive_max_results'
 # Path to extra_args.txt
 GC_EXTRA_ARGS = u'extra_args'
+# Minutes for which the index built by gam refresh index is used to select users
+GC_INDEX_TTL = u'index_ttl'
 # When retrieving lists of Google Group members from API, how many should be retrieved in each chunk
 GC_MEMBER_MAX_RESULTS = u'member_max_results'
 # If no_browser is False, writeCSVfile won't open a browser when todrive is set
@@ -232,24 +306,36 @@ GC_NO_UPDATE_CHECK = u'no_update_check'
 GC_NO_VERIFY_SSL = u'no_verify_ssl'
 # Number of threads for gam batch
 GC_NUM_THREADS = u'num_threads'
+# Compress the CSV and JSON lines output of print commands with gzip
+GC_OUTPUT_GZIP = u'output_gzip'
+# Number of pages of results that print commands retrieve ahead of the page being processed
+GC_PREFETCH_PAGES = u'prefetch_pages'
 # Path to oauth2.txt
 GC_OAUTH2_TXT = u'oauth2_txt'
 # Path to oauth2service.json
 GC_OAUTH2SERVICE_JSON = u'oauth2service_json'
 # Convert newlines in text fields to "\n" in show commands
 GC_SHOW_CONVERT_CR_NL = u'show_convert_cr_nl'
+# Number of users ahead of the user being processed whose service account tokens are retrieved concurrently
+GC_TOKEN_WARMUP_USERS = u'token_warmup_users'
+# Email address prefixes by which lists of all Users are partitioned and retrieved concurrently
+GC_USER_LIST_PARTITIONS = u'user_list_partitions'
+# Minutes for which user UID to email address conversions are shared through cache_dir/uids.txt
+GC_UID_CACHE_TTL = u'uid_cache_ttl'
 # When retrieving lists of Users from API, how many should be retrieved in each chunk
 GC_USER_MAX_RESULTS = u'user_max_results'
 
 GC_Defaults = {
   GC_ACTIVITY_MAX_RESULTS: 100,
+  GC_API_RATE_LIMITS: u'',
   GC_AUTO_BATCH_MIN: 0,
+  GC_BATCH_MODE: u'processes',
   GC_CACHE_DIR: u'',
   GC_CHARSET: DEFAULT_CHARSET,
   GC_CLIENT_SECRETS_JSON: FN_CLIENT_SECRETS_JSON,
   GC_CONFIG_DIR: u'',
   GC_CSV_INPUT_COLUMN_DELIMITER: u',',
-  GC_CSV_OUTPUT_CONVERT_CR_NL: FALSE,
+  GC_CSV_OUTPUT_CONVERT_CR_NL: False,
   GC_CSV_OUTPUT_COLUMN_DELIMITER: u',',
   GC_CSV_OUTPUT_FIELD_DELIMITER: u' ',
   GC_CUSTOMER_ID: MY_CUSTOMER,
@@ -259,15 +345,22 @@ GC_Defaults = {
   GC_DRIVE_DIR: u'',
   GC_DRIVE_MAX_RESULTS: 1000,
   GC_EXTRA_ARGS: u'',
+  GC_INDEX_TTL: 0,
   GC_MEMBER_MAX_RESULTS: 200,
   GC_NO_BROWSER: False,
   GC_NO_CACHE: False,
   GC_NO_UPDATE_CHECK: False,
   GC_NO_VERIFY_SSL: False,
   GC_NUM_THREADS: 25,
+  GC_OUTPUT_GZIP: False,
   GC_OAUTH2_TXT: FN_OAUTH2_TXT,
   GC_OAUTH2SERVICE_JSON: FN_OAUTH2SERVICE_JSON,
-  GC_SHOW_CONVERT_CR_NL: FALSE,
+  GC_PREFETCH_PAGES: 0,
+  GC_SERVE_SOCKET: u'gam.sock',
+  GC_SHOW_CONVERT_CR_NL: False,
+  GC_TOKEN_WARMUP_USERS: 0,
+  GC_UID_CACHE_TTL: 0,
+  GC_USER_LIST_PARTITIONS: u'',
   GC_USER_MAX_RESULTS: 500,
   }
 
@@ -283,6 +376,7 @@ GC_TYPE_LANGUAGE = u'lang'
 GC_TYPE_STRING = u'stri'
 
 GC_VAR_TYPE = u'type'
+GC_VAR_CHOICES = u'chce'
 GC_VAR_ENVVAR = u'enva'
 GC_VAR_LIMITS = u'lmit'
 GC_VAR_SFFT = u'sfft'
@@ -290,13 +384,15 @@ GC_VAR_SIGFILE = u'sigf'
 
 GC_VAR_INFO = {
   GC_ACTIVITY_MAX_RESULTS: {GC_VAR_TYPE: GC_TYPE_INTEGER, GC_VAR_ENVVAR: u'GAM_ACTIVITY_MAX_RESULTS', GC_VAR_LIMITS: (1, 500)},
+  GC_API_RATE_LIMITS: {GC_VAR_TYPE: GC_TYPE_STRING, GC_VAR_ENVVAR: u'GAM_API_RATE_LIMITS'},
   GC_AUTO_BATCH_MIN: {GC_VAR_TYPE: GC_TYPE_INTEGER, GC_VAR_ENVVAR: u'GAM_AUTOBATCH', GC_VAR_LIMITS: (None, None)},
+  GC_BATCH_MODE: {GC_VAR_TYPE: GC_TYPE_CHOICE, GC_VAR_ENVVAR: u'GAM_BATCH_MODE', GC_VAR_CHOICES: [u'processes', u'threads']},
   GC_CACHE_DIR: {GC_VAR_TYPE: GC_TYPE_DIRECTORY, GC_VAR_ENVVAR: u'GAMCACHEDIR'},
   GC_CHARSET: {GC_VAR_TYPE: GC_TYPE_STRING, GC_VAR_ENVVAR: u'GAM_CHARSET'},
   GC_CLIENT_SECRETS_JSON: {GC_VAR_TYPE: GC_TYPE_FILE, GC_VAR_ENVVAR: u'CLIENTSECRETS'},
   GC_CONFIG_DIR: {GC_VAR_TYPE: GC_TYPE_DIRECTORY, GC_VAR_ENVVAR: u'GAMUSERCONFIGDIR'},
   GC_CSV_INPUT_COLUMN_DELIMITER: {GC_VAR_TYPE: GC_TYPE_STRING, GC_VAR_ENVVAR: u'GAM_CSV_INPUT_COLUMN_DELIMITER', GC_VAR_LIMITS: (1, 1)},
-  GC_CSV_OUTPUT_CONVERT_CR_NL: {GC_VAR_TYPE: GC_TYPE_BOOLEAN, GC_VAR_ENVVAR: u'GAM_CSV_OUTPUT_CONVERT_CR_NL', GC_VAR_SFFT: (FALSE, TRUE)},
+  GC_CSV_OUTPUT_CONVERT_CR_NL: {GC_VAR_TYPE: GC_TYPE_BOOLEAN, GC_VAR_ENVVAR: u'GAM_CSV_OUTPUT_CONVERT_CR_NL', GC_VAR_SFFT: (False, True)},
   GC_CSV_OUTPUT_COLUMN_DELIMITER: {GC_VAR_TYPE: GC_TYPE_STRING, GC_VAR_ENVVAR: u'GAM_CSV_OUTPUT_COLUMN_DELIMITER', GC_VAR_LIMITS: (1, 1)},
   GC_CSV_OUTPUT_FIELD_DELIMITER: {GC_VAR_TYPE: GC_TYPE_STRING, GC_VAR_ENVVAR: u'GAM_CSV_OUTPUT_FIELD_DELIMITER', GC_VAR_LIMITS: (1, 1)},
   GC_CUSTOMER_ID: {GC_VAR_TYPE: GC_TYPE_STRING, GC_VAR_ENVVAR: u'CUSTOMER_ID'},
@@ -306,15 +402,22 @@ GC_VAR_INFO = {
   GC_DRIVE_DIR: {GC_VAR_TYPE: GC_TYPE_DIRECTORY, GC_VAR_ENVVAR: u'GAMDRIVEDIR'},
   GC_DRIVE_MAX_RESULTS: {GC_VAR_TYPE: GC_TYPE_INTEGER, GC_VAR_ENVVAR: u'GAM_DRIVE_MAX_RESULTS', GC_VAR_LIMITS: (1, 1000)},
   GC_EXTRA_ARGS: {GC_VAR_TYPE: GC_TYPE_FILE, GC_VAR_SIGFILE: FN_EXTRA_ARGS_TXT, GC_VAR_SFFT: (u'', FN_EXTRA_ARGS_TXT)},
+  GC_INDEX_TTL: {GC_VAR_TYPE: GC_TYPE_INTEGER, GC_VAR_ENVVAR: u'GAM_INDEX_TTL', GC_VAR_LIMITS: (0, 10080)},
   GC_MEMBER_MAX_RESULTS: {GC_VAR_TYPE: GC_TYPE_INTEGER, GC_VAR_ENVVAR: u'GAM_MEMBER_MAX_RESULTS', GC_VAR_LIMITS: (1, 10000)},
   GC_NO_BROWSER: {GC_VAR_TYPE: GC_TYPE_BOOLEAN, GC_VAR_SIGFILE: u'nobrowser.txt', GC_VAR_SFFT: (False, True)},
   GC_NO_CACHE: {GC_VAR_TYPE: GC_TYPE_BOOLEAN, GC_VAR_SIGFILE: u'nocache.txt', GC_VAR_SFFT: (False, True)},
   GC_NO_UPDATE_CHECK: {GC_VAR_TYPE: GC_TYPE_BOOLEAN, GC_VAR_SIGFILE: u'noupdatecheck.txt', GC_VAR_SFFT: (False, True)},
   GC_NO_VERIFY_SSL: {GC_VAR_TYPE: GC_TYPE_BOOLEAN, GC_VAR_SIGFILE: u'noverifyssl.txt', GC_VAR_SFFT: (False, True)},
   GC_NUM_THREADS: {GC_VAR_TYPE: GC_TYPE_INTEGER, GC_VAR_ENVVAR: u'GAM_THREADS', GC_VAR_LIMITS: (1, None)},
+  GC_OUTPUT_GZIP: {GC_VAR_TYPE: GC_TYPE_BOOLEAN, GC_VAR_ENVVAR: u'GAM_OUTPUT_GZIP', GC_VAR_SFFT: (False, True)},
   GC_OAUTH2_TXT: {GC_VAR_TYPE: GC_TYPE_FILE, GC_VAR_ENVVAR: u'OAUTHFILE'},
   GC_OAUTH2SERVICE_JSON: {GC_VAR_TYPE: GC_TYPE_FILE, GC_VAR_ENVVAR: u'OAUTHSERVICEFILE'},
-  GC_SHOW_CONVERT_CR_NL: {GC_VAR_TYPE: GC_TYPE_BOOLEAN, GC_VAR_ENVVAR: u'GAM_SHOW_CONVERT_CR_NL', GC_VAR_SFFT: (FALSE, TRUE)},
+  GC_PREFETCH_PAGES: {GC_VAR_TYPE: GC_TYPE_INTEGER, GC_VAR_ENVVAR: u'GAM_PREFETCH_PAGES', GC_VAR_LIMITS: (0, 2)},
+  GC_SERVE_SOCKET: {GC_VAR_TYPE: GC_TYPE_FILE, GC_VAR_ENVVAR: u'GAM_SERVE_SOCKET'},
+  GC_SHOW_CONVERT_CR_NL: {GC_VAR_TYPE: GC_TYPE_BOOLEAN, GC_VAR_ENVVAR: u'GAM_SHOW_CONVERT_CR_NL', GC_VAR_SFFT: (False, True)},
+  GC_TOKEN_WARMUP_USERS: {GC_VAR_TYPE: GC_TYPE_INTEGER, GC_VAR_ENVVAR: u'GAM_TOKEN_WARMUP_USERS', GC_VAR_LIMITS: (0, 100)},
+  GC_UID_CACHE_TTL: {GC_VAR_TYPE: GC_TYPE_INTEGER, GC_VAR_ENVVAR: u'GAM_UID_CACHE_TTL', GC_VAR_LIMITS: (0, 10080)},
+  GC_USER_LIST_PARTITIONS: {GC_VAR_TYPE: GC_TYPE_STRING, GC_VAR_ENVVAR: u'GAM_USER_LIST_PARTITIONS'},
   GC_USER_MAX_RESULTS: {GC_VAR_TYPE: GC_TYPE_INTEGER, GC_VAR_ENVVAR: u'GAM_USER_MAX_RESULTS', GC_VAR_LIMITS: (1, 500)},
   }
 
@@ -536,6 +639,10 @@ GCP_UNKNOWN_JOB_ID = u'Unknown job id.'
 GCP_UNKNOWN_PRINTER = u'Unknown printer.'
 GCP_USER_IS_NOT_AUTHORIZED = u'User is not authorized.'
 #
+# Maximum number of requests in a batch HTTP request
+GAPI_BATCH_MAX_REQUESTS = 50
+# Size of each chunk of a resumable upload, a multiple of 256KB
+GAPI_UPLOAD_CHUNK_SIZE = 8*1024*1024
 GAPI_DEFAULT_RETRY_REASONS = [GAPI_QUOTA_EXCEEDED, GAPI_RATE_LIMIT_EXCEEDED, GAPI_USER_RATE_LIMIT_EXCEEDED, GAPI_BACKEND_ERROR, GAPI_INTERNAL_ERROR]
 GAPI_ACTIVITY_THROW_REASONS = [GAPI_SERVICE_NOT_AVAILABLE]
 GAPI_CALENDAR_THROW_REASONS = [GAPI_SERVICE_NOT_AVAILABLE, GAPI_AUTH_ERROR]
@@ -669,6 +776,7 @@ COLUMN_DELIMITER_ARGUMENT = [u'columndelimiter',]
 DATAFIELD_ARGUMENT = [u'datafield',]
 DATA_ARGUMENT = [u'data',]
 DELIMITER_ARGUMENT = [u'delimiter',]
+DRYRUN_ARGUMENT = [u'dryrun',]
 FILE_ARGUMENT = [u'file',]
 FROM_ARGUMENT = [u'from',]
 IDFIRST_ARGUMENT = [u'idfirst',]
@@ -790,12 +898,18 @@ PHRASE_WOULD_MAKE_MEMBERSHIP_CYCLE = u'Would make membership cycle'
 MESSAGE_API_ACCESS_CONFIG = u'API access is configured in your Control Panel under: Security-Show more-Advanced settings-Manage API client access'
 MESSAGE_API_ACCESS_DENIED = u'API access Denied.\n\nPlease make sure the Client ID: {0} is authorized for the API Scope(s): {1}'
 MESSAGE_BATCH_CSV_DASH_DEBUG_INCOMPATIBLE = u'"gam {0} - ..." is not compatible with debugging. Disable debugging by deleting debug.gam'
+MESSAGE_CONFIG_BATCH_MODE_THREADS_INCOMPATIBLE = u'"gam config ..." is not compatible with batch_mode threads or gam serve; set the variables before running gam batch|csv|serve'
+MESSAGE_GAM_SERVE_ALREADY_RUNNING = u'gam serve is already running on {0}'
+MESSAGE_GAM_SERVE_REQUIRES_UNIX_SOCKETS = u'gam serve requires Unix domain sockets which are not available on this platform'
+MESSAGE_GAM_REFRESH_INDEX_REQUIRES_SQLITE3 = u'gam refresh index requires the Python sqlite3 module which is not available'
+MESSAGE_GAM_SERVE_NOT_IN_BATCH_OR_SERVE = u'"gam serve" can not be run from gam batch|csv with batch_mode threads or from gam serve'
 MESSAGE_GAM_EXITING_FOR_UPDATE = u'GAM is now exiting so that you can overwrite this old version with the latest release'
 MESSAGE_GAM_OUT_OF_MEMORY = u'GAM has run out of memory. If this is a large G Suite instance, you should use a 64-bit version of GAM on Windows or a 64-bit version of Python on other systems.'
 MESSAGE_HEADER_NOT_FOUND_IN_CSV_HEADERS = u'Header "{0}" not found in CSV headers of "{1}".'
 MESSAGE_HELP_SYNTAX = u'Help: Syntax in file {0}\n'
 MESSAGE_HELP_WIKI = u'Help: Documentation is at {0}\n'
 MESSAGE_HIT_CONTROL_C_TO_UPDATE = u'\n\nHit CTRL+C to visit the GAM website and download the latest release or wait 15 seconds continue with this boring old version. GAM won\'t bother you with this announcement for 1 week or you can create a file named noupdatecheck.txt in the same location as gam.py or gam.exe and GAM won\'t ever check for updates.'
+MESSAGE_INVALID_API_RATE_LIMITS = u'Invalid api_rate_limits: {0}; expected <API>:<Number>(,<API>:<Number>)*, <API> is one of: {1}'
 MESSAGE_INVALID_JSON = u'The file {0} has an invalid format.'
 MESSAGE_NO_DISCOVERY_INFORMATION = u'No online discovery doc and {0} does not exist locally'
 MESSAGE_NO_PYTHON_SSL = u'You don\'t have the Python SSL module installed so we can\'t verify SSL Certificates. You can fix this by installing the Python SSL module or you can live on the edge and turn SSL validation off by creating a file named noverifyssl.txt in the same location as gam.exe / gam.py'
@@ -1012,14 +1126,14 @@ def noPythonSSLExit():
 
 def usageErrorExit(message, extraneous=False):
   if extraneous:
-    sys.stderr.write(convertUTF8(u'Command: {0} >>>{1}<<<\n'.format(makeQuotedList(CL_argv[:CL_argvI]),
-                                                                    makeQuotedList(CL_argv[CL_argvI:]))))
-  elif CL_argvI < CL_argvLen:
-    sys.stderr.write(convertUTF8(u'Command: {0} >>>{1}<<< {2}\n'.format(makeQuotedList(CL_argv[:CL_argvI]),
-                                                                        makeQuotedList([CL_argv[CL_argvI]]),
-                                                                        makeQuotedList(CL_argv[CL_argvI+1:]))))
+    sys.stderr.write(convertUTF8(u'Command: {0} >>>{1}<<<\n'.format(makeQuotedList(CL.argv[:CL.argvI]),
+                                                                    makeQuotedList(CL.argv[CL.argvI:]))))
+  elif CL.argvI < CL.argvLen:
+    sys.stderr.write(convertUTF8(u'Command: {0} >>>{1}<<< {2}\n'.format(makeQuotedList(CL.argv[:CL.argvI]),
+                                                                        makeQuotedList([CL.argv[CL.argvI]]),
+                                                                        makeQuotedList(CL.argv[CL.argvI+1:]))))
   else:
-    sys.stderr.write(convertUTF8(u'Command: {0} >>><<<\n'.format(makeQuotedList(CL_argv))))
+    sys.stderr.write(convertUTF8(u'Command: {0} >>><<<\n'.format(makeQuotedList(CL.argv))))
   stderrErrorMsg(message)
   sys.stderr.write(MESSAGE_HELP_SYNTAX.format(os.path.join(GM_Globals[GM_GAM_PATH], FN_GAMCOMMANDS_TXT)))
   sys.stderr.write(MESSAGE_HELP_WIKI.format(GAM_WIKI))
@@ -1029,7 +1143,7 @@ def usageErrorExit(message, extraneous=False):
 def csvFieldErrorExit(fieldName, fieldNames, backupArg=False, checkForCharset=False):
   if backupArg:
     putArgumentBack()
-    if checkForCharset and CL_argv[CL_argvI-1] == u'charset':
+    if checkForCharset and CL.argv[CL.argvI-1] == u'charset':
       putArgumentBack()
       putArgumentBack()
   usageErrorExit(MESSAGE_HEADER_NOT_FOUND_IN_CSV_HEADERS.format(fieldName, u','.join(fieldNames)))
@@ -1071,24 +1185,21 @@ def missingChoiceExit(choices):
 
 # Initialize arguments
 def initializeArguments(args):
-  global CL_argv, CL_argvI, CL_argvLen
-  CL_argv = args[:]
-  CL_argvI = 1
-  CL_argvLen = len(CL_argv)
+  CL.argv = args[:]
+  CL.argvI = 1
+  CL.argvLen = len(CL.argv)
 
 # Put back last argument
 def putArgumentBack():
-  global CL_argvI
-  CL_argvI -= 1
+  CL.argvI -= 1
 
 # Check if argument present
 def checkArgumentPresent(choices, required=False):
-  global CL_argvI
-  if CL_argvI < CL_argvLen:
-    choice = CL_argv[CL_argvI].strip().lower()
+  if CL.argvI < CL.argvLen:
+    choice = CL.argv[CL.argvI].strip().lower()
     if choice:
       if choice in choices:
-        CL_argvI += 1
+        CL.argvI += 1
         return choice
     if not required:
       return False
@@ -1099,36 +1210,34 @@ def checkArgumentPresent(choices, required=False):
 
 # Peek to see if argument present, do not advance
 def peekArgumentPresent(choices):
-  if CL_argvI < CL_argvLen:
-    choice = CL_argv[CL_argvI].strip().lower()
+  if CL.argvI < CL.argvLen:
+    choice = CL.argv[CL.argvI].strip().lower()
     if choice and choice in choices:
       return True
   return False
 
 # Check that there are no extraneous arguments at the end of the command line
 def checkForExtraneousArguments():
-  if CL_argvI < CL_argvLen:
-    usageErrorExit(ARGUMENT_ERROR_NAMES[ARGUMENT_EXTRANEOUS][[0, 1][CL_argvI+1 == CL_argvLen]], extraneous=True)
+  if CL.argvI < CL.argvLen:
+    usageErrorExit(ARGUMENT_ERROR_NAMES[ARGUMENT_EXTRANEOUS][[0, 1][CL.argvI+1 == CL.argvLen]], extraneous=True)
 
 # Get an argument, downshift, delete underscores
 def getArgument():
-  global CL_argvI
-  if CL_argvI < CL_argvLen:
-    argument = CL_argv[CL_argvI].lower()
+  if CL.argvI < CL.argvLen:
+    argument = CL.argv[CL.argvI].lower()
     if argument:
-      CL_argvI += 1
+      CL.argvI += 1
       return argument.replace(u'_', u'')
   missingArgumentExit(OB_ARGUMENT)
 
 def getBoolean():
-  global CL_argvI
-  if CL_argvI < CL_argvLen:
-    boolean = CL_argv[CL_argvI].strip().lower()
+  if CL.argvI < CL.argvLen:
+    boolean = CL.argv[CL.argvI].strip().lower()
     if boolean in TRUE_VALUES:
-      CL_argvI += 1
+      CL.argvI += 1
       return True
     if boolean in FALSE_VALUES:
-      CL_argvI += 1
+      CL.argvI += 1
       return False
     invalidChoiceExit(TRUE_FALSE)
   missingChoiceExit(TRUE_FALSE)
@@ -1139,9 +1248,8 @@ MAP_CHOICE = u'mapChoice'
 NO_DEFAULT = u'NoDefault'
 
 def getChoice(choices, **opts):
-  global CL_argvI
-  if CL_argvI < CL_argvLen:
-    choice = CL_argv[CL_argvI].strip().lower()
+  if CL.argvI < CL.argvLen:
+    choice = CL.argv[CL.argvI].strip().lower()
     if choice:
       if choice in opts.get(CHOICE_ALIASES, []):
         choice = opts[CHOICE_ALIASES][choice]
@@ -1150,7 +1258,7 @@ def getChoice(choices, **opts):
         if choice in opts.get(CHOICE_ALIASES, []):
           choice = opts[CHOICE_ALIASES][choice]
       if choice in choices:
-        CL_argvI += 1
+        CL.argvI += 1
         return choice if not opts.get(MAP_CHOICE, False) else choices[choice]
     if opts.get(DEFAULT_CHOICE, NO_DEFAULT) != NO_DEFAULT:
       return opts[DEFAULT_CHOICE]
@@ -1163,11 +1271,10 @@ COLORHEX_PATTERN = re.compile(r'#[0-9a-fA-F]{6}')
 COLORHEX_FORMAT_REQUIRED = u'#ffffff'
 
 def getColorHexAttribute():
-  global CL_argvI
-  if CL_argvI < CL_argvLen:
-    tg = COLORHEX_PATTERN.match(CL_argv[CL_argvI].strip())
+  if CL.argvI < CL.argvLen:
+    tg = COLORHEX_PATTERN.match(CL.argv[CL.argvI].strip())
     if tg:
-      CL_argvI += 1
+      CL.argvI += 1
       return tg.group(0)
     invalidArgumentExit(COLORHEX_FORMAT_REQUIRED)
   missingArgumentExit(COLORHEX_FORMAT_REQUIRED)
@@ -1183,20 +1290,18 @@ def addCourseIdScope(courseId):
   return courseId
 
 def getCourseId():
-  global CL_argvI
-  if CL_argvI < CL_argvLen:
-    courseId = CL_argv[CL_argvI]
+  if CL.argvI < CL.argvLen:
+    courseId = CL.argv[CL.argvI]
     if courseId:
-      CL_argvI += 1
+      CL.argvI += 1
       return addCourseIdScope(courseId)
   missingArgumentExit(OB_COURSE_ID)
 
 def getCourseAlias():
-  global CL_argvI
-  if CL_argvI < CL_argvLen:
-    courseAlias = CL_argv[CL_argvI]
+  if CL.argvI < CL.argvLen:
+    courseAlias = CL.argv[CL.argvI]
     if courseAlias:
-      CL_argvI += 1
+      CL.argvI += 1
       if courseAlias[:2] != u'd:':
         return u'd:{0}'.format(courseAlias)
       return courseAlias
@@ -1241,15 +1346,14 @@ def normalizeStudentGuardianEmailAddressOrUID(emailAddressOrUID):
   return normalizeEmailAddressOrUID(emailAddressOrUID)
 
 def getEmailAddress(noUid=False, minLen=1, optional=False):
-  global CL_argvI
-  if CL_argvI < CL_argvLen:
-    emailAddress = CL_argv[CL_argvI].strip().lower()
+  if CL.argvI < CL.argvLen:
+    emailAddress = CL.argv[CL.argvI].strip().lower()
     if emailAddress:
       cg = UID_PATTERN.match(emailAddress)
       if cg:
         if not noUid:
           if cg.group(1):
-            CL_argvI += 1
+            CL.argvI += 1
             return cg.group(1)
         else:
           invalidArgumentExit(u'name@domain')
@@ -1258,48 +1362,47 @@ def getEmailAddress(noUid=False, minLen=1, optional=False):
         if atLoc == -1:
           if GC_Values[GC_DOMAIN]:
             emailAddress = u'{0}@{1}'.format(emailAddress, GC_Values[GC_DOMAIN])
-          CL_argvI += 1
+          CL.argvI += 1
           return emailAddress
         if atLoc != 0:
           if (atLoc == len(emailAddress)-1) and GC_Values[GC_DOMAIN]:
             emailAddress = u'{0}{1}'.format(emailAddress, GC_Values[GC_DOMAIN])
-          CL_argvI += 1
+          CL.argvI += 1
           return emailAddress
         invalidArgumentExit(u'name@domain')
     if optional:
-      CL_argvI += 1
+      CL.argvI += 1
       return None
     elif minLen == 0:
-      CL_argvI += 1
+      CL.argvI += 1
       return u''
   elif optional:
     return None
   missingArgumentExit([OB_EMAIL_ADDRESS_OR_UID, OB_EMAIL_ADDRESS][noUid])
 
 def getPermissionId():
-  global CL_argvI
-  if CL_argvI < CL_argvLen:
-    emailAddress = CL_argv[CL_argvI].strip().lower()
+  if CL.argvI < CL.argvLen:
+    emailAddress = CL.argv[CL.argvI].strip().lower()
     if emailAddress:
       if emailAddress[:3] == u'id:':
-        CL_argvI += 1
-        return (False, CL_argv[CL_argvI-1].strip()[3:])
+        CL.argvI += 1
+        return (False, CL.argv[CL.argvI-1].strip()[3:])
       atLoc = emailAddress.find(u'@')
       if atLoc == -1:
         if emailAddress == u'anyone':
-          CL_argvI += 1
+          CL.argvI += 1
           return (False, emailAddress)
         if emailAddress == u'anyonewithlink':
-          CL_argvI += 1
+          CL.argvI += 1
           return (False, u'anyoneWithLink')
         if GC_Values[GC_DOMAIN]:
           emailAddress = u'{0}@{1}'.format(emailAddress, GC_Values[GC_DOMAIN])
-        CL_argvI += 1
+        CL.argvI += 1
         return (True, emailAddress)
       if atLoc != 0:
         if (atLoc == len(emailAddress)-1) and GC_Values[GC_DOMAIN]:
           emailAddress = u'{0}{1}'.format(emailAddress, GC_Values[GC_DOMAIN])
-        CL_argvI += 1
+        CL.argvI += 1
         return (True, emailAddress)
       invalidArgumentExit(u'name@domain')
   missingArgumentExit(OB_PERMISSION_ID)
@@ -1411,10 +1514,9 @@ GOOGLE_SKU_CHOICES_MAP = {
   }
 
 def getGoogleProductListMap():
-  global CL_argvI
-  if CL_argvI < CL_argvLen:
+  if CL.argvI < CL.argvLen:
     productsOK = True
-    products = CL_argv[CL_argvI].replace(u',', u' ').split()
+    products = CL.argv[CL.argvI].replace(u',', u' ').split()
     productsMapped = []
     for product in products:
       if product in GOOGLE_PRODUCTS:
@@ -1426,16 +1528,15 @@ def getGoogleProductListMap():
         else:
           productsOK = False
     if productsOK:
-      CL_argvI += 1
+      CL.argvI += 1
       return productsMapped
     invalidChoiceExit(GOOGLE_SKU_CHOICES_MAP)
   missingArgumentExit(OB_PRODUCT_ID_LIST)
 
 def getGoogleSKUMap(matchProduct=None):
-  global CL_argvI
-  if CL_argvI < CL_argvLen:
+  if CL.argvI < CL.argvLen:
     skuOK = True
-    sku = CL_argv[CL_argvI].strip()
+    sku = CL.argv[CL.argvI].strip()
     if sku:
       if sku not in GOOGLE_SKUS:
         sku = sku.lower()
@@ -1445,16 +1546,15 @@ def getGoogleSKUMap(matchProduct=None):
           skuOK = False
       if skuOK:
         if (not matchProduct) or (GOOGLE_SKUS[sku] == matchProduct):
-          CL_argvI += 1
+          CL.argvI += 1
           return sku
       invalidChoiceExit(GOOGLE_SKU_CHOICES_MAP)
   missingArgumentExit(OB_SKU_ID)
 
 def getGoogleSKUListMap():
-  global CL_argvI
-  if CL_argvI < CL_argvLen:
+  if CL.argvI < CL.argvLen:
     skusOK = True
-    skus = CL_argv[CL_argvI].replace(u',', u' ').split()
+    skus = CL.argv[CL.argvI].replace(u',', u' ').split()
     skusMapped = []
     for sku in skus:
       if sku in GOOGLE_SKUS:
@@ -1466,7 +1566,7 @@ def getGoogleSKUListMap():
         else:
           skusOK = False
     if skusOK:
-      CL_argvI += 1
+      CL.argvI += 1
       return skusMapped
     invalidChoiceExit(GOOGLE_SKU_CHOICES_MAP)
   missingArgumentExit(OB_SKU_ID_LIST)
@@ -1481,12 +1581,11 @@ def integerLimits(minVal, maxVal, item=u'integer'):
   return u'{0} x'.format(item)
 
 def getInteger(minVal=None, maxVal=None):
-  global CL_argvI
-  if CL_argvI < CL_argvLen:
+  if CL.argvI < CL.argvLen:
     try:
-      number = int(CL_argv[CL_argvI].strip())
+      number = int(CL.argv[CL.argvI].strip())
       if ((minVal is None) or (number >= minVal)) and ((maxVal is None) or (number <= maxVal)):
-        CL_argvI += 1
+        CL.argvI += 1
         return number
     except ValueError:
       pass
@@ -1519,43 +1618,40 @@ def makeOrgUnitPathRelative(path):
   return path.rstrip(u'/')
 
 def getOrgUnitPath(absolutePath=True):
-  global CL_argvI
-  if CL_argvI < CL_argvLen:
-    path = CL_argv[CL_argvI].strip()
+  if CL.argvI < CL.argvLen:
+    path = CL.argv[CL.argvI].strip()
     if path:
-      CL_argvI += 1
+      CL.argvI += 1
       if absolutePath:
         return makeOrgUnitPathAbsolute(path)
       return makeOrgUnitPathRelative(path)
   missingArgumentExit(OB_ORGUNIT_PATH)
 
 def getREPattern():
-  global CL_argvI
-  if CL_argvI < CL_argvLen:
-    patstr = CL_argv[CL_argvI]
+  if CL.argvI < CL.argvLen:
+    patstr = CL.argv[CL.argvI]
     if patstr:
       try:
         pattern = re.compile(patstr)
-        CL_argvI += 1
+        CL.argvI += 1
         return pattern
       except re.error as e:
         usageErrorExit(u'{0} {1}: {2}'.format(OB_RE_PATTERN, PHRASE_ERROR, e))
   missingArgumentExit(OB_RE_PATTERN)
 
 def getString(item, checkBlank=False, optional=False, minLen=1, maxLen=None):
-  global CL_argvI
-  if CL_argvI < CL_argvLen:
-    argstr = CL_argv[CL_argvI]
+  if CL.argvI < CL.argvLen:
+    argstr = CL.argv[CL.argvI]
     if argstr:
       if checkBlank:
         if argstr.isspace():
           blankArgumentExit(item)
       if (len(argstr) >= minLen) and ((maxLen is None) or (len(argstr) <= maxLen)):
-        CL_argvI += 1
+        CL.argvI += 1
         return argstr
       invalidArgumentExit(u'{0} for {1}'.format(integerLimits(minLen, maxLen, PHRASE_STRING_LENGTH), item))
     if optional or (minLen == 0):
-      CL_argvI += 1
+      CL.argvI += 1
       return u''
     emptyArgumentExit(item)
   elif optional:
@@ -1572,20 +1668,19 @@ YYYYMMDD_FORMAT = u'%Y-%m-%d'
 YYYYMMDD_FORMAT_REQUIRED = u'yyyy-mm-dd'
 
 def getYYYYMMDD(minLen=1, returnTimeStamp=False):
-  global CL_argvI
-  if CL_argvI < CL_argvLen:
-    argstr = CL_argv[CL_argvI].strip()
+  if CL.argvI < CL.argvLen:
+    argstr = CL.argv[CL.argvI].strip()
     if argstr:
       try:
         timeStamp = time.mktime(datetime.datetime.strptime(argstr, YYYYMMDD_FORMAT).timetuple())*1000
-        CL_argvI += 1
+        CL.argvI += 1
         if not returnTimeStamp:
           return argstr
         return timeStamp
       except ValueError:
         invalidArgumentExit(YYYYMMDD_FORMAT_REQUIRED)
     elif minLen == 0:
-      CL_argvI += 1
+      CL.argvI += 1
       return u''
   missingArgumentExit(YYYYMMDD_FORMAT_REQUIRED)
 
@@ -1593,13 +1688,12 @@ YYYYMMDD_HHMM_FORMAT = u'%Y-%m-%d %H:%M'
 YYYYMMDD_HHMM_FORMAT_REQUIRED = u'yyyy-mm-dd hh:mm'
 
 def getYYYYMMDD_HHMM():
-  global CL_argvI
-  if CL_argvI < CL_argvLen:
-    argstr = CL_argv[CL_argvI].strip().upper().replace(u'T', u' ')
+  if CL.argvI < CL.argvLen:
+    argstr = CL.argv[CL.argvI].strip().upper().replace(u'T', u' ')
     if argstr:
       try:
         datetime.datetime.strptime(argstr, YYYYMMDD_HHMM_FORMAT)
-        CL_argvI += 1
+        CL.argvI += 1
         return argstr
       except ValueError:
         invalidArgumentExit(YYYYMMDD_HHMM_FORMAT_REQUIRED)
@@ -1608,13 +1702,12 @@ def getYYYYMMDD_HHMM():
 YYYYMMDDTHHMMSS_FORMAT_REQUIRED = u'yyyy-mm-ddThh:mm:ss[.fff]Z|+hh:mm|-hh:mm'
 
 def getFullTime(returnDateTime=False):
-  global CL_argvI
-  if CL_argvI < CL_argvLen:
-    argstr = CL_argv[CL_argvI].strip().upper().replace(u' ', u'T')
+  if CL.argvI < CL.argvLen:
+    argstr = CL.argv[CL.argvI].strip().upper().replace(u' ', u'T')
     if argstr:
       try:
         fullDateTime, tz = iso8601.parse_date(argstr)
-        CL_argvI += 1
+        CL.argvI += 1
         if not returnDateTime:
           return argstr.replace(u' ', u'T')
         return (fullDateTime, tz, argstr.replace(u' ', u'T'))
@@ -1626,10 +1719,9 @@ def getFullTime(returnDateTime=False):
 EVENT_TIME_FORMAT_REQUIRED = u'allday yyyy-mm-dd | yyyy-mm-ddThh:mm:ss[.fff]Z|+hh:mm|-hh:mm'
 
 def getEventTime():
-  global CL_argvI
-  if CL_argvI < CL_argvLen:
-    if CL_argv[CL_argvI].strip().lower() == u'allday':
-      CL_argvI += 1
+  if CL.argvI < CL.argvLen:
+    if CL.argv[CL.argvI].strip().lower() == u'allday':
+      CL.argvI += 1
       return {u'date': getYYYYMMDD()}
     return {u'dateTime': getFullTime()}
   missingArgumentExit(EVENT_TIME_FORMAT_REQUIRED)
@@ -1638,9 +1730,8 @@ AGE_TIME_PATTERN = re.compile(r'^(\d+)([mhd]?)$')
 AGE_TIME_FORMAT_REQUIRED = u'<Number>[m|h|d]'
 
 def getAgeTime():
-  global CL_argvI
-  if CL_argvI < CL_argvLen:
-    tg = AGE_TIME_PATTERN.match(CL_argv[CL_argvI].strip().lower())
+  if CL.argvI < CL.argvLen:
+    tg = AGE_TIME_PATTERN.match(CL.argv[CL.argvI].strip().lower())
     if tg:
       tgg = tg.groups(u'0')
       age = int(tgg[0])
@@ -1652,7 +1743,7 @@ def getAgeTime():
         age = now-(age*SECONDS_PER_HOUR)
       else: # age_unit == u'd':
         age = now-(age*SECONDS_PER_DAY)
-      CL_argvI += 1
+      CL.argvI += 1
       return age*1000
     invalidArgumentExit(AGE_TIME_FORMAT_REQUIRED)
   missingArgumentExit(AGE_TIME_FORMAT_REQUIRED)
@@ -1663,8 +1754,8 @@ def getCalendarReminder(allowClearNone=False):
   methods = CALENDAR_REMINDER_METHODS
   if allowClearNone:
     methods += CLEAR_NONE_ARGUMENT
-  if CL_argvI < CL_argvLen:
-    method = CL_argv[CL_argvI].strip()
+  if CL.argvI < CL.argvLen:
+    method = CL.argv[CL.argvI].strip()
     if not method.isdigit():
       method = getChoice(methods)
       minutes = getInteger(minVal=0, maxVal=40320)
@@ -1703,9 +1794,8 @@ MAX_MESSAGE_BYTES_PATTERN = re.compile(r'^(\d+)([mkb]?)$')
 MAX_MESSAGE_BYTES_FORMAT_REQUIRED = u'<Number>[m|k|b]'
 
 def getMaxMessageBytes():
-  global CL_argvI
-  if CL_argvI < CL_argvLen:
-    tg = MAX_MESSAGE_BYTES_PATTERN.match(CL_argv[CL_argvI].strip().lower())
+  if CL.argvI < CL.argvLen:
+    tg = MAX_MESSAGE_BYTES_PATTERN.match(CL.argv[CL.argvI].strip().lower())
     if tg:
       tgg = tg.groups(u'0')
       mmb = int(tgg[0])
@@ -1714,7 +1804,7 @@ def getMaxMessageBytes():
         mmb *= ONE_MEGA_BYTES
       elif mmb_unit == u'k':
         mmb *= ONE_KILO_BYTES
-      CL_argvI += 1
+      CL.argvI += 1
       return mmb
     invalidArgumentExit(MAX_MESSAGE_BYTES_FORMAT_REQUIRED)
   missingArgumentExit(MAX_MESSAGE_BYTES_FORMAT_REQUIRED)
@@ -1950,6 +2040,19 @@ def SetGlobalVariables():
         except ValueError:
           number = GC_Defaults[itemName]
         value = number
+      elif itemEntry[GC_VAR_TYPE] == GC_TYPE_CHOICE:
+        value = value.lower()
+        if value not in itemEntry[GC_VAR_CHOICES]:
+          value = GC_Defaults[itemName]
+      elif itemEntry[GC_VAR_TYPE] == GC_TYPE_BOOLEAN:
+        if isinstance(value, basestring):
+          value = value.lower()
+          if value in TRUE_VALUES:
+            value = True
+          elif value in FALSE_VALUES:
+            value = False
+          else:
+            value = GC_Defaults[itemName]
       GC_Defaults[itemName] = value
 
   def _getCfgDirectory(itemName):
@@ -1990,7 +2093,7 @@ def SetGlobalVariables():
       _getDefault(itemName, itemEntry)
 # config [<VariableName> <Value>]* [verify]
   if checkArgumentPresent([u'config',]):
-    while CL_argvI < CL_argvLen:
+    while CL.argvI < CL.argvLen:
       if checkArgumentPresent([u'verify',]):
         _verifyValues()
       else:
@@ -2002,6 +2105,8 @@ def SetGlobalVariables():
         elif GC_VAR_INFO[itemName][GC_VAR_TYPE] == GC_TYPE_INTEGER:
           minVal, maxVal = GC_VAR_INFO[itemName][GC_VAR_LIMITS]
           value = getInteger(minVal=minVal, maxVal=maxVal)
+        elif GC_VAR_INFO[itemName][GC_VAR_TYPE] == GC_TYPE_CHOICE:
+          value = getChoice(GC_VAR_INFO[itemName][GC_VAR_CHOICES])
         else:
           value = getString(OB_STRING)
         GC_Defaults[itemName] = value
@@ -2030,8 +2135,9 @@ def SetGlobalVariables():
     GM_Globals[GM_EXTRA_ARGS_LIST].extend(ea_config.items(u'extra-args'))
   if GC_Values[GC_NO_CACHE]:
     GM_Globals[GM_CACHE_DIR] = None
+  GM_Globals[GM_API_RATE_LIMITS] = getAPIRateLimits(GC_Values[GC_API_RATE_LIMITS])
 # If there are more arguments on the command line, return True
-  return (CL_argvI == 1) or (CL_argvI < CL_argvLen)
+  return (CL.argvI == 1) or (CL.argvI < CL.argvLen)
 
 def doGAMCheckForUpdates(forceCheck=False):
   import urllib2
@@ -2093,6 +2199,163 @@ def handleOAuthTokenError(e, soft_errors):
       systemErrorExit(19, MESSAGE_SERVICE_NOT_APPLICABLE.format(GM_Globals[GM_CURRENT_API_USER]))
   systemErrorExit(18, u'Authentication Token Error - {0}'.format(e))
 
+# Values that are shared by all threads and processes until they expire are kept in memory and in a file in cache_dir,
+# a log of key<tab>value<tab>expiry lines; it is appended to while holding a lock on the matching .lock file and each
+# process reads only the lines added since its last read. When it grows too large it is rewritten without the expired
+# values and is then allowed to grow to twice its rewritten size. A value is returned by get until expiryMargin seconds
+# before it expires; the file is used while persist() is True.
+CACHE_FILE_MAX_SIZE = 4*1024*1024
+
+class _CacheFile(object):
+  def __init__(self, fileName, expiryMargin, persist):
+    self._fileName = fileName
+    self._expiryMargin = expiryMargin
+    self._persist = persist
+    self._lock = threading.Lock()
+    self._values = {}
+    self._inode = None
+    self._offset = 0
+    self._maxSize = CACHE_FILE_MAX_SIZE
+
+  def _paths(self):
+    if not self._persist():
+      return (None, None)
+    if not os.path.isdir(GC_Values[GC_CACHE_DIR]):
+      try:
+        os.makedirs(GC_Values[GC_CACHE_DIR])
+      except OSError:
+        return (None, None)
+    cacheFile = os.path.join(GC_Values[GC_CACHE_DIR], self._fileName)
+    return (cacheFile, os.path.splitext(cacheFile)[0]+u'.lock')
+
+  def _readFile(self, cacheFile):
+    try:
+      with open(cacheFile, u'rb') as f:
+        status = os.fstat(f.fileno())
+        if (status.st_ino != self._inode) or (status.st_size < self._offset):
+          self._inode = status.st_ino
+          self._offset = 0
+        f.seek(self._offset)
+        data = f.read()
+    except IOError:
+      return
+    end = data.rfind(b'\n')+1
+    self._offset += end
+    for line in data[:end].decode(u'utf-8').splitlines():
+      try:
+        key, value, expiry = line.split(u'\t')
+        self._values[key] = (value, float(expiry))
+      except ValueError:
+        pass
+
+  def _writeFile(self, cacheFile, values):
+    lines = b''.join([u'{0}\t{1}\t{2!r}\n'.format(key, value, expiry).encode(u'utf-8') for key, value, expiry in values])
+    if self._offset+len(lines) <= self._maxSize:
+      fd = os.open(cacheFile, os.O_WRONLY|os.O_APPEND|os.O_CREAT, 0o600)
+      try:
+        os.write(fd, lines)
+        status = os.fstat(fd)
+        self._inode = status.st_ino
+        self._offset = status.st_size
+      finally:
+        os.close(fd)
+      return
+    now = time.time()
+    for valueKey in [valueKey for valueKey, valueData in self._values.iteritems() if valueData[1] <= now]:
+      del self._values[valueKey]
+    newCacheFile = cacheFile+u'.new'
+    fd = os.open(newCacheFile, os.O_WRONLY|os.O_TRUNC|os.O_CREAT, 0o600)
+    try:
+      for valueKey, valueData in self._values.iteritems():
+        os.write(fd, u'{0}\t{1}\t{2!r}\n'.format(valueKey, valueData[0], valueData[1]).encode(u'utf-8'))
+      status = os.fstat(fd)
+    finally:
+      os.close(fd)
+    if GM_Globals[GM_WINDOWS] and os.path.isfile(cacheFile):
+      os.remove(cacheFile)
+    os.rename(newCacheFile, cacheFile)
+    self._inode = status.st_ino
+    self._offset = status.st_size
+    self._maxSize = max(CACHE_FILE_MAX_SIZE, 2*status.st_size)
+
+  # Returns (value, expiry) or None
+  def get(self, key):
+    now = time.time()+self._expiryMargin
+    with self._lock:
+      valueData = self._values.get(key)
+      if valueData and valueData[1] > now:
+        return valueData
+      cacheFile, _ = self._paths()
+      if cacheFile:
+        self._readFile(cacheFile)
+        valueData = self._values.get(key)
+        if valueData and valueData[1] > now:
+          return valueData
+    return None
+
+  def put(self, key, value, expiry):
+    self.putMany([(key, value, expiry)])
+
+  def putMany(self, values):
+    if not values:
+      return
+    with self._lock:
+      for key, value, expiry in values:
+        self._values[key] = (value, expiry)
+      cacheFile, lockFile = self._paths()
+      if not cacheFile:
+        return
+      try:
+        fd = os.open(lockFile, os.O_RDWR|os.O_CREAT, 0o600)
+        try:
+          lockFileDescriptor(fd)
+          self._readFile(cacheFile)
+          for key, value, expiry in values:
+            self._values[key] = (value, expiry)
+          self._writeFile(cacheFile, values)
+          unlockFileDescriptor(fd)
+        finally:
+          os.close(fd)
+      except (IOError, OSError) as e:
+        stderrWarningMsg(e)
+
+# Delegated service account access tokens are cached by (service account, user, scopes) in cache_dir/tokens.txt
+# so that all threads and processes reuse a token until shortly before it expires rather than each one
+# signing a JWT and exchanging it for a new token
+SVCACCT_TOKEN_EXPIRY_MARGIN = 300
+SVCACCT_TOKEN_CACHE = _CacheFile(u'tokens.txt', SVCACCT_TOKEN_EXPIRY_MARGIN, lambda: not GC_Values[GC_NO_CACHE])
+
+# Storage that lets oauth2client pick up a token cached by another thread or process before it refreshes
+# and save the token after it refreshes. The lock is not held during the refresh so that the tokens of
+# different users are retrieved concurrently.
+class _SvcAcctTokenStorage(oauth2client.client.Storage):
+  def __init__(self, credentials, key):
+    super(_SvcAcctTokenStorage, self).__init__()
+    self._credentials = credentials
+    self._key = key
+
+  def locked_get(self):
+    tokenData = SVCACCT_TOKEN_CACHE.get(self._key)
+    if not tokenData:
+      return None
+    credentials = copy.copy(self._credentials)
+    credentials.access_token = tokenData[0]
+    credentials.token_expiry = datetime.datetime.utcfromtimestamp(tokenData[1])
+    credentials.invalid = False
+    return credentials
+
+  def locked_put(self, credentials):
+    if credentials.access_token and credentials.token_expiry and not credentials.invalid:
+      SVCACCT_TOKEN_CACHE.put(self._key, credentials.access_token, calendar.timegm(credentials.token_expiry.utctimetuple()))
+
+  def locked_delete(self):
+    pass
+
+# Service account credentials are created once per set of scopes and shared by all threads;
+# create_delegated reuses the parsed private key
+SVCACCT_CREDENTIALS_LOCK = threading.Lock()
+SVCACCT_CREDENTIALS = {}
+
 def getSvcAcctCredentials(scopes, act_as):
   try:
     if not GM_Globals[GM_OAUTH2SERVICE_JSON_DATA]:
@@ -2101,10 +2364,20 @@ def getSvcAcctCredentials(scopes, act_as):
         printLine(MESSAGE_INSTRUCTIONS_OAUTH2SERVICE_JSON)
         systemErrorExit(6, None)
       GM_Globals[GM_OAUTH2SERVICE_JSON_DATA] = json.loads(json_string)
-    credentials = oauth2client.service_account.ServiceAccountCredentials.from_json_keyfile_dict(GM_Globals[GM_OAUTH2SERVICE_JSON_DATA], scopes)
+    credentialsKey = (GC_Values[GC_OAUTH2SERVICE_JSON], tuple(sorted(scopes)))
+    with SVCACCT_CREDENTIALS_LOCK:
+      credentials = SVCACCT_CREDENTIALS.get(credentialsKey)
+      if credentials is None:
+        credentials = SVCACCT_CREDENTIALS[credentialsKey] = oauth2client.service_account.ServiceAccountCredentials.from_json_keyfile_dict(GM_Globals[GM_OAUTH2SERVICE_JSON_DATA], scopes)
     credentials = credentials.create_delegated(act_as)
     credentials.user_agent = GAM_INFO
     serialization_data = credentials.serialization_data
+    tokenKey = u' '.join([serialization_data[u'client_email'], act_as.lower(), u','.join(sorted([scopes] if isinstance(scopes, basestring) else scopes))])
+    storage = _SvcAcctTokenStorage(credentials, tokenKey)
+    cachedCredentials = storage.locked_get()
+    if cachedCredentials:
+      credentials = cachedCredentials
+    credentials.set_store(storage)
     GM_Globals[GM_OAUTH2SERVICE_ACCOUNT_CLIENT_ID] = serialization_data[u'client_id']
     return credentials
   except (ValueError, KeyError):
@@ -2125,14 +2398,16 @@ def getGDataOAuthToken(gdataObject):
     credentials = storage.get()
   try:
     if credentials.access_token_expired:
-      credentials.refresh(httplib2.Http(disable_ssl_certificate_validation=GC_Values[GC_NO_VERIFY_SSL]))
+      credentials.refresh(getHttpObj())
   except oauth2client.client.AccessTokenRefreshError as e:
     return handleOAuthTokenError(e, False)
   gdataObject.additional_headers[u'Authorization'] = u'Bearer {0}'.format(credentials.access_token)
-  if not GC_Values[GC_DOMAIN]:
-    GC_Values[GC_DOMAIN] = credentials.id_token.get(u'hd', u'UNKNOWN').lower()
-  if not GC_Values[GC_CUSTOMER_ID]:
-    GC_Values[GC_CUSTOMER_ID] = MY_CUSTOMER
+  if not GC_Values[GC_DOMAIN] or not GC_Values[GC_CUSTOMER_ID]:
+    with DOMAIN_CUSTOMER_ID_LOCK:
+      if not GC_Values[GC_DOMAIN]:
+        GC_Values[GC_DOMAIN] = credentials.id_token.get(u'hd', u'UNKNOWN').lower()
+      if not GC_Values[GC_CUSTOMER_ID]:
+        GC_Values[GC_CUSTOMER_ID] = MY_CUSTOMER
   gdataObject.domain = GC_Values[GC_DOMAIN]
   return True
 
@@ -2218,6 +2493,85 @@ def checkGDataError(e, service):
   }
   return (e.error_code, error_code_map.get(e.error_code, u'Unknown Error: {0}'.format(str(e))))
 
+# api_rate_limits: directory:20,gmail:50 -> {u'admin-directory_v1': 20.0, u'gmail-v1': 50.0}
+def getAPIRateLimits(value):
+  apis = dict((api.lower(), api) for api in API_VER_MAPPING)
+  rateLimits = {}
+  for item in value.replace(u' ', u'').split(u','):
+    if not item:
+      continue
+    api, _, rate = item.partition(u':')
+    try:
+      rate = float(rate)
+      if (api.lower() not in apis) or (rate <= 0):
+        raise ValueError
+    except ValueError:
+      systemErrorExit(CONFIG_ERROR_RC, MESSAGE_INVALID_API_RATE_LIMITS.format(item, u','.join(sorted(API_VER_MAPPING))))
+    rateLimits[getAPIVersion(apis[api.lower()])[2]] = rate
+  return rateLimits
+
+def getServiceAPIVersion(service):
+  rootDesc = getattr(service, u'_rootDesc', None)
+  if rootDesc:
+    return u'{0}-{1}'.format(rootDesc[u'name'], rootDesc[u'version'])
+  return getattr(service, u'gamApiVersion', None)
+
+# Token bucket rate limiting; the bucket holds at most one second of requests and its state, the tokens
+# available at a time, is kept in a locked file in cache_dir so that all threads and processes share it.
+# A request that finds the bucket empty reserves its token and sleeps until the token is available.
+def waitForAPIRateLimit(service, count=1):
+  if not GM_Globals[GM_API_RATE_LIMITS]:
+    return
+  apiVersion = getServiceAPIVersion(service)
+  rate = GM_Globals[GM_API_RATE_LIMITS].get(apiVersion)
+  if not rate:
+    return
+  if not os.path.isdir(GC_Values[GC_CACHE_DIR]):
+    try:
+      os.makedirs(GC_Values[GC_CACHE_DIR])
+    except OSError:
+      pass
+  try:
+    fd = os.open(os.path.join(GC_Values[GC_CACHE_DIR], u'ratelimit-{0}.txt'.format(apiVersion)), os.O_RDWR|os.O_CREAT, 0o600)
+  except OSError as e:
+    systemErrorExit(FILE_ERROR_RC, e)
+  try:
+    lockFileDescriptor(fd)
+    now = time.time()
+    try:
+      tokens, last = [float(field) for field in os.read(fd, 100).split()]
+      tokens = min(rate, tokens+max(now-last, 0)*rate)
+    except ValueError:
+      tokens = rate
+    tokens -= count
+    os.lseek(fd, 0, os.SEEK_SET)
+    os.ftruncate(fd, 0)
+    os.write(fd, u'{0!r} {1!r}'.format(tokens, now))
+    unlockFileDescriptor(fd)
+  finally:
+    os.close(fd)
+  if tokens < 0:
+    time.sleep(-tokens/rate)
+
+# Exclusive lock on a file shared by GAM processes; closing the file also releases the lock
+def lockFileDescriptor(fd):
+  if GM_Globals[GM_WINDOWS]:
+    import msvcrt
+    os.lseek(fd, 0, os.SEEK_SET)
+    msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+  else:
+    import fcntl
+    fcntl.flock(fd, fcntl.LOCK_EX)
+
+def unlockFileDescriptor(fd):
+  if GM_Globals[GM_WINDOWS]:
+    import msvcrt
+    os.lseek(fd, 0, os.SEEK_SET)
+    msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+  else:
+    import fcntl
+    fcntl.flock(fd, fcntl.LOCK_UN)
+
 def waitOnFailure(n, retries, error_code, error_message):
   wait_on_fail = min(2 ** n, 60) + float(random.randint(1, 1000)) / 1000
   if n > 3:
@@ -2278,6 +2632,7 @@ def callGData(service, function,
   retries = 10
   for n in range(1, retries+1):
     try:
+      waitForAPIRateLimit(service)
       return method(**kwargs)
     except gdata.apps.service.AppsForYourDomainException as e:
       error_code, error_message = checkGDataError(e, service)
@@ -2322,7 +2677,7 @@ def checkGAPIError(e, soft_errors=False, silent_errors=False, retryOnHttpError=F
     elif (e.resp[u'status'] == u'400') and (u'UnknownError' in e.content):
       error = {u'error': {u'code': 400, u'errors': [{u'reason': GAPI_INVALID, u'message': u'UnknownError'}]}}
     elif retryOnHttpError:
-      service._http.request.credentials.refresh(httplib2.Http(disable_ssl_certificate_validation=GC_Values[GC_NO_VERIFY_SSL]))
+      service._http.request.credentials.refresh(getHttpObj())
       return (-1, None, None)
     elif soft_errors:
       if not silent_errors:
@@ -2615,6 +2970,7 @@ def callGAPI(service, function,
   parameters = dict(kwargs.items()+GM_Globals[GM_EXTRA_ARGS_LIST])
   for n in range(1, retries+1):
     try:
+      waitForAPIRateLimit(service)
       return method(**parameters).execute()
     except googleapiclient.errors.HttpError as e:
       http_status, reason, message = checkGAPIError(e, soft_errors=soft_errors, silent_errors=silent_errors, retryOnHttpError=n < 3, service=service)
@@ -2627,6 +2983,8 @@ def callGAPI(service, function,
           raise GAPI_REASON_EXCEPTION_MAP[reason](message)
         raise e
       if (n != retries) and (reason in GAPI_DEFAULT_RETRY_REASONS+retry_reasons):
+        if reason in GAPI_DEFAULT_RETRY_REASONS:
+          recordBatchThrottleEvent(reason)
         waitOnFailure(n, retries, reason, message)
         continue
       if soft_errors:
@@ -2652,16 +3010,261 @@ def callGAPI(service, function,
     except TypeError as e:
       systemErrorExit(GOOGLE_API_ERROR_RC, e)
 
+# Resumable version of callGAPI for uploads; media_body is uploaded GAPI_UPLOAD_CHUNK_SIZE bytes at a time and the progress
+# is shown on stderr. When a chunk fails with a socket error, a 429/5xx status or a callGAPI default retry reason,
+# the upload resumes from the last byte acknowledged by Google rather than starting over
+def callGAPIupload(service, function, media_body, **kwargs):
+  method = getattr(service, function)
+  retries = 10
+  parameters = dict(kwargs.items()+GM_Globals[GM_EXTRA_ARGS_LIST])
+  request = method(media_body=media_body, **parameters)
+  totalMB = media_body.size()/(1024.0*1024.0)
+  n = 1
+  while True:
+    try:
+      waitForAPIRateLimit(service)
+      status, result = request.next_chunk()
+      if result is not None:
+        return result
+      n = 1
+      if status:
+        sys.stderr.write(u'Uploaded {0:.1f} of {1:.1f} MB\n'.format(status.resumable_progress/(1024.0*1024.0), totalMB))
+    except googleapiclient.errors.HttpError as e:
+      http_status, reason, message = checkGAPIError(e, soft_errors=True, silent_errors=True)
+      if (n != retries) and ((reason in GAPI_DEFAULT_RETRY_REASONS) or (e.resp.status == 429) or (e.resp.status >= 500)):
+        if reason in GAPI_DEFAULT_RETRY_REASONS:
+          recordBatchThrottleEvent(reason)
+        waitOnFailure(n, retries, reason or e.resp.status, message or e.resp.reason)
+        n += 1
+        continue
+      if http_status == 0:
+        systemErrorExit(HTTP_ERROR_RC, e.content)
+      systemErrorExit(HTTP_ERROR_RC, formatHTTPError(http_status, reason, message))
+    except oauth2client.client.AccessTokenRefreshError as e:
+      handleOAuthTokenError(e, False)
+    except httplib2.CertificateValidationUnsupported:
+      noPythonSSLExit()
+    except (socket.error, httplib2.HttpLib2Error) as e:
+      if n != retries:
+        waitOnFailure(n, retries, getattr(e, u'errno', None), str(e))
+        n += 1
+        continue
+      systemErrorExit(SOCKET_ERROR_RC, str(e))
+
+# Batched version of callGAPI with soft_errors=True; requests is a list of (ri, kwargs) for service.<collection>().<function>(**kwargs)
+# callback(ri, result, reason) is called once for each request, reason is None on success; failed requests
+# with a retry reason are retried with backoff, only the failed requests are resent
+def callGAPIbatch(service, collection, function, requests, callback,
+                  throw_reasons=None, retry_reasons=None, batch_size=GAPI_BATCH_MAX_REQUESTS):
+  def _batchCallback(request_id, response, exception):
+    responses[request_id] = (response, exception)
+
+  def _requestFailed(ri, http_status, reason, message, n):
+    callback(ri, None, reason)
+    if reason in throw_reasons:
+      return
+    if http_status == 0:
+      stderrErrorMsg(message)
+    else:
+      stderrErrorMsg(u'{0}: {1} - {2}{3}'.format(http_status, reason, message, [u'', u': Giving up.\n'][n > 1]))
+
+  if throw_reasons is None:
+    throw_reasons = []
+  if retry_reasons is None:
+    retry_reasons = []
+  method = getattr(getattr(service, collection)(), function)
+  retries = 10
+  for i in range(0, len(requests), batch_size):
+    pending = requests[i:i+batch_size]
+    n = 1
+    while pending:
+      responses = {}
+      batch = service.new_batch_http_request(callback=_batchCallback)
+      for j, request in enumerate(pending):
+        batch.add(method(**dict(request[1].items()+GM_Globals[GM_EXTRA_ARGS_LIST])), request_id=str(j))
+      try:
+        waitForAPIRateLimit(service, len(pending))
+        batch.execute()
+      except googleapiclient.errors.HttpError as e:
+        http_status, reason, message = checkGAPIError(e, soft_errors=True, silent_errors=True)
+        if (n != retries) and (reason in GAPI_DEFAULT_RETRY_REASONS+retry_reasons):
+          if reason in GAPI_DEFAULT_RETRY_REASONS:
+            recordBatchThrottleEvent(reason)
+          waitOnFailure(n, retries, reason, message)
+          n += 1
+          continue
+        for ri, _ in pending:
+          _requestFailed(ri, http_status, reason, message if http_status else e.content, n)
+        break
+      except oauth2client.client.AccessTokenRefreshError as e:
+        handleOAuthTokenError(e, False)
+      except httplib2.CertificateValidationUnsupported:
+        noPythonSSLExit()
+      except socket.error as e:
+        if n != retries:
+          waitOnFailure(n, retries, e.errno, e.strerror)
+          n += 1
+          continue
+        for ri, _ in pending:
+          callback(ri, None, e.errno)
+          stderrErrorMsg(u'{0} - {1}{2}'.format(e.errno, e.strerror, [u'', u': Giving up.\n'][n > 1]))
+        break
+      failed = []
+      for j, request in enumerate(pending):
+        response, exception = responses[str(j)]
+        if exception is None:
+          callback(request[0], response, None)
+          continue
+        http_status, reason, message = checkGAPIError(exception, soft_errors=True, silent_errors=True)
+        if (n != retries) and (reason in GAPI_DEFAULT_RETRY_REASONS+retry_reasons):
+          failed.append(request)
+          retryReason, retryMessage = reason, message
+          continue
+        _requestFailed(request[0], http_status, reason, message if http_status else exception.content, n)
+      if failed:
+        if retryReason in GAPI_DEFAULT_RETRY_REASONS:
+          recordBatchThrottleEvent(retryReason)
+        waitOnFailure(n, retries, retryReason, retryMessage)
+        n += 1
+      pending = failed
+
+# The helper threads of a command write to the command's output streams and start with a copy of its GM_Globals,
+# so they build their own services; an exception in a thread is recorded in failures and join raises the first one
+# once all of the threads have finished. A thread that works through a queue stops when failures is not empty.
+class CommandThreads(object):
+  def __init__(self):
+    self.failures = []
+    self._values = GM_Globals.getThreadValues()
+    self._threadStreams = [stream.getThreadStream() if isinstance(stream, _ThreadOutput) else None for stream in [sys.stdout, sys.stderr]]
+    self._threads = []
+
+  def _run(self, target, args):
+    values = self._values.copy()
+    values[GM_CACHED_SERVICES] = {}
+    GM_Globals.setThreadValues(values)
+    for stream, threadStream in zip([sys.stdout, sys.stderr], self._threadStreams):
+      if threadStream:
+        stream.setThreadStream(threadStream)
+    try:
+      target(*args)
+    except BaseException:
+      self.failures.append(sys.exc_info())
+
+  def start(self, target, *args):
+    t = threading.Thread(target=self._run, args=(target, args))
+    t.daemon = True
+    t.start()
+    self._threads.append(t)
+
+  def join(self):
+    for t in self._threads:
+      t.join()
+    if self.failures:
+      exc_info = self.failures[0]
+      raise exc_info[0], exc_info[1], exc_info[2]
+
+# callGAPIbatch with the batches sent num_threads at a time, each thread with its own service for api;
+# callback is called by one thread at a time
+def callGAPIbatchThreads(api, collection, function, requests, callback,
+                         throw_reasons=None, retry_reasons=None, batch_size=GAPI_BATCH_MAX_REQUESTS):
+  import Queue
+  def _lockedCallback(ri, result, reason):
+    with lock:
+      callback(ri, result, reason)
+
+  def _sendBatches():
+    service = buildGAPIObject(api)
+    while not threads.failures:
+      try:
+        batchRequests = batchQueue.get_nowait()
+      except Queue.Empty:
+        return
+      callGAPIbatch(service, collection, function, batchRequests, _lockedCallback,
+                    throw_reasons=throw_reasons, retry_reasons=retry_reasons, batch_size=batch_size)
+
+  batchQueue = Queue.Queue()
+  for i in range(0, len(requests), batch_size):
+    batchQueue.put(requests[i:i+batch_size])
+  lock = threading.Lock()
+  threads = CommandThreads()
+  for _ in range(min(GC_Values[GC_NUM_THREADS], batchQueue.qsize())):
+    threads.start(_sendBatches)
+  threads.join()
+
 def callGAPIpages(service, function, items,
                   page_message=None, message_attribute=None,
                   throw_reasons=None, retry_reasons=None,
                   **kwargs):
+  return collections.deque(yieldGAPIpages(service, function, items,
+                                          page_message=page_message, message_attribute=message_attribute,
+                                          throw_reasons=throw_reasons, retry_reasons=retry_reasons,
+                                          **kwargs))
+
+# Generator version of callGAPIpages, the items of each page are yielded as soon as the page is retrieved;
+# as nothing is retrieved until the first item is requested, throw_reasons exceptions are raised by the iteration.
+# With prefetch > 0, the pages are retrieved by a background thread up to prefetch pages ahead of the caller;
+# the thread uses a copy of service with its own connections so the caller can make API calls while iterating.
+def yieldGAPIpages(service, function, items,
+                   page_message=None, message_attribute=None,
+                   throw_reasons=None, retry_reasons=None, prefetch=0,
+                   **kwargs):
+  def _getPages(pagesService):
+    return _getGAPIpages(pagesService, function, items, page_message, message_attribute, throw_reasons, retry_reasons, kwargs)
+
+  if prefetch > 0:
+    pages = prefetchPages(_getPages, service, prefetch)
+  else:
+    pages = _getPages(service)
+  for page in pages:
+    for item in page:
+      yield item
+
+# Run the generator of pages returned by getPages(service) in a background thread that stays at most maxPages pages ahead
+# of the caller; the pages are handed over through a bounded queue, an exception in the thread is raised in the caller.
+# All of the Http objects of a thread share its connections, so the thread gets a copy of service with connections
+# of its own; otherwise any API call made by the caller while iterating would use a connection that the thread is using.
+def prefetchPages(getPages, service, maxPages):
+  import Queue
+  def _putPage(page):
+    while not stopFetching.is_set():
+      try:
+        pageQueue.put(page, timeout=1)
+        return True
+      except Queue.Full:
+        pass
+    return False
+
+  # The exception is handed over with the pages so that it is raised where the caller is iterating
+  def _fetchPages():
+    try:
+      for page in getPages(getServiceWithOwnConnections(service)):
+        if not _putPage((page, None)):
+          return
+      _putPage((None, None))
+    except BaseException:
+      _putPage((None, sys.exc_info()))
+
+  pageQueue = Queue.Queue(maxsize=maxPages)
+  stopFetching = threading.Event()
+  CommandThreads().start(_fetchPages)
+  try:
+    while True:
+      page, exc_info = pageQueue.get()
+      if page is not None:
+        yield page
+      elif exc_info:
+        raise exc_info[0], exc_info[1], exc_info[2]
+      else:
+        return
+  finally:
+    stopFetching.set()
+
+def _getGAPIpages(service, function, items, page_message, message_attribute, throw_reasons, retry_reasons, kwargs):
   if throw_reasons is None:
     throw_reasons = []
   if retry_reasons is None:
     retry_reasons = []
   pageToken = None
-  allResults = collections.deque()
   totalItems = 0
   while True:
     results = callGAPI(service, function, throw_reasons=throw_reasons, retry_reasons=retry_reasons, pageToken=pageToken, **kwargs)
@@ -2670,7 +3273,6 @@ def callGAPIpages(service, function, items,
       if items in results:
         pageItems = len(results[items])
         totalItems += pageItems
-        allResults.extend(results[items])
       else:
         results = {items: []}
         pageItems = 0
@@ -2695,7 +3297,155 @@ def callGAPIpages(service, function, items,
       if page_message and (page_message[-1] != u'\n'):
         sys.stderr.write(u'\r\n')
         sys.stderr.flush()
-      return allResults
+    yield results[items]
+    if not pageToken:
+      return
+
+# The characters that a user's email address can start with or, after a prefix, continue with
+USER_LIST_PARTITION_CHARACTERS = string.ascii_lowercase+string.digits+u'-_.'
+
+# The prefixes of user_list_partitions completed so that every email address starts with one of them: for a prefix
+# that is only the start of longer prefixes, e.g. j for ja and jo, prefixes are added for the other characters that can
+# follow it and j@ for the address that is just j. A prefix that starts with a shorter prefix is dropped.
+def getUserListPartitions():
+  def _completePartitions(prefix):
+    if prefix in prefixes:
+      partitions.append(prefix)
+    elif [longerPrefix for longerPrefix in prefixes if longerPrefix.startswith(prefix)]:
+      if prefix:
+        partitions.append(prefix+u'@')
+      for character in USER_LIST_PARTITION_CHARACTERS:
+        _completePartitions(prefix+character)
+    else:
+      partitions.append(prefix)
+
+  prefixes = set(GC_Values[GC_USER_LIST_PARTITIONS].lower().replace(u',', u' ').split())
+  partitions = []
+  if prefixes:
+    _completePartitions(u'')
+  return partitions
+
+# Pages of users buffered for each stream of getUsersPartitioned
+USER_LIST_PARTITION_MAX_PAGES = 5
+
+# users.list pages strictly one after another; with user_list_partitions, the users whose primary email address
+# starts with each prefix are listed by a separate stream, num_threads streams at a time. The prefixes don't overlap,
+# so the streams are read in email address order and their users are yielded as they arrive; the users an email query
+# returns because of an alias are dropped, they are returned by the stream of their primary email address.
+# An address can contain characters that no prefix is made of, e.g. o'brien, so one more stream lists the email
+# addresses of all of the users and gets the users whose address starts with no prefix; these are merged in order.
+# That stream also counts the addresses that start with a prefix, which must match the number of users yielded
+# by the prefix streams.
+def getUsersPartitioned(partitions, query=None, sortOrder=None, silent=False, **kwargs):
+  import Queue
+  def _putPage(pageQueue, page):
+    while not stopFetching.is_set():
+      try:
+        pageQueue.put(page, timeout=1)
+        return True
+      except Queue.Full:
+        pass
+    return False
+
+  def _fetchPages(getPages, pageQueue):
+    try:
+      for page in getPages():
+        if not _putPage(pageQueue, (page, None)):
+          return
+      _putPage(pageQueue, (None, None))
+    except BaseException:
+      _putPage(pageQueue, (None, sys.exc_info()))
+
+  def _getPartitionPages(prefix):
+    page_message = None
+    if not silent:
+      page_message = u'Got %%%%total_items%%%% users with email prefix %s: %%%%first_item%%%% - %%%%last_item%%%%\n' % prefix
+    partitionQuery = u'email:{0}*'.format(prefix)
+    if query:
+      partitionQuery += u' '+query
+    partitionKwargs = dict(kwargs, query=partitionQuery, orderBy=u'email', sortOrder=sortOrder)
+    for page in _getGAPIpages(buildGAPIObject(GAPI_DIRECTORY_API).users(), u'list', u'users', page_message, u'primaryEmail', None, None, partitionKwargs):
+      yield [user for user in page if user.get(u'primaryEmail', u'').lower().startswith(prefix)]
+
+  def _getUnpartitionedPages():
+    page_message = None
+    if not silent:
+      page_message = u'Checked %%total_items%% users for email addresses with no prefix...'
+    cd = buildGAPIObject(GAPI_DIRECTORY_API)
+    listKwargs = dict((key, kwargs[key]) for key in [u'customer', u'domain', u'viewType', u'maxResults'] if key in kwargs)
+    listKwargs.update(query=query, orderBy=u'email', sortOrder=sortOrder, fields=u'nextPageToken,users(primaryEmail)')
+    for page in _getGAPIpages(cd.users(), u'list', u'users', page_message, None, None, None, listKwargs):
+      unpartitionedUsers = []
+      for user in page:
+        if user[u'primaryEmail'].lower().startswith(prefixes):
+          partitionedCount[0] += 1
+          continue
+        try:
+          unpartitionedUsers.append(callGAPI(cd.users(), u'get', throw_reasons=[GAPI_USER_NOT_FOUND],
+                                             userKey=user[u'primaryEmail'], **getKwargs))
+        except GAPI_userNotFound:
+          pass
+      yield unpartitionedUsers
+
+  def _listPartitions():
+    while not stopFetching.is_set():
+      try:
+        prefix, pageQueue = partitionQueue.get_nowait()
+      except Queue.Empty:
+        return
+      _fetchPages(lambda: _getPartitionPages(prefix), pageQueue)
+
+  def _getUsers(pageQueue):
+    while True:
+      page, exc_info = pageQueue.get()
+      if page is not None:
+        for user in page:
+          yield user
+      elif exc_info:
+        raise exc_info[0], exc_info[1], exc_info[2]
+      else:
+        return
+
+  def _precedes(user, otherUser):
+    email = user.get(u'primaryEmail', u'').lower()
+    otherEmail = otherUser.get(u'primaryEmail', u'').lower()
+    return email > otherEmail if descending else email < otherEmail
+
+  descending = sortOrder == u'DESCENDING'
+  prefixes = tuple(partitions)
+  getKwargs = dict((key, kwargs[key]) for key in [u'projection', u'customFieldMask', u'viewType'] if kwargs.get(key))
+  if kwargs.get(u'fields'):
+    getKwargs[u'fields'] = re.sub(r'^nextPageToken,users\((.*)\)$', r'\1', kwargs[u'fields'])
+  partitionedCount = [0]
+  stopFetching = threading.Event()
+  partitionQueue = Queue.Queue()
+  pageQueues = []
+  for prefix in sorted(partitions, reverse=descending):
+    pageQueues.append(Queue.Queue(maxsize=USER_LIST_PARTITION_MAX_PAGES))
+    partitionQueue.put((prefix, pageQueues[-1]))
+  unpartitionedQueue = Queue.Queue(maxsize=USER_LIST_PARTITION_MAX_PAGES)
+  threads = CommandThreads()
+  threads.start(_fetchPages, _getUnpartitionedPages, unpartitionedQueue)
+  for _ in range(min(GC_Values[GC_NUM_THREADS], len(partitions))):
+    threads.start(_listPartitions)
+  try:
+    unpartitionedUsers = _getUsers(unpartitionedQueue)
+    nextUnpartitionedUser = next(unpartitionedUsers, None)
+    count = 0
+    for pageQueue in pageQueues:
+      for user in _getUsers(pageQueue):
+        while (nextUnpartitionedUser is not None) and _precedes(nextUnpartitionedUser, user):
+          yield nextUnpartitionedUser
+          nextUnpartitionedUser = next(unpartitionedUsers, None)
+        count += 1
+        yield user
+    while nextUnpartitionedUser is not None:
+      yield nextUnpartitionedUser
+      nextUnpartitionedUser = next(unpartitionedUsers, None)
+    if count != partitionedCount[0]:
+      stderrWarningMsg(u'user_list_partitions listed {0} users, the email addresses of {1} users start with a prefix; users may have been added or deleted while they were listed'.format(count, partitionedCount[0]))
+  finally:
+    stopFetching.set()
 
 def callGAPIitems(service, function, items,
                   throw_reasons=None, retry_reasons=None,
@@ -2757,6 +3507,34 @@ API_VER_MAPPING = {
   GAPI_SITEVERIFICATION_API: u'v1',
   }
 
+# Keep-alive connections to Google, keyed by scheme:host, shared by all of the httplib2.Http objects created in a thread;
+# changing users only changes the credentials that authorize the requests, not the connections.
+# Each thread has its own connections as a connection can only carry one request at a time
+# and each process has its own as the connections of the parent of a forked process can't be used.
+class _HttpConnections(threading.local):
+  def __init__(self):
+    self.pid = None
+    self.connections = None
+
+HTTP_CONNECTIONS = _HttpConnections()
+
+def getHttpObj(cache=None):
+  http = httplib2.Http(disable_ssl_certificate_validation=GC_Values[GC_NO_VERIFY_SSL], cache=cache)
+  if HTTP_CONNECTIONS.pid != os.getpid():
+    HTTP_CONNECTIONS.pid = os.getpid()
+    HTTP_CONNECTIONS.connections = {}
+  http.connections = HTTP_CONNECTIONS.connections
+  return http
+
+# A copy of service, or of one of its collections, whose requests are sent over connections of its own
+# with the same credentials, for use while service may be in use by another thread
+def getServiceWithOwnConnections(service):
+  http = getHttpObj()
+  http.connections = {}
+  ownService = copy.copy(service)
+  ownService._http = service._http.request.credentials.authorize(http)
+  return ownService
+
 def getAPIVersion(api):
   version = API_VER_MAPPING.get(api, u'v1')
   if api in [GAPI_DIRECTORY_API, GAPI_REPORTS_API, GAPI_DATATRANSFER_API]:
@@ -2782,19 +3560,55 @@ def readDiscoveryFile(api_version):
   except ValueError:
     invalidJSONExit(disc_file)
 
+# Discovery documents are retrieved from Google once per process and shared by all threads
+class _DiscoveryDocumentCache(googleapiclient.discovery_cache.base.Cache):
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._documents = {}
+
+  def get(self, url):
+    with self._lock:
+      return self._documents.get(url)
+
+  def set(self, url, content):
+    with self._lock:
+      self._documents[url] = content
+
+DISCOVERY_DOCUMENT_CACHE = _DiscoveryDocumentCache()
+
+# oauth2.txt credentials are read once per process and shared by all threads
+OAUTH2_TXT_CREDENTIALS_LOCK = threading.RLock()
+OAUTH2_TXT_CREDENTIALS = {}
+
+def clearOauth2TxtCredentials():
+  with OAUTH2_TXT_CREDENTIALS_LOCK:
+    OAUTH2_TXT_CREDENTIALS.clear()
+    GM_Globals[GM_CACHED_SERVICES] = {}
+
+def getOauth2TxtCredentials():
+  with OAUTH2_TXT_CREDENTIALS_LOCK:
+    credentials = OAUTH2_TXT_CREDENTIALS.get(GC_Values[GC_OAUTH2_TXT])
+    if not credentials or credentials.invalid:
+      storage, credentials = getOauth2TxtStorageCredentials()
+      if not credentials or credentials.invalid:
+        doOAuthRequest()
+        credentials = storage.get()
+      credentials.user_agent = GAM_INFO
+      OAUTH2_TXT_CREDENTIALS[GC_Values[GC_OAUTH2_TXT]] = credentials
+    return credentials
+
 def getClientAPIversionHttpService(api):
-  storage, credentials = getOauth2TxtStorageCredentials()
-  if not credentials or credentials.invalid:
-    doOAuthRequest()
-    credentials = storage.get()
-  credentials.user_agent = GAM_INFO
+  if api in GM_Globals[GM_CACHED_SERVICES]:
+    return GM_Globals[GM_CACHED_SERVICES][api]
+  credentials = getOauth2TxtCredentials()
+  cacheKey = api
   api, version, api_version = getAPIVersion(api)
-  http = credentials.authorize(httplib2.Http(disable_ssl_certificate_validation=GC_Values[GC_NO_VERIFY_SSL],
-                                             cache=GM_Globals[GM_CACHE_DIR]))
+  http = credentials.authorize(getHttpObj(cache=GM_Globals[GM_CACHE_DIR]))
   try:
-    service = googleapiclient.discovery.build(api, version, http=http, cache_discovery=False)
+    service = googleapiclient.discovery.build(api, version, http=http, cache_discovery=True, cache=DISCOVERY_DOCUMENT_CACHE)
     if GM_Globals[GM_CACHE_DISCOVERY_ONLY]:
       http.cache = None
+    GM_Globals[GM_CACHED_SERVICES][cacheKey] = (credentials, service)
     return (credentials, service)
   except httplib2.ServerNotFoundError as e:
     systemErrorExit(4, e)
@@ -2807,14 +3621,22 @@ def getClientAPIversionHttpService(api):
     service = googleapiclient.discovery.build_from_document(discovery, http=http)
     if GM_Globals[GM_CACHE_DISCOVERY_ONLY]:
       http.cache = None
+    GM_Globals[GM_CACHED_SERVICES][cacheKey] = (credentials, service)
     return (credentials, service)
   except (ValueError, KeyError):
     invalidJSONExit(disc_file)
 
-def buildGAPIObject(api):
-  GM_Globals[GM_CURRENT_API_USER] = None
-  credentials, service = getClientAPIversionHttpService(api)
+# GC_Values is shared by the threads of gam batch|csv with batch_mode threads and gam serve, so the domain and
+# customer ID are set once: resolveDomainAndCustomerId sets them in the main thread before the workers start and
+# otherwise the first thread to build a service sets them while holding DOMAIN_CUSTOMER_ID_LOCK
+DOMAIN_CUSTOMER_ID_LOCK = threading.RLock()
+
+def setDomainAndCustomerId(credentials, service):
   if GC_Values[GC_DOMAIN]:
+    if not GC_Values[GC_CUSTOMER_ID]:
+      customerId = getUIDCacheValue(u'customer '+GC_Values[GC_DOMAIN].lower())
+      if customerId:
+        GC_Values[GC_CUSTOMER_ID] = customerId
     if not GC_Values[GC_CUSTOMER_ID]:
       resp, result = service._http.request(u'https://www.googleapis.com/admin/directory/v1/users?domain={0}&maxResults=1&fields=users(customerId)'.format(GC_Values[GC_DOMAIN]))
       try:
@@ -2828,31 +3650,88 @@ def buildGAPIObject(api):
           message = resultObj[u'error'][u'message']
         systemErrorExit(8, u'{0} - {1}'.format(message, GC_Values[GC_DOMAIN]))
       try:
-        GC_Values[GC_CUSTOMER_ID] = resultObj[u'users'][0][u'customerId']
+        customerId = resultObj[u'users'][0][u'customerId']
+        putUIDCacheValues([(u'customer '+GC_Values[GC_DOMAIN].lower(), customerId)])
       except KeyError:
-        GC_Values[GC_CUSTOMER_ID] = MY_CUSTOMER
+        customerId = MY_CUSTOMER
+      GC_Values[GC_CUSTOMER_ID] = customerId
   else:
     GC_Values[GC_DOMAIN] = credentials.id_token.get(u'hd', u'UNKNOWN').lower()
     if not GC_Values[GC_CUSTOMER_ID]:
       GC_Values[GC_CUSTOMER_ID] = MY_CUSTOMER
+
+def buildGAPIObject(api):
+  GM_Globals[GM_CURRENT_API_USER] = None
+  credentials, service = getClientAPIversionHttpService(api)
+  if not GC_Values[GC_DOMAIN] or not GC_Values[GC_CUSTOMER_ID]:
+    with DOMAIN_CUSTOMER_ID_LOCK:
+      setDomainAndCustomerId(credentials, service)
   return service
 
+def resolveDomainAndCustomerId():
+  if not GC_Values[GC_DOMAIN] or not GC_Values[GC_CUSTOMER_ID]:
+    credentials = getOauth2TxtStorageCredentials()[1]
+    if credentials and not credentials.invalid:
+      buildGAPIObject(GAPI_DIRECTORY_API)
+
+# User UID to email address conversions, and the customer IDs of domains, are kept in GM_Globals[GM_UID_CACHE]
+# for the current command; with uid_cache_ttl they are kept for that many minutes and shared with other processes
+# through cache_dir/uids.txt
+USER_UID_CACHE = _CacheFile(u'uids.txt', 0, lambda: not GC_Values[GC_NO_CACHE])
+
+def getUIDCacheValue(key):
+  if GC_Values[GC_UID_CACHE_TTL]:
+    valueData = USER_UID_CACHE.get(key)
+    return valueData[0] if valueData else None
+  return GM_Globals[GM_UID_CACHE].get(key)
+
+def putUIDCacheValues(values):
+  if GC_Values[GC_UID_CACHE_TTL]:
+    expiry = time.time()+GC_Values[GC_UID_CACHE_TTL]*60
+    USER_UID_CACHE.putMany([(key, value, expiry) for key, value in values])
+  else:
+    GM_Globals[GM_UID_CACHE].update(values)
+
 # Convert User UID to email address
 def convertUserUIDtoEmailAddress(emailAddressOrUID):
   normalizedEmailAddressOrUID = normalizeEmailAddressOrUID(emailAddressOrUID)
   if normalizedEmailAddressOrUID.find(u'@') > 0:
     return normalizedEmailAddressOrUID
+  emailAddress = getUIDCacheValue(u'uid '+normalizedEmailAddressOrUID)
+  if emailAddress:
+    return emailAddress
   try:
     cd = buildGAPIObject(GAPI_DIRECTORY_API)
     result = callGAPI(cd.users(), u'get',
                       throw_reasons=[GAPI_USER_NOT_FOUND],
                       userKey=normalizedEmailAddressOrUID, fields=u'primaryEmail')
     if u'primaryEmail' in result:
+      putUIDCacheValues([(u'uid '+normalizedEmailAddressOrUID, result[u'primaryEmail'].lower())])
       return result[u'primaryEmail'].lower()
   except GAPI_userNotFound:
     pass
   return normalizedEmailAddressOrUID
 
+# Convert the UIDs in a list of users to email addresses up front with batched requests;
+# convertUserUIDtoEmailAddress then finds them in the cache
+def resolveUserUIDs(users):
+  def _callback(uid, result, reason):
+    if result and (u'primaryEmail' in result):
+      conversions.append((u'uid '+uid, result[u'primaryEmail'].lower()))
+
+  uids = set()
+  for user in users:
+    uid = normalizeEmailAddressOrUID(user)
+    if (uid.find(u'@') <= 0) and (uid not in uids) and not getUIDCacheValue(u'uid '+uid):
+      uids.add(uid)
+  if not uids:
+    return
+  conversions = []
+  cd = buildGAPIObject(GAPI_DIRECTORY_API)
+  callGAPIbatch(cd, u'users', u'get', [(uid, {u'userKey': uid, u'fields': u'primaryEmail'}) for uid in sorted(uids)], _callback,
+                throw_reasons=[GAPI_USER_NOT_FOUND])
+  putUIDCacheValues(conversions)
+
 API_SCOPE_MAPPING = {
   GAPI_APPSACTIVITY_API: [u'https://www.googleapis.com/auth/activity',
                           u'https://www.googleapis.com/auth/drive'],
@@ -2869,10 +3748,9 @@ API_SCOPE_MAPPING = {
 
 def getSvcAcctAPIversionHttpService(api):
   api, version, api_version = getAPIVersion(api)
-  http = httplib2.Http(disable_ssl_certificate_validation=GC_Values[GC_NO_VERIFY_SSL],
-                       cache=GM_Globals[GM_CACHE_DIR])
+  http = getHttpObj(cache=GM_Globals[GM_CACHE_DIR])
   try:
-    service = googleapiclient.discovery.build(api, version, http=http, cache_discovery=False)
+    service = googleapiclient.discovery.build(api, version, http=http, cache_discovery=True, cache=DISCOVERY_DOCUMENT_CACHE)
     if GM_Globals[GM_CACHE_DISCOVERY_ONLY]:
       http.cache = None
     return (api_version, http, service)
@@ -2889,10 +3767,94 @@ def getSvcAcctAPIversionHttpService(api):
   except (ValueError, KeyError):
     invalidJSONExit(disc_file)
 
+# Token warm-up: once the users of a command are known, the service account tokens of the next token_warmup_users
+# users after the user being processed are retrieved concurrently by worker threads ahead of the command loop.
+# A user whose delegation fails is marked so that buildGAPIServiceObject skips it without getting a token.
+class _SvcAcctTokenWarmup(object):
+  def __init__(self, users):
+    self._users = []
+    self._positions = {}
+    for user in users:
+      user = normalizeEmailAddressOrUID(user)
+      if user.find(u'@') > 0:
+        self._positions.setdefault(user, len(self._users))
+        self._users.append(user)
+    self._lock = threading.Lock()
+    self._requests = {}
+    self._failures = {}
+
+  def warm(self, scopes, act_as):
+    position = self._positions.get(act_as.lower())
+    if position is None:
+      return
+    scopesKey = tuple(sorted(scopes))
+    with self._lock:
+      for user in self._users[position+1:position+1+GC_Values[GC_TOKEN_WARMUP_USERS]]:
+        if (user, scopesKey) not in self._requests:
+          self._requests[(user, scopesKey)] = event = threading.Event()
+          getSvcAcctTokenWarmupQueue().put((self, scopes, user, event))
+
+  # Wait for the token of act_as if it is being retrieved; return the error if delegation failed
+  def wait(self, scopes, act_as):
+    key = (act_as.lower(), tuple(sorted(scopes)))
+    with self._lock:
+      event = self._requests.get(key)
+    if event is None:
+      return None
+    event.wait()
+    with self._lock:
+      return self._failures.get(key)
+
+  def fail(self, scopes, user, e):
+    with self._lock:
+      self._failures[(user, tuple(sorted(scopes)))] = e
+
+def ProcessSvcAcctTokenWarmup(warmupQueue):
+  while True:
+    warmup, scopes, user, event = warmupQueue.get()
+    try:
+      credentials = getSvcAcctCredentials(scopes, user)
+      if not credentials.access_token:
+        credentials.refresh(getHttpObj())
+    except oauth2client.client.AccessTokenRefreshError as e:
+      if e.message in OAUTH2_TOKEN_ERRORS:
+        warmup.fail(scopes, user, e)
+    except BaseException:
+      pass
+    finally:
+      event.set()
+
+# The worker threads are shared by all commands of a process
+SVCACCT_TOKEN_WARMUP_LOCK = threading.Lock()
+SVCACCT_TOKEN_WARMUP_QUEUE = {}
+
+def getSvcAcctTokenWarmupQueue():
+  with SVCACCT_TOKEN_WARMUP_LOCK:
+    warmupQueue = SVCACCT_TOKEN_WARMUP_QUEUE.get(os.getpid())
+    if warmupQueue is None:
+      import Queue
+      warmupQueue = SVCACCT_TOKEN_WARMUP_QUEUE[os.getpid()] = Queue.Queue()
+      for _ in range(GC_Values[GC_TOKEN_WARMUP_USERS]):
+        t = threading.Thread(target=ProcessSvcAcctTokenWarmup, args=(warmupQueue,))
+        t.daemon = True
+        t.start()
+    return warmupQueue
+
+def setSvcAcctTokenWarmupUsers(users):
+  if GC_Values[GC_TOKEN_WARMUP_USERS]:
+    GM_Globals[GM_SVCACCT_TOKEN_WARMUP] = _SvcAcctTokenWarmup(users)
+
 def buildGAPIServiceObject(api, act_as, use_scopes=None):
   _, http, service = getSvcAcctAPIversionHttpService(api)
   GM_Globals[GM_CURRENT_API_USER] = act_as
   GM_Globals[GM_CURRENT_API_SCOPES] = use_scopes or API_SCOPE_MAPPING[api]
+  warmup = GM_Globals[GM_SVCACCT_TOKEN_WARMUP]
+  if warmup:
+    warmup.warm(GM_Globals[GM_CURRENT_API_SCOPES], act_as)
+    e = warmup.wait(GM_Globals[GM_CURRENT_API_SCOPES], act_as)
+    if e:
+      entityServiceNotApplicableWarning([u'Calendar', u'User'][api != GAPI_CALENDAR_API], act_as, 0, 0)
+      return handleOAuthTokenError(e, True)
   credentials = getSvcAcctCredentials(GM_Globals[GM_CURRENT_API_SCOPES], act_as)
   try:
     service._http = credentials.authorize(http)
@@ -2925,6 +3887,7 @@ def buildGplusGAPIObject(user):
 
 def initGDataObject(gdataObj, api):
   _, _, api_version = getAPIVersion(api)
+  gdataObj.gamApiVersion = api_version
   disc_file, discovery = readDiscoveryFile(api_version)
   GM_Globals[GM_CURRENT_API_USER] = None
   try:
@@ -3048,7 +4011,157 @@ def splitEntityList(entity, dataDelimiter, shlexSplit):
     return entity.split(dataDelimiter)
   return shlexSplitList(entity, dataDelimiter)
 
-def getUsersToModify(entityType, entity, silent=False, member_type=None, checkNotSuspended=False):
+# The index, cache_dir/index.sqlite, is a snapshot of the users and groups of the account made by gam refresh index;
+# while it is younger than index_ttl minutes, ou, ou_and_children and all users are selected from it rather than
+# by listing the users.
+def getIndexFile():
+  return os.path.join(GC_Values[GC_CACHE_DIR], FN_INDEX_SQLITE)
+
+# An index saved by an earlier version of gam refresh index is not used
+INDEX_FORMAT = u'3'
+
+def openIndex():
+  if not GC_Values[GC_INDEX_TTL]:
+    return None
+  try:
+    import sqlite3
+  except ImportError:
+    return None
+  indexFile = getIndexFile()
+  if not os.path.isfile(indexFile):
+    return None
+  try:
+    db = sqlite3.connect(indexFile)
+    meta = dict(db.execute(u'SELECT key, value FROM meta'))
+    if (meta.get(u'format') == INDEX_FORMAT) and (meta.get(u'customer') == GC_Values[GC_CUSTOMER_ID]) and (time.time()-float(meta.get(u'refreshed', 0)) < GC_Values[GC_INDEX_TTL]*60):
+      return db
+    db.close()
+  except (sqlite3.Error, ValueError):
+    pass
+  return None
+
+# The members of a group are its direct members, as listed by members.list; a group that is not in the index,
+# e.g. one created after the index was saved, is selected by listing its members
+def getIndexedUsersToModify(entityType, entity, silent, checkNotSuspended, member_type=None):
+  if entityType == u'group':
+    group = normalizeEmailAddressOrUID(entity)
+  elif entityType in [u'ou', u'org', u'ou_and_children', u'ou_and_child']:
+    ou = makeOrgUnitPathAbsolute(entity)
+    if not ou.startswith(u'/'):
+      return None
+  elif (entityType != u'all') or (entity.lower() != u'users'):
+    return None
+  db = openIndex()
+  if not db:
+    return None
+  try:
+    if entityType == u'group':
+      groupRow = db.execute(u'SELECT emailLower FROM groups WHERE emailLower = ? OR id = ? UNION SELECT emailLower FROM group_aliases WHERE alias = ?',
+                            [group.lower(), group, group.lower()]).fetchone()
+      if not groupRow:
+        return None
+      query = u'SELECT email FROM group_members WHERE groupEmailLower = ?'
+      parameters = [groupRow[0]]
+      if member_type:
+        roles = member_type.upper().split(u',')
+        query += u' AND role IN ({0})'.format(u','.join([u'?']*len(roles)))
+        parameters.extend(roles)
+      rows = db.execute(query+u' ORDER BY rowid', parameters)
+    elif entityType == u'all':
+      rows = db.execute(u'SELECT primaryEmail FROM users WHERE suspended = 0 ORDER BY primaryEmailLower')
+    else:
+      query = u'SELECT primaryEmail FROM users WHERE (orgUnitPathLower = ?'
+      ou = ou.lower()
+      parameters = [ou]
+      if entityType in [u'ou_and_children', u'ou_and_child']:
+        query += u' OR substr(orgUnitPathLower, 1, ?) = ?'
+        parameters.extend([len(ou.rstrip(u'/'))+1, ou.rstrip(u'/')+u'/'])
+      query += u')'
+      if checkNotSuspended:
+        query += u' AND suspended = 0'
+      rows = db.execute(query+u' ORDER BY primaryEmailLower', parameters)
+    users = [row[0] for row in rows]
+  finally:
+    db.close()
+  if not silent:
+    sys.stderr.write(u"Got {0} {1} from the index.\n".format(len(users), u'members' if entityType == u'group' else u'users'))
+  return users
+
+def doRefreshIndex():
+  checkForExtraneousArguments()
+  try:
+    import sqlite3
+  except ImportError:
+    systemErrorExit(CONFIG_ERROR_RC, MESSAGE_GAM_REFRESH_INDEX_REQUIRES_SQLITE3)
+  def _getGroups():
+    groups.extend(callGAPIpages(buildGAPIObject(GAPI_DIRECTORY_API).groups(), u'list', u'groups',
+                                customer=GC_Values[GC_CUSTOMER_ID], fields=u'nextPageToken,groups(email,id,name,aliases,nonEditableAliases)'))
+
+  # The groups are listed while the users are listed, then the members of the groups are listed num_threads groups at a time
+  groups = []
+  groupsThread = CommandThreads()
+  groupsThread.start(_getGroups)
+  sys.stderr.write(u"Getting all users in G Suite account (may take some time on a large account)...\n")
+  fields = u'nextPageToken,users(primaryEmail,id,orgUnitPath,suspended)'
+  partitions = getUserListPartitions()
+  if partitions:
+    users = list(getUsersPartitioned(partitions, customer=GC_Values[GC_CUSTOMER_ID], fields=fields, maxResults=GC_Values[GC_USER_MAX_RESULTS]))
+  else:
+    users = callGAPIpages(buildGAPIObject(GAPI_DIRECTORY_API).users(), u'list', u'users', page_message=u'Got %%total_items%% users...',
+                          customer=GC_Values[GC_CUSTOMER_ID], fields=fields, maxResults=GC_Values[GC_USER_MAX_RESULTS])
+  groupsThread.join()
+  graph = getGroupMembersGraph([group[u'email'] for group in groups], False, fields=u'nextPageToken,members(email,role,type)')
+  # A group whose members could not be listed is left out so that it is selected by listing its members
+  groups = [group for group in groups if graph.get(group[u'email'].lower()) is not None]
+  # The new index replaces the old one when it is complete
+  indexFile = getIndexFile()
+  newIndexFile = indexFile+u'.new'
+  try:
+    if not os.path.isdir(GC_Values[GC_CACHE_DIR]):
+      os.makedirs(GC_Values[GC_CACHE_DIR])
+    if os.path.isfile(newIndexFile):
+      os.remove(newIndexFile)
+    os.close(os.open(newIndexFile, os.O_WRONLY|os.O_CREAT, 0o600))
+    db = sqlite3.connect(newIndexFile)
+    try:
+      db.execute(u'CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)')
+      db.execute(u'CREATE TABLE users (primaryEmail TEXT, primaryEmailLower TEXT PRIMARY KEY, id TEXT, orgUnitPath TEXT, orgUnitPathLower TEXT, suspended INTEGER)')
+      db.executemany(u'INSERT OR REPLACE INTO users VALUES (?, ?, ?, ?, ?, ?)',
+                     [(user[u'primaryEmail'], user[u'primaryEmail'].lower(), user[u'id'], user[u'orgUnitPath'], user[u'orgUnitPath'].lower(), int(user[u'suspended']))
+                      for user in users])
+      db.execute(u'CREATE INDEX users_id ON users (id)')
+      db.execute(u'CREATE INDEX users_orgunitpath ON users (orgUnitPathLower)')
+      db.execute(u'CREATE TABLE groups (email TEXT, emailLower TEXT PRIMARY KEY, id TEXT, name TEXT)')
+      db.executemany(u'INSERT OR REPLACE INTO groups VALUES (?, ?, ?, ?)',
+                     [(group[u'email'], group[u'email'].lower(), group[u'id'], group.get(u'name', u'')) for group in groups])
+      db.execute(u'CREATE INDEX groups_id ON groups (id)')
+      db.execute(u'CREATE TABLE group_aliases (alias TEXT PRIMARY KEY, emailLower TEXT)')
+      db.executemany(u'INSERT OR REPLACE INTO group_aliases VALUES (?, ?)',
+                     [(alias.lower(), group[u'email'].lower())
+                      for group in groups for alias in group.get(u'aliases', [])+group.get(u'nonEditableAliases', [])])
+      db.execute(u'CREATE TABLE group_members (groupEmailLower TEXT, email TEXT, role TEXT, type TEXT)')
+      db.executemany(u'INSERT INTO group_members VALUES (?, ?, ?, ?)',
+                     [(group[u'email'].lower(), member[u'email'], member.get(u'role', u''), member.get(u'type', u''))
+                      for group in groups for member in graph[group[u'email'].lower()] if u'email' in member])
+      db.execute(u'CREATE INDEX group_members_group ON group_members (groupEmailLower)')
+      db.executemany(u'INSERT INTO meta VALUES (?, ?)',
+                     [(u'format', INDEX_FORMAT), (u'customer', GC_Values[GC_CUSTOMER_ID]), (u'refreshed', repr(time.time()))])
+      db.commit()
+    finally:
+      db.close()
+    if GM_Globals[GM_WINDOWS] and os.path.isfile(indexFile):
+      os.remove(indexFile)
+    os.rename(newIndexFile, indexFile)
+  except (IOError, OSError, sqlite3.Error) as e:
+    systemErrorExit(FILE_ERROR_RC, e)
+  sys.stderr.write(u'Index of {0} users and {1} groups saved to {2}\n'.format(len(users), len(groups), indexFile))
+
+# useIndex=False when the users are those that a command changes, e.g. the current members of a group to sync
+def getUsersToModify(entityType, entity, silent=False, member_type=None, checkNotSuspended=False, useIndex=True):
+  if useIndex:
+    users = getIndexedUsersToModify(entityType, entity, silent, checkNotSuspended, member_type)
+    if users is not None:
+      return users
   cd = buildGAPIObject(GAPI_DIRECTORY_API)
   if entityType == u'user':
     users = [entity,]
@@ -3114,13 +4227,7 @@ def getUsersToModify(entityType, entity, silent=False, member_type=None, checkNo
     if not silent:
       sys.stderr.write(u"done.\r\n")
   elif entityType in [u'license', u'licenses', u'licence', u'licences']:
-    users = []
-    licenses = doPrintLicenses(return_list=True, skus=entity.split(u','))
-    for row in licenses:
-      try:
-        users.append(row[u'userId'])
-      except KeyError:
-        pass
+    users = [u_licenses[0][u'userId'] for u_licenses in buildUserToLicensesMap(entity.split(u',')).itervalues()]
   elif entityType == u'file':
     users = []
     encoding = getCharSet()
@@ -3179,10 +4286,16 @@ def getUsersToModify(entityType, entity, silent=False, member_type=None, checkNo
     if entity.lower() == u'users':
       if not silent:
         sys.stderr.write(u"Getting all users in G Suite account (may take some time on a large account)...\n")
-      page_message = u'Got %%total_items%% users...'
-      all_users = callGAPIpages(cd.users(), u'list', u'users', page_message=page_message,
-                                customer=GC_Values[GC_CUSTOMER_ID],
-                                fields=u'nextPageToken,users(primaryEmail,suspended)', maxResults=GC_Values[GC_USER_MAX_RESULTS])
+      partitions = getUserListPartitions()
+      if partitions:
+        all_users = getUsersPartitioned(partitions, silent=silent,
+                                        customer=GC_Values[GC_CUSTOMER_ID],
+                                        fields=u'nextPageToken,users(primaryEmail,suspended)', maxResults=GC_Values[GC_USER_MAX_RESULTS])
+      else:
+        page_message = u'Got %%total_items%% users...'
+        all_users = callGAPIpages(cd.users(), u'list', u'users', page_message=page_message,
+                                  customer=GC_Values[GC_CUSTOMER_ID],
+                                  fields=u'nextPageToken,users(primaryEmail,suspended)', maxResults=GC_Values[GC_USER_MAX_RESULTS])
       for member in all_users:
         if not member[u'suspended']:
           users.append(member[u'primaryEmail'])
@@ -3238,6 +4351,103 @@ def send_email(msg_subj, msg_txt, msg_rcpt=None):
   callGAPI(gmail.users().messages(), u'send',
            userId=sender_email, body={u'raw': base64.urlsafe_b64encode(msg.as_string())})
 
+# The column titles of a CSV file; the titles are also kept in a set so that
+# checking whether a row adds a title takes the same time however many titles there are
+class CSVTitles(list):
+  def __init__(self, titles=()):
+    super(CSVTitles, self).__init__(titles)
+    self._titles = set(self)
+
+  def _reset(self):
+    self._titles = set(list.__iter__(self))
+
+  def __contains__(self, title):
+    return title in self._titles
+
+  def append(self, title):
+    super(CSVTitles, self).append(title)
+    self._titles.add(title)
+
+  def insert(self, index, title):
+    super(CSVTitles, self).insert(index, title)
+    self._titles.add(title)
+
+  def extend(self, titles):
+    super(CSVTitles, self).extend(titles)
+    self._reset()
+
+  def remove(self, title):
+    super(CSVTitles, self).remove(title)
+    self._reset()
+
+  def pop(self, index=-1):
+    title = super(CSVTitles, self).pop(index)
+    self._reset()
+    return title
+
+  def __iadd__(self, titles):
+    self.extend(titles)
+    return self
+
+  def __setitem__(self, index, title):
+    super(CSVTitles, self).__setitem__(index, title)
+    self._reset()
+
+  def __delitem__(self, index):
+    super(CSVTitles, self).__delitem__(index)
+    self._reset()
+
+  def __setslice__(self, i, j, titles):
+    super(CSVTitles, self).__setslice__(i, j, titles)
+    self._reset()
+
+  def __delslice__(self, i, j):
+    super(CSVTitles, self).__delslice__(i, j)
+    self._reset()
+
+# The rows of a CSV file; the titles are only known after the last row has been added,
+# so the rows are pickled to a temporary file rather than held in memory
+class CSVRows(object):
+  def __init__(self):
+    self._file = tempfile.TemporaryFile()
+    self._count = 0
+
+  def __len__(self):
+    return self._count
+
+  def append(self, row):
+    cPickle.dump(row, self._file, cPickle.HIGHEST_PROTOCOL)
+    self._count += 1
+
+  # Rows can not be appended while the rows are being iterated
+  def __iter__(self):
+    self._file.flush()
+    self._file.seek(0)
+    try:
+      for _ in xrange(self._count):
+        yield cPickle.load(self._file)
+    finally:
+      self._file.seek(0, os.SEEK_END)
+
+  # Iterate over the rows; changes made to a row are kept
+  def rewrite(self):
+    rows, count = self._file, self._count
+    rows.flush()
+    rows.seek(0)
+    self._file = tempfile.TemporaryFile()
+    self._count = 0
+    try:
+      for _ in xrange(count):
+        row = cPickle.load(rows)
+        try:
+          yield row
+        finally:
+          self.append(row)
+    finally:
+      while self._count < count:
+        self.append(cPickle.load(rows))
+      rows.close()
+
 # Write a CSV file
 def addTitleToCSVfile(title, titles):
   titles.append(title)
@@ -3299,66 +4509,144 @@ def sortCSVTitles(firstTitle, titles):
   for title in restoreTitles[::-1]:
     titles.insert(0, title)
 
+OUTPUT_FORMAT_CHOICES = [u'csv', u'jsonl']
+
+# Print command output is written to stdout, compressed with gzip when output_gzip is true;
+# gam serve sends output to gamclient.py as text so its output is not compressed
+def openOutputStream():
+  if GC_Values[GC_OUTPUT_GZIP] and not (isinstance(sys.stdout, _ThreadOutput) and isinstance(sys.stdout.getThreadStream(), _ServeConnectionStream)):
+    import gzip
+    return gzip.GzipFile(filename=u'', mode=u'wb', fileobj=sys.stdout)
+  return sys.stdout
+
+def closeOutputStream(stream):
+  try:
+    if stream is not sys.stdout:
+      stream.close()
+    sys.stdout.flush()
+  except IOError as e:
+    systemErrorExit(6, e)
+
+def uploadOutputFileToDrive(outputFile, list_type, mimeType, convert):
+  drive = buildGAPIObject(GAPI_DRIVE_API)
+  result = callGAPIupload(drive.files(), DRIVE_CREATE_FILE,
+                          googleapiclient.http.MediaIoBaseUpload(outputFile, mimetype=mimeType, chunksize=GAPI_UPLOAD_CHUNK_SIZE, resumable=True),
+                          convert=convert, body={u'description': u' '.join(CL.argv), DRIVE_FILE_NAME: u'{0} - {1}'.format(GC_Values[GC_DOMAIN], list_type), u'mimeType': mimeType})
+  file_url = result[DRIVE_FILE_VIEW_LINK]
+  if GC_Values[GC_NO_BROWSER]:
+    msg_txt = u'Drive file uploaded to:\n %s' % file_url
+    msg_subj = u'%s - %s' % (GC_Values[GC_DOMAIN], list_type)
+    send_email(msg_subj, msg_txt)
+    print msg_txt
+  else:
+    import webbrowser
+    webbrowser.open(file_url)
+
 def writeCSVfile(csvRows, titles, list_type, todrive):
   csv.register_dialect(u'nixstdout', lineterminator=u'\n')
   if todrive:
-    string_file = StringIO.StringIO()
-    writer = csv.DictWriter(string_file, fieldnames=titles,
-                            dialect=u'nixstdout', quoting=csv.QUOTE_MINIMAL, delimiter=str(GC_Values[GC_CSV_OUTPUT_COLUMN_DELIMITER]))
+    csv_file = tempfile.TemporaryFile()
   else:
-    writer = csv.DictWriter(sys.stdout, fieldnames=titles,
-                            dialect=u'nixstdout', quoting=csv.QUOTE_MINIMAL, delimiter=str(GC_Values[GC_CSV_OUTPUT_COLUMN_DELIMITER]))
+    csv_file = openOutputStream()
+  writer = csv.DictWriter(csv_file, fieldnames=titles,
+                          dialect=u'nixstdout', quoting=csv.QUOTE_MINIMAL, delimiter=str(GC_Values[GC_CSV_OUTPUT_COLUMN_DELIMITER]))
   try:
     writer.writerow(dict((item, item) for item in writer.fieldnames))
-    writer.writerows(csvRows)
+    for row in csvRows:
+      writer.writerow(row)
   except IOError as e:
     systemErrorExit(6, e)
   if todrive:
-    columns = len(csvRows[0])
+    columns = len(titles)
     rows = len(csvRows)
     cell_count = rows * columns
     convert = True
     if cell_count > 500000 or columns > 256:
       print u'{0}{1}'.format(WARNING_PREFIX, MESSAGE_RESULTS_TOO_LARGE_FOR_GOOGLE_SPREADSHEET)
       convert = False
-    drive = buildGAPIObject(GAPI_DRIVE_API)
-    result = callGAPI(drive.files(), DRIVE_CREATE_FILE,
-                      convert=convert, body={u'description': u' '.join(CL_argv), DRIVE_FILE_NAME: u'{0} - {1}'.format(GC_Values[GC_DOMAIN], list_type), u'mimeType': u'text/csv'},
-                      media_body=googleapiclient.http.MediaInMemoryUpload(string_file.getvalue(), mimetype=u'text/csv'))
-    file_url = result[DRIVE_FILE_VIEW_LINK]
-    if GC_Values[GC_NO_BROWSER]:
-      msg_txt = u'Drive file uploaded to:\n %s' % file_url
-      msg_subj = u'%s - %s' % (GC_Values[GC_DOMAIN], list_type)
-      send_email(msg_subj, msg_txt)
-      print msg_txt
+    uploadOutputFileToDrive(csv_file, list_type, u'text/csv', convert)
+  else:
+    closeOutputStream(csv_file)
+
+# Print commands with format jsonl write each object as a line of JSON as soon as it is retrieved;
+# the objects are not flattened and no titles are collected
+class JSONLinesWriter(object):
+  def __init__(self, list_type, todrive):
+    self._list_type = list_type
+    self._todrive = todrive
+    if todrive:
+      self._file = tempfile.TemporaryFile()
     else:
-      import webbrowser
-      webbrowser.open(file_url)
+      self._file = openOutputStream()
+
+  def write(self, item):
+    try:
+      self._file.write(json.dumps(item, ensure_ascii=False, sort_keys=True).encode(u'utf-8')+'\n')
+    except IOError as e:
+      systemErrorExit(6, e)
+
+  def close(self):
+    if self._todrive:
+      uploadOutputFileToDrive(self._file, self._list_type, u'application/json', False)
+    else:
+      closeOutputStream(self._file)
 
 def convertCRsNLs(value):
   return value.replace(u'\r', u'\\r').replace(u'\n', u'\\n')
 
-def flattenJSON(structure, key=u'', path=u'', flattened=None, listLimit=None):
+# Columns are named by the path to each value, list items by their index; each list also has a column with its length.
+# wantedFields are API field names as in the fields parameter, e.g. name.fullName, where list indices are not part of the name;
+# when specified, only the columns that the API would return for those fields are flattened and other values are skipped.
+# Each level of the structure is a (items, path, prefix, fieldPath, wanted, isDict) entry on a stack; items is an iterator
+# so that a level resumes where it left off when the levels below it are done
+def flattenJSON(structure, key=u'', path=u'', flattened=None, listLimit=None, wantedFields=None):
   if flattened is None:
     flattened = {}
-  if not isinstance(structure, (dict, list)):
-    if isinstance(structure, (str, unicode)) and GC_Values[GC_CSV_OUTPUT_CONVERT_CR_NL]:
-      flattened[((path+u'.') if path else u'')+key] = convertCRsNLs(structure)
-    else:
-      flattened[((path+u'.') if path else u'')+key] = structure
-  elif isinstance(structure, list):
-    listLen = len(structure)
-    listLen = min(listLen, listLimit or listLen)
-    flattened[((path+u'.') if path else u'')+key] = listLen
-    for i in xrange(listLen):
-      flattenJSON(structure[i], u'{0}'.format(i), u'.'.join([item for item in [path, key] if item]), flattened, listLimit)
-  else:
-    for new_key, value in structure.items():
-      if new_key in [u'kind', u'etag']:
-        continue
-      if value == NEVER_TIME:
-        value = u'Never'
-      flattenJSON(value, new_key, u'.'.join([item for item in [path, key] if item]), flattened, listLimit)
+  convertCRNL = GC_Values[GC_CSV_OUTPUT_CONVERT_CR_NL]
+  if wantedFields is not None:
+    wantedParents = set()
+    for field in wantedFields:
+      while u'.' in field:
+        field = field.rsplit(u'.', 1)[0]
+        wantedParents.add(field)
+  stack = [(iter([(key, structure)]), path, (path+u'.') if path else u'', u'', wantedFields is None, False)]
+  while stack:
+    items, path, prefix, fieldPath, wanted, isDict = stack[-1]
+    for key, value in items:
+      if isDict:
+        if key in [u'kind', u'etag']:
+          continue
+        if value == NEVER_TIME:
+          value = u'Never'
+      fieldName = fieldPath
+      valueWanted = wanted
+      if not wanted:
+        if isDict:
+          fieldName = (fieldPath+u'.'+key) if fieldPath else key
+        if fieldName in wantedFields:
+          valueWanted = True
+        elif fieldName and fieldName not in wantedParents:
+          continue
+      name = prefix+key
+      if isinstance(value, dict):
+        childPath = name if key or not path else path
+        stack.append((value.iteritems(), childPath, (childPath+u'.') if childPath else u'', fieldName, valueWanted, True))
+        break
+      elif isinstance(value, list):
+        listLen = len(value)
+        listLen = min(listLen, listLimit or listLen)
+        if valueWanted or fieldName:
+          flattened[name] = listLen
+        childPath = name if key or not path else path
+        stack.append((itertools.izip(itertools.imap(unicode, xrange(listLen)), value), childPath, (childPath+u'.') if childPath else u'', fieldName, valueWanted, False))
+        break
+      elif valueWanted:
+        if convertCRNL and isinstance(value, (str, unicode)):
+          flattened[name] = convertCRsNLs(value)
+        else:
+          flattened[name] = value
+    else:
+      stack.pop()
   return flattened
 
 def showJSON(object_name, object_value, skip_objects=None, level=0, spacing=u''):
@@ -3415,7 +4703,7 @@ def showJSON(object_name, object_value, skip_objects=None, level=0, spacing=u'')
 def doVersion(checkForArgs=True):
   forceCheck = simple = False
   if checkForArgs:
-    while CL_argvI < CL_argvLen:
+    while CL.argvI < CL.argvLen:
       myarg = getArgument()
       if myarg == u'check':
         forceCheck = True
@@ -3440,36 +4728,187 @@ def showUsage():
   sys.stdout.write(MESSAGE_HELP_SYNTAX.format(os.path.join(GM_Globals[GM_GAM_PATH], FN_GAMCOMMANDS_TXT)))
   sys.stdout.write(MESSAGE_HELP_WIKI.format(GAM_WIKI))
 
+# Throttling errors (GAPI_DEFAULT_RETRY_REASONS) seen by callGAPI are counted in GM_Globals[GM_BATCH_THROTTLE],
+# the counters of the gam batch|csv running the command; None when the command is not run by gam batch|csv
+BATCH_THROTTLE_REASON_LENGTH = 63
+# Seconds between checks for batch_mode processes workers that died while running a command
+BATCH_PROCESS_CHECK_INTERVAL = 1
+
+def initializeBatchThrottle(throttle):
+  GM_Globals[GM_BATCH_THROTTLE] = throttle
+
+def recordBatchThrottleEvent(reason):
+  throttle = GM_Globals[GM_BATCH_THROTTLE]
+  if throttle is not None:
+    throttleEvents, throttleReason = throttle
+    with throttleEvents.get_lock():
+      throttleEvents.value += 1
+      throttleReason.value = str(reason)[:BATCH_THROTTLE_REASON_LENGTH]
+
+# Additive increase/multiplicative decrease of the number of batch commands running at once, between 1 and num_threads.
+# When a command finishes and there have been throttling errors, the limit is halved; the commands that were already
+# running when the limit was halved don't halve it again. After limit commands finish without throttling errors,
+# the limit is increased by one. Each batch has its own throttling error counters, multiprocessing.Values so that
+# batch_mode processes workers can update them.
+class BatchConcurrency(object):
+  def __init__(self, maxLimit):
+    self.maxLimit = maxLimit
+    self.limit = maxLimit
+    self.running = 0
+    self.completed = 0
+    self.hold = 0
+    self.throttle = (multiprocessing.Value(u'i', 0), multiprocessing.Array(u'c', BATCH_THROTTLE_REASON_LENGTH+1))
+    self.throttleEvents = 0
+    self.condition = threading.Condition()
+
+  # check, if specified, is called every checkInterval seconds while waiting, e.g. to release the slots of lost commands
+  def acquire(self, check=None, checkInterval=None):
+    with self.condition:
+      while self.running >= self.limit:
+        self.condition.wait(checkInterval)
+        if check:
+          check()
+      self.running += 1
+
+  def waitForAll(self, check=None, checkInterval=None):
+    with self.condition:
+      while self.running > 0:
+        self.condition.wait(checkInterval)
+        if check:
+          check()
+
+  def release(self, result=None):
+    with self.condition:
+      self.running -= 1
+      self.completed += 1
+      if self.hold > 0:
+        self.hold -= 1
+      with self.throttle[0].get_lock():
+        throttleEvents = self.throttle[0].value
+        reason = self.throttle[1].value
+      if throttleEvents != self.throttleEvents:
+        newEvents = throttleEvents-self.throttleEvents
+        self.throttleEvents = throttleEvents
+        if (self.hold == 0) and (self.limit > 1):
+          self._setLimit(max(1, self.limit//2), u'{0} throttling errors, last: {1}'.format(newEvents, reason))
+          self.hold = self.running
+      elif (self.completed >= self.limit) and (self.limit < self.maxLimit):
+        self._setLimit(self.limit+1, u'no throttling errors in last {0} commands'.format(self.completed))
+      self.condition.notify_all()
+
+  def _setLimit(self, limit, why):
+    sys.stderr.write(u'Batch concurrency {0} -> {1}: {2}\n'.format(self.limit, limit, why))
+    self.limit = limit
+    self.completed = 0
+
+def ProcessGAMCommandThread(commandQueue, threadStreams, concurrency):
+  GM_Globals[GM_BATCH_THREAD] = True
+  initializeBatchThrottle(concurrency.throttle)
+  for stream, threadStream in zip([sys.stdout, sys.stderr], threadStreams):
+    if threadStream:
+      stream.setThreadStream(threadStream)
+  while True:
+    item = commandQueue.get()
+    try:
+      if item is None:
+        return
+      ProcessGAMCommand(item)
+    except SystemExit:
+      pass
+    except Exception as e:
+      stderrErrorMsg(u'{0}: {1}'.format(makeQuotedList(item), e))
+    finally:
+      if item is not None:
+        concurrency.release()
+      commandQueue.task_done()
+
+# Run the commands in threads of this process; the parsed configuration, credentials and discovery documents
+# are shared by all of the threads, each thread has its own command line arguments and GM_Globals
+def run_batch_threads(items, num_worker_threads, concurrency):
+  import Queue
+  commandQueue = Queue.Queue()
+  resolveDomainAndCustomerId()
+  sys.stderr.write(PHRASE_STARTING_N_WORKER_THREADS.format(num_worker_threads))
+  # Under gam serve, the workers write to the connection of the command that started them
+  threadStreams = [stream.getThreadStream() if isinstance(stream, _ThreadOutput) else None for stream in [sys.stdout, sys.stderr]]
+  workers = []
+  for _ in range(num_worker_threads):
+    worker = threading.Thread(target=ProcessGAMCommandThread, args=(commandQueue, threadStreams, concurrency))
+    worker.daemon = True
+    worker.start()
+    workers.append(worker)
+  for item in items:
+    if item[0] == COMMIT_BATCH_CMD:
+      sys.stderr.write(u'commit-batch - waiting for running threads to finish before proceeding...')
+      commandQueue.join()
+      sys.stderr.write(u'done with commit-batch\n')
+      continue
+    concurrency.acquire()
+    commandQueue.put(item)
+  for _ in workers:
+    commandQueue.put(None)
+  for worker in workers:
+    worker.join()
+
+# Items can be a list or a generator; an item is only read when a worker is available to run it,
+# so a generator is consumed as the workers make progress
 def run_batch(items):
-  from multiprocessing import Pool
-  if not items:
+  items = iter(items)
+  # Only read enough items to size the pool, the workers start on these while the rest are read
+  firstItems = list(itertools.islice(items, GC_Values[GC_NUM_THREADS]))
+  if not firstItems:
+    return
+  num_worker_threads = len(firstItems)
+  items = itertools.chain(firstItems, items)
+  concurrency = BatchConcurrency(num_worker_threads)
+  if (GC_Values[GC_BATCH_MODE] == u'threads') or GM_Globals[GM_BATCH_THREAD]:
+    run_batch_threads(items, num_worker_threads, concurrency)
     return
-  num_worker_threads = min(len(items), GC_Values[GC_NUM_THREADS])
-  pool = Pool(processes=num_worker_threads)
+  # The callback only runs when a command returns; a worker that dies, e.g. killed by the system, loses the command it
+  # was running and the pool replaces it, so a slot is released for each worker that is no longer in the pool.
+  # The pool's result handler waits for the lost commands, so a pool that lost commands is terminated once the others finish.
+  def _releaseLostCommands():
+    poolWorkers = set(pool._pool)
+    for worker in workers-poolWorkers:
+      if worker.exitcode is not None:
+        workers.discard(worker)
+        lostCommands[0] += 1
+        concurrency.release()
+    workers.update(poolWorkers)
+
+  def _startPool():
+    newPool = multiprocessing.Pool(processes=num_worker_threads, initializer=initializeBatchThrottle, initargs=(concurrency.throttle,))
+    workers.clear()
+    workers.update(newPool._pool)
+    lostCommands[0] = 0
+    return newPool
+
+  def _stopPool():
+    concurrency.waitForAll(_releaseLostCommands, BATCH_PROCESS_CHECK_INTERVAL)
+    if lostCommands[0]:
+      stderrErrorMsg(u'{0} batch commands did not complete, their gam processes exited'.format(lostCommands[0]))
+      pool.terminate()
+    else:
+      pool.close()
+    pool.join()
+
+  workers = set()
+  lostCommands = [0]
+  pool = _startPool()
   sys.stderr.write(u'Using %s processes...\n' % num_worker_threads)
   for item in items:
-    if item[0] == u'commit-batch':
+    if item[0] == COMMIT_BATCH_CMD:
       sys.stderr.write(u'commit-batch - waiting for running processes to finish before proceeding...')
-      pool.close()
-      pool.join()
-      pool = Pool(processes=num_worker_threads)
+      _stopPool()
+      pool = _startPool()
       sys.stderr.write(u'done with commit-batch\n')
       continue
-    pool.apply_async(ProcessGAMCommandNoQueue, [item])
-  pool.close()
-  pool.join()
+    concurrency.acquire(_releaseLostCommands, BATCH_PROCESS_CHECK_INTERVAL)
+    pool.apply_async(ProcessGAMCommandNoQueue, [item], callback=concurrency.release)
+  _stopPool()
 
-def doBatch():
+def getBatchItems(f, batchFile):
   import shlex
-  filename = getString(OB_FILE_NAME)
-  if (filename == u'-') and (GC_Values[GC_DEBUG_LEVEL] > 0):
-    putArgumentBack()
-    usageErrorExit(MESSAGE_BATCH_CSV_DASH_DEBUG_INCOMPATIBLE.format(u'batch'))
-  encoding = getCharSet()
-  checkForExtraneousArguments()
-  items = []
-  f = openFile(filename)
-  batchFile = UTF8Recoder(f, encoding) if encoding != u'utf-8' else f
   try:
     for line in batchFile:
       argv = shlex.split(line)
@@ -3479,9 +4918,9 @@ def doBatch():
       if (not cmd) or cmd.startswith(u'#') or ((len(argv) == 1) and (cmd != COMMIT_BATCH_CMD)):
         continue
       if cmd == GAM_CMD:
-        items.append([arg.encode(GM_Globals[GM_SYS_ENCODING]) for arg in argv])
+        yield [arg.encode(GM_Globals[GM_SYS_ENCODING]) for arg in argv]
       elif cmd == COMMIT_BATCH_CMD:
-        items.append([cmd])
+        yield [cmd]
       else:
         sys.stderr.write(u'Command: >>>{0}<<< {1}\n'.format(makeQuotedList([argv[0]]), makeQuotedList(argv[1:])))
         stderrErrorMsg(u'{0}: {1} <{2}>'.format(ARGUMENT_ERROR_NAMES[ARGUMENT_INVALID][1],
@@ -3489,12 +4928,23 @@ def doBatch():
                                                 formatChoiceList([GAM_CMD, COMMIT_BATCH_CMD])))
   except IOError as e:
     systemErrorExit(FILE_ERROR_RC, e)
-  closeFile(f)
-  run_batch(items)
+  finally:
+    closeFile(f)
+
+def doBatch():
+  filename = getString(OB_FILE_NAME)
+  if (filename == u'-') and (GC_Values[GC_DEBUG_LEVEL] > 0):
+    putArgumentBack()
+    usageErrorExit(MESSAGE_BATCH_CSV_DASH_DEBUG_INCOMPATIBLE.format(u'batch'))
+  encoding = getCharSet()
+  checkForExtraneousArguments()
+  f = openFile(filename)
+  batchFile = UTF8Recoder(f, encoding) if encoding != u'utf-8' else f
+  run_batch(getBatchItems(f, batchFile))
 
 def runCmdForUsers(cmd, users, **kwargs):
   if (GC_Values[GC_AUTO_BATCH_MIN] < 0) and (len(users) > -GC_Values[GC_AUTO_BATCH_MIN]):
-    run_batch([[u'gam', u'user', user]+CL_argv[CL_argvI-1:] for user in users])
+    run_batch([[u'gam', u'user', user]+CL.argv[CL.argvI-1:] for user in users])
   else:
     cmd(users, **kwargs)
 
@@ -3515,12 +4965,11 @@ RE_TYPE = u're'
 # Example: update user '~User' address type work unstructured '~~Street~~, ~~City~~, ~~State~~ ~~ZIP~~' primary
 # {2: [('sub', 'User', 0, 5)], 7: [('sub', 'Street', 0, 10), ('sub', 'City', 12, 20), ('sub', 'State', 22, 31), ('sub', 'ZIP', 32, 39)]}
 def getSubFields(initial_argv, fieldNames):
-  global CL_argvI
   subFields = {}
   GAM_argv = initial_argv[:]
   GAM_argvI = len(GAM_argv)
-  while CL_argvI < CL_argvLen:
-    myarg = CL_argv[CL_argvI]
+  while CL.argvI < CL.argvLen:
+    myarg = CL.argv[CL.argvI]
     if not myarg:
       GAM_argv.append(myarg)
     elif SUB_PATTERN.search(myarg):
@@ -3557,7 +5006,7 @@ def getSubFields(initial_argv, fieldNames):
     else:
       GAM_argv.append(myarg.encode(GM_Globals[GM_SYS_ENCODING]))
     GAM_argvI += 1
-    CL_argvI += 1
+    CL.argvI += 1
   return(GAM_argv, subFields)
 
 def processSubFields(GAM_argv, row, subFields):
@@ -3579,6 +5028,14 @@ def processSubFields(GAM_argv, row, subFields):
     argv[GAM_argvI] = argv[GAM_argvI].encode(GM_Globals[GM_SYS_ENCODING])
   return argv
 
+def getCSVItems(f, csvFile, matchFields, GAM_argv, subFields):
+  try:
+    for row in csvFile:
+      if (not matchFields) or checkMatchFields(row, matchFields):
+        yield [GAM_CMD]+processSubFields(GAM_argv, row, subFields)
+  finally:
+    closeFile(f)
+
 def doCSV():
   filename = getString(OB_FILE_NAME)
   if (filename == u'-') and (GC_Values[GC_DEBUG_LEVEL] > 0):
@@ -3587,15 +5044,160 @@ def doCSV():
   f, csvFile = openCSVFileReader(filename)
   matchFields = getMatchFields(csvFile.fieldnames)
   checkArgumentPresent([GAM_CMD,], required=True)
-  if CL_argvI == CL_argvLen:
+  if CL.argvI == CL.argvLen:
     missingArgumentExit(OB_GAM_ARGUMENT_LIST)
   GAM_argv, subFields = getSubFields([], csvFile.fieldnames)
-  items = []
-  for row in csvFile:
-    if (not matchFields) or checkMatchFields(row, matchFields):
-      items.append([GAM_CMD]+processSubFields(GAM_argv, row, subFields))
-  closeFile(f)
-  run_batch(items)
+  run_batch(getCSVItems(f, csvFile, matchFields, GAM_argv, subFields))
+
+# gam serve
+# Each connection sends one JSON line {"argv": ["gam", ...]}; the command's output is returned as
+# JSON lines {"stdout": text} and {"stderr": text} followed by {"rc": returnCode}
+class _ThreadOutput(object):
+  def __init__(self, stream):
+    self._stream = stream
+    self._local = threading.local()
+
+  def __getattr__(self, name):
+    return getattr(self._stream, name)
+
+  def _target(self):
+    return self.getThreadStream() or self._stream
+
+  def getThreadStream(self):
+    return getattr(self._local, u'stream', None)
+
+  def setThreadStream(self, stream):
+    self._local.stream = stream
+
+  def write(self, data):
+    self._target().write(data)
+
+  def writelines(self, lines):
+    for line in lines:
+      self.write(line)
+
+  def flush(self):
+    self._target().flush()
+
+class _ServeConnectionStream(object):
+  def __init__(self, connection, lock, key):
+    self._connection = connection
+    self._lock = lock
+    self._key = key
+    self.encoding = u'utf-8'
+
+  def write(self, data):
+    if not data:
+      return
+    if not isinstance(data, unicode):
+      data = data.decode(u'utf-8', u'replace')
+    with self._lock:
+      self._connection.sendall(json.dumps({self._key: data})+'\n')
+
+  def flush(self):
+    pass
+
+def ProcessGAMServeConnection(connectionQueue):
+  GM_Globals[GM_BATCH_THREAD] = True
+  while True:
+    connection = connectionQueue.get()
+    if connection is None:
+      return
+    lock = threading.Lock()
+    try:
+      sys.stdout.setThreadStream(_ServeConnectionStream(connection, lock, u'stdout'))
+      sys.stderr.setThreadStream(_ServeConnectionStream(connection, lock, u'stderr'))
+      try:
+        argv = json.loads(connection.makefile(u'rb').readline())[u'argv']
+        args = [arg.encode(GM_Globals[GM_SYS_ENCODING]) for arg in argv]
+      except (ValueError, KeyError, TypeError, AttributeError) as e:
+        stderrErrorMsg(e)
+        rc = USAGE_ERROR_RC
+      else:
+        try:
+          rc = ProcessGAMCommand(args)
+        except SystemExit:
+          rc = GM_Globals[GM_SYSEXITRC]
+      with lock:
+        connection.sendall(json.dumps({u'rc': rc})+'\n')
+    except (socket.error, SystemExit):
+      pass
+    except Exception as e:
+      sys.__stderr__.write(convertUTF8(u'\n{0}{1}\n'.format(ERROR_PREFIX, e)))
+    finally:
+      sys.stdout.setThreadStream(None)
+      sys.stderr.setThreadStream(None)
+      try:
+        connection.close()
+      except socket.error:
+        pass
+
+# Credentials, discovery documents and the API services/HTTP connections of each worker thread
+# are kept between commands so only the first command run by a worker pays for them
+def doServe():
+  import Queue
+  import signal
+
+  def _stopServe(signum, frame):
+    raise KeyboardInterrupt
+
+  if GM_Globals[GM_BATCH_THREAD]:
+    usageErrorExit(MESSAGE_GAM_SERVE_NOT_IN_BATCH_OR_SERVE)
+  socketFile = GC_Values[GC_SERVE_SOCKET]
+  while CL.argvI < CL.argvLen:
+    myarg = getArgument()
+    if myarg == u'socket':
+      socketFile = os.path.expanduser(getString(OB_FILE_NAME))
+    else:
+      unknownArgumentExit()
+  if not hasattr(socket, u'AF_UNIX'):
+    systemErrorExit(SOCKET_ERROR_RC, MESSAGE_GAM_SERVE_REQUIRES_UNIX_SOCKETS)
+  if os.path.exists(socketFile):
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+      probe.connect(socketFile)
+      systemErrorExit(SOCKET_ERROR_RC, MESSAGE_GAM_SERVE_ALREADY_RUNNING.format(socketFile))
+    except socket.error:
+      os.remove(socketFile)
+    finally:
+      probe.close()
+  server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  oldUmask = os.umask(0o077)
+  try:
+    server.bind(socketFile)
+  except socket.error as e:
+    systemErrorExit(SOCKET_ERROR_RC, u'{0}: {1}'.format(socketFile, e))
+  finally:
+    os.umask(oldUmask)
+  server.listen(GC_Values[GC_NUM_THREADS])
+  sys.stdout.flush()
+  sys.stdout = _ThreadOutput(sys.stdout)
+  sys.stderr = _ThreadOutput(sys.stderr)
+  connectionQueue = Queue.Queue()
+  resolveDomainAndCustomerId()
+  sys.stderr.write(PHRASE_STARTING_N_WORKER_THREADS.format(GC_Values[GC_NUM_THREADS]))
+  workers = []
+  for _ in range(GC_Values[GC_NUM_THREADS]):
+    worker = threading.Thread(target=ProcessGAMServeConnection, args=(connectionQueue,))
+    worker.daemon = True
+    worker.start()
+    workers.append(worker)
+  signal.signal(signal.SIGTERM, _stopServe)
+  sys.stderr.write(u'gam serve listening on {0}\n'.format(socketFile))
+  try:
+    while True:
+      connection, _ = server.accept()
+      connectionQueue.put(connection)
+  except KeyboardInterrupt:
+    pass
+  finally:
+    server.close()
+    os.remove(socketFile)
+  sys.stderr.write(PHRASE_WAITING_FOR_PROCESSES_TO_COMPLETE+u'\n')
+  for _ in workers:
+    connectionQueue.put(None)
+  for worker in workers:
+    worker.join()
 
 class cmd_flags(object):
   def __init__(self, noLocalWebserver):
@@ -3816,15 +5418,17 @@ Append an 'r' to grant read-only access or an 'a' to grant action-only access.
                                                  client_secret=client_secret, scope=scopes, redirect_uri=oauth2client.client.OOB_CALLBACK_URN,
                                                  user_agent=GAM_INFO, access_type=u'offline', response_type=u'code', login_hint=login_hint)
   storage, _ = getOauth2TxtStorageCredentials()
-  http = httplib2.Http(disable_ssl_certificate_validation=GC_Values[GC_NO_VERIFY_SSL])
+  http = getHttpObj()
   flags = cmd_flags(noLocalWebserver=GC_Values[GC_NO_BROWSER])
   try:
     oauth2client.tools.run_flow(flow=flow, storage=storage, flags=flags, http=http)
   except httplib2.CertificateValidationUnsupported:
     noPythonSSLExit()
+  clearOauth2TxtCredentials()
 
 def doOAuthDelete():
   checkForExtraneousArguments()
+  clearOauth2TxtCredentials()
   _, credentials = getOauth2TxtStorageCredentials()
   if credentials is None or credentials.invalid:
     os.remove(GC_Values[GC_OAUTH2_TXT])
@@ -3841,7 +5445,7 @@ def doOAuthDelete():
   time.sleep(1)
   sys.stderr.write(u'boom!\n')
   try:
-    credentials.revoke(httplib2.Http(disable_ssl_certificate_validation=GC_Values[GC_NO_VERIFY_SSL]))
+    credentials.revoke(getHttpObj())
   except oauth2client.client.TokenRevokeError as e:
     stderrErrorMsg(e.message)
     os.remove(GC_Values[GC_OAUTH2_TXT])
@@ -3855,7 +5459,7 @@ def doOAuthInfo():
       doOAuthRequest()
       credentials = storage.get()
     credentials.user_agent = GAM_INFO
-    http = httplib2.Http(disable_ssl_certificate_validation=GC_Values[GC_NO_VERIFY_SSL])
+    http = getHttpObj()
     if credentials.access_token_expired:
       credentials.refresh(http)
     access_token = credentials.access_token
@@ -3923,7 +5527,9 @@ def doCheckServiceAccount(users):
     for scope in all_scopes:
       try:
         credentials = getSvcAcctCredentials(scope, user)
-        credentials.refresh(httplib2.Http(disable_ssl_certificate_validation=GC_Values[GC_NO_VERIFY_SSL]))
+        # Always ask Google, a cached token would hide a revoked authorization
+        credentials.set_store(None)
+        credentials.refresh(getHttpObj())
         result = u'PASS'
       except httplib2.ServerNotFoundError as e:
         systemErrorExit(4, e)
@@ -3991,8 +5597,9 @@ def showReport():
     customerId = None
   try_date = filters = parameters = actorIpAddress = startTime = endTime = eventName = None
   to_drive = False
+  outputFormat = u'csv'
   userKey = u'all'
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'date':
       try_date = getYYYYMMDD()
@@ -4012,6 +5619,8 @@ def showReport():
       actorIpAddress = getString(OB_STRING)
     elif myarg == u'todrive':
       to_drive = True
+    elif myarg == u'format':
+      outputFormat = getChoice(OUTPUT_FORMAT_CHOICES)
     else:
       unknownArgumentExit()
   if try_date is None:
@@ -4030,7 +5639,13 @@ def showReport():
       except KeyError:
         raise
       try_date = _adjustDate(message)
-    titles = [u'email', u'date']
+    if outputFormat == u'jsonl':
+      jsonLines = JSONLinesWriter(u'User Reports - %s' % try_date, to_drive)
+      while feed:
+        jsonLines.write(feed.popleft())
+      jsonLines.close()
+      return
+    titles = CSVTitles([u'email', u'date'])
     csvRows = []
     while feed:
       user_report = feed.popleft()
@@ -4060,7 +5675,13 @@ def showReport():
       except KeyError:
         raise
       try_date = _adjustDate(message)
-    titles = [u'name', u'value', u'client_id']
+    if outputFormat == u'jsonl':
+      jsonLines = JSONLinesWriter(u'Customer Report - %s' % try_date, to_drive)
+      for item in usage:
+        jsonLines.write(item)
+      jsonLines.close()
+      return
+    titles = CSVTitles([u'name', u'value', u'client_id'])
     csvRows = []
     auth_apps = []
     for item in usage[0][u'parameters']:
@@ -4086,24 +5707,31 @@ def showReport():
     writeCSVfile(csvRows, titles, u'Customer Report - %s' % try_date, todrive=to_drive)
   else:
     page_message = u'Got %%num_items%% items\n'
-    feed = callGAPIpages(rep.activities(), u'list', u'items', page_message=page_message, applicationName=report,
-                         userKey=userKey, customerId=customerId, actorIpAddress=actorIpAddress,
-                         startTime=startTime, endTime=endTime, eventName=eventName, filters=filters)
-    if feed:
-      titles = [u'name']
-      csvRows = []
-      while feed:
-        activity = feed.popleft()
-        events = activity[u'events']
-        del activity[u'events']
-        activity_row = flattenJSON(activity)
-        for event in events:
-          row = flattenJSON(event)
-          row.update(activity_row)
-          for item in row:
-            if item not in titles:
-              titles.append(item)
-          csvRows.append(row)
+    titles = CSVTitles([u'name'])
+    csvRows = CSVRows()
+    activities = 0
+    jsonLines = JSONLinesWriter(u'%s Activity Report' % report.capitalize(), to_drive) if outputFormat == u'jsonl' else None
+    for activity in yieldGAPIpages(rep.activities(), u'list', u'items', page_message=page_message, applicationName=report,
+                                   userKey=userKey, customerId=customerId, actorIpAddress=actorIpAddress,
+                                   startTime=startTime, endTime=endTime, eventName=eventName, filters=filters,
+                                   prefetch=GC_Values[GC_PREFETCH_PAGES]):
+      activities += 1
+      if jsonLines:
+        jsonLines.write(activity)
+        continue
+      events = activity[u'events']
+      del activity[u'events']
+      activity_row = flattenJSON(activity)
+      for event in events:
+        row = flattenJSON(event)
+        row.update(activity_row)
+        for item in row:
+          if item not in titles:
+            titles.append(item)
+        csvRows.append(row)
+    if jsonLines:
+      jsonLines.close()
+    elif activities:
       sortCSVTitles([u'name',], titles)
       writeCSVfile(csvRows, titles, u'%s Activity Report' % report.capitalize(), to_drive)
 
@@ -4132,9 +5760,9 @@ def doInfoDomainAlias():
 def doPrintDomainAliases():
   cd = buildGAPIObject(GAPI_DIRECTORY_API)
   todrive = False
-  titles = [u'domainAliasName',]
+  titles = CSVTitles([u'domainAliasName',])
   csvRows = []
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'todrive':
       todrive = True
@@ -4165,7 +5793,7 @@ def doUpdateDomain():
   cd = buildGAPIObject(GAPI_DIRECTORY_API)
   domainName = getString(OB_DOMAIN_NAME)
   body = {}
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'primary':
       body[u'customerDomain'] = domainName
@@ -4181,7 +5809,7 @@ def doDeleteDomain():
   callGAPI(cd.domains(), u'delete', customer=GC_Values[GC_CUSTOMER_ID], domainName=domainName)
 
 def doInfoDomain():
-  if (CL_argvI == CL_argvLen) or (CL_argv[CL_argvI].lower() == u'logo'):
+  if (CL.argvI == CL.argvLen) or (CL.argv[CL.argvI].lower() == u'logo'):
     doInfoInstance()
     return
   cd = buildGAPIObject(GAPI_DIRECTORY_API)
@@ -4199,9 +5827,9 @@ def doInfoDomain():
 def doPrintDomains():
   cd = buildGAPIObject(GAPI_DIRECTORY_API)
   todrive = False
-  titles = [u'domainName',]
+  titles = CSVTitles([u'domainName',])
   csvRows = []
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'todrive':
       todrive = True
@@ -4240,10 +5868,10 @@ def doPrintDomains():
 def doPrintAdminRoles():
   cd = buildGAPIObject(GAPI_DIRECTORY_API)
   todrive = False
-  titles = [u'roleId', u'roleName', u'roleDescription', u'isSuperAdminRole', u'isSystemRole']
+  titles = CSVTitles([u'roleId', u'roleName', u'roleDescription', u'isSuperAdminRole', u'isSystemRole'])
   fields = u'nextPageToken,items({0})'.format(u','.join(titles))
   csvRows = []
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'todrive':
       todrive = True
@@ -4370,9 +5998,9 @@ def doPrintAdmins():
   userKey = None
   todrive = False
   fields = u'nextPageToken,items({0})'.format(u','.join([u'roleAssignmentId', u'roleId', u'assignedTo', u'scopeType', u'orgUnitId']))
-  titles = [u'roleAssignmentId', u'roleId', u'role', u'assignedTo', u'assignedToUser', u'scopeType', u'orgUnitId', u'orgUnit']
+  titles = CSVTitles([u'roleAssignmentId', u'roleId', u'role', u'assignedTo', u'assignedToUser', u'scopeType', u'orgUnitId', u'orgUnit'])
   csvRows = []
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'user':
       userKey = getEmailAddress()
@@ -4435,7 +6063,7 @@ ADDRESS_FIELDS_ARGUMENT_MAP = {
 def doUpdateCustomer():
   cd = buildGAPIObject(GAPI_DIRECTORY_API)
   body = {}
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg in ADDRESS_FIELDS_ARGUMENT_MAP:
       body.setdefault(u'postalAddress', {})
@@ -4498,7 +6126,7 @@ def doCreateDataTranfer():
     putArgumentBack()
     usageErrorExit(PHRASE_NEW_OWNER_MUST_DIFFER_FROM_OLD_OWNER)
   parameters = {}
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     key = getString(OB_PARAMETER_KEY).upper()
     parameters[key] = getString(OB_PARAMETER_VALUE).upper().split(u',')
   body[u'applicationDataTransfers'] = [{u'applicationId': serviceID}]
@@ -4541,10 +6169,10 @@ def doPrintDataTransfers():
   oldOwnerUserId = None
   status = None
   todrive = False
-  titles = [u'id',]
+  titles = CSVTitles([u'id',])
   csvRows = []
   delimiter = GC_Values[GC_CSV_OUTPUT_FIELD_DELIMITER]
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'todrive':
       todrive = True
@@ -4600,7 +6228,7 @@ def doUpdateInstance():
     callGData(adminObj, u'UpdateDomainLogo', logoImage=logoImage)
   elif command == u'ssosettings':
     enableSSO = samlSignonUri = samlLogoutUri = changePasswordUri = ssoWhitelist = useDomainSpecificIssuer = None
-    while CL_argvI < CL_argvLen:
+    while CL.argvI < CL.argvLen:
       myarg = getArgument()
       if myarg == u'enabled':
         enableSSO = getBoolean()
@@ -4681,7 +6309,7 @@ def doCreateOrg():
   cd = buildGAPIObject(GAPI_DIRECTORY_API)
   name = getOrgUnitPath(absolutePath=False)
   body = {u'parentOrgUnitPath': u'/'}
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'description':
       body[u'description'] = getString(OB_STRING)
@@ -4735,7 +6363,7 @@ def doUpdateOrg():
                  customerId=GC_Values[GC_CUSTOMER_ID], deviceId=cros, body={u'orgUnitPath': orgUnitPath})
   else:
     body = {}
-    while CL_argvI < CL_argvLen:
+    while CL.argvI < CL.argvLen:
       myarg = getArgument()
       if myarg == u'name':
         body[u'name'] = getString(OB_STRING)
@@ -4769,7 +6397,7 @@ def doInfoOrg():
   name = getOrgUnitPath()
   get_users = True
   show_children = False
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'nousers':
       get_users = False
@@ -4820,9 +6448,9 @@ def doPrintOrgs():
   todrive = False
   fieldsList = []
   fieldsTitles = {}
-  titles = []
+  titles = CSVTitles([])
   csvRows = []
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'todrive':
       todrive = True
@@ -4833,7 +6461,7 @@ def doPrintOrgs():
     elif myarg == u'allfields':
       fieldsList = []
       fieldsTitles = {}
-      titles = []
+      titles = CSVTitles([])
       for field in ORG_FIELD_PRINT_ORDER:
         addFieldTitleToCSVfile(field, ORG_ARGUMENT_TO_PROPERTY_TITLE_MAP, fieldsList, fieldsTitles, titles)
     elif myarg in ORG_ARGUMENT_TO_PROPERTY_TITLE_MAP:
@@ -4922,7 +6550,7 @@ def doInfoAlias(alias_email=None):
   cd = buildGAPIObject(GAPI_DIRECTORY_API)
   if alias_email is None:
     alias_email = getEmailAddress()
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
 # Ignore info group/user arguments that may have come from whatis
     if (myarg in INFO_GROUP_OPTIONS) or (myarg in INFO_USER_OPTIONS):
@@ -4947,9 +6575,9 @@ def doInfoAlias(alias_email=None):
 def doPrintAliases():
   cd = buildGAPIObject(GAPI_DIRECTORY_API)
   todrive = False
-  titles = [u'Alias', u'Target', u'TargetType']
+  titles = CSVTitles([u'Alias', u'Target', u'TargetType'])
   csvRows = []
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'todrive':
       todrive = True
@@ -5084,7 +6712,7 @@ def doSubmitRequestExport():
   audit, parameters = getAuditParameters(emailAddressRequired=True, requestIdRequired=False, destUserRequired=False)
   begin_date = end_date = search_query = None
   headers_only = include_deleted = False
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'begin':
       begin_date = getYYYYMMDD_HHMM()
@@ -5180,7 +6808,7 @@ def doCreateMonitor():
   begin_date = None
   incoming_headers_only = outgoing_headers_only = drafts_headers_only = chats_headers_only = False
   drafts = chats = True
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'end':
       end_date = getYYYYMMDD_HHMM()
@@ -5309,7 +6937,7 @@ def doCalendarAddEvent(cal, calendarId):
     return
   sendNotifications = timeZone = None
   body = {}
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'notifyattendees':
       sendNotifications = True
@@ -5385,7 +7013,7 @@ def doCalendarDeleteEvent(cal, calendarId):
   events = []
   sendNotifications = None
   doIt = False
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'notifyattendees':
       sendNotifications = True
@@ -5464,7 +7092,7 @@ def doUpdateCrosDevice():
   update_body = {}
   action_body = {}
   ack_wipe = False
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg in UPDATE_CROS_ARGUMENT_TO_PROPERTY_MAP:
       up = UPDATE_CROS_ARGUMENT_TO_PROPERTY_MAP[myarg]
@@ -5563,7 +7191,7 @@ def doInfoCrosDevice():
   fieldsList = []
   noLists = False
   listLimit = 0
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'nolists':
       noLists = True
@@ -5643,22 +7271,25 @@ CROS_ORDERBY_CHOICES_MAP = {
 def doPrintCrosDevices():
   cd = buildGAPIObject(GAPI_DIRECTORY_API)
   todrive = False
+  outputFormat = u'csv'
   fieldsList = []
   fieldsTitles = {}
-  titles = []
-  csvRows = []
+  titles = CSVTitles([])
+  csvRows = CSVRows()
   addFieldToCSVfile(u'deviceid', CROS_ARGUMENT_TO_PROPERTY_MAP, fieldsList, fieldsTitles, titles)
   sortHeaders = False
   query = projection = orderBy = sortOrder = None
   noLists = False
   listLimit = 0
   selectActiveTimeRanges = selectRecentUsers = None
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'query':
       query = getString(OB_QUERY)
     elif myarg == u'todrive':
       todrive = True
+    elif myarg == u'format':
+      outputFormat = getChoice(OUTPUT_FORMAT_CHOICES)
     elif myarg == u'nolists':
       noLists = True
       selectActiveTimeRanges = selectRecentUsers = None
@@ -5717,55 +7348,60 @@ def doPrintCrosDevices():
       unknownArgumentExit()
   if fieldsList:
     fields = u'nextPageToken,chromeosdevices({0})'.format(u','.join(set(fieldsList))).replace(u'.', u'/')
+    wantedFields = set(fieldsList)
   else:
-    fields = None
+    fields = wantedFields = None
   sys.stderr.write(u'Retrieving All Chrome OS Devices for organization (may take some time for large accounts)...\n')
   page_message = u'Got %%num_items%% Chrome devices...\n'
-  feed = callGAPIpages(cd.chromeosdevices(), u'list', u'chromeosdevices', page_message=page_message,
-                       query=query, customerId=GC_Values[GC_CUSTOMER_ID], projection=projection,
-                       orderBy=orderBy, sortOrder=sortOrder, fields=fields, maxResults=GC_Values[GC_DEVICE_MAX_RESULTS])
-  if feed:
-    if (not noLists) and (not selectActiveTimeRanges) and (not selectRecentUsers):
-      while feed:
-        cros = feed.popleft()
-        if u'notes' in cros:
-          cros[u'notes'] = cros[u'notes'].replace(u'\n', u'\\n')
-        addRowTitlesToCSVfile(flattenJSON(cros, listLimit=listLimit), csvRows, titles)
-    else:
-      if not noLists:
-        if selectActiveTimeRanges:
-          for attrib in [u'activeTimeRanges.activeTime', u'activeTimeRanges.date']:
-            titles.append(attrib)
-        if selectRecentUsers:
-          for attrib in [u'recentUsers.email', u'recentUsers.type']:
-            titles.append(attrib)
-      while feed:
-        cros = feed.popleft()
-        if u'notes' in cros:
-          cros[u'notes'] = cros[u'notes'].replace(u'\n', u'\\n')
-        row = {}
-        for attrib in cros:
-          if attrib in [u'kind', u'etag', u'recentUsers', u'activeTimeRanges']:
-            continue
-          if attrib not in titles:
-            titles.append(attrib)
-          row[attrib] = cros[attrib]
-        activeTimeRanges = cros.get(selectActiveTimeRanges, []) if selectActiveTimeRanges else []
-        recentUsers = cros.get(selectRecentUsers, []) if selectRecentUsers else []
-        if noLists or (not activeTimeRanges and not recentUsers):
-          csvRows.append(row)
-        else:
-          lenATR = len(activeTimeRanges)
-          lenRU = len(recentUsers)
-          for i in xrange(min(listLimit, max(lenATR, lenRU)) if listLimit else max(lenATR, lenRU)):
-            new_row = row.copy()
-            if i < lenATR:
-              new_row[u'activeTimeRanges.activeTime'] = str(activeTimeRanges[i][u'activeTime'])
-              new_row[u'activeTimeRanges.date'] = activeTimeRanges[i][u'date']
-            if i < lenRU:
-              new_row[u'recentUsers.email'] = recentUsers[i].get(u'email', u'')
-              new_row[u'recentUsers.type'] = recentUsers[i][u'type']
-            csvRows.append(new_row)
+  feed = yieldGAPIpages(cd.chromeosdevices(), u'list', u'chromeosdevices', page_message=page_message,
+                        query=query, customerId=GC_Values[GC_CUSTOMER_ID], projection=projection,
+                        orderBy=orderBy, sortOrder=sortOrder, fields=fields, maxResults=GC_Values[GC_DEVICE_MAX_RESULTS],
+                        prefetch=GC_Values[GC_PREFETCH_PAGES])
+  if outputFormat == u'jsonl':
+    jsonLines = JSONLinesWriter(u'CrOS', todrive)
+    for cros in feed:
+      jsonLines.write(cros)
+    jsonLines.close()
+    return
+  if (not noLists) and (not selectActiveTimeRanges) and (not selectRecentUsers):
+    for cros in feed:
+      if u'notes' in cros:
+        cros[u'notes'] = cros[u'notes'].replace(u'\n', u'\\n')
+      addRowTitlesToCSVfile(flattenJSON(cros, listLimit=listLimit, wantedFields=wantedFields), csvRows, titles)
+  else:
+    if not noLists:
+      if selectActiveTimeRanges:
+        for attrib in [u'activeTimeRanges.activeTime', u'activeTimeRanges.date']:
+          titles.append(attrib)
+      if selectRecentUsers:
+        for attrib in [u'recentUsers.email', u'recentUsers.type']:
+          titles.append(attrib)
+    for cros in feed:
+      if u'notes' in cros:
+        cros[u'notes'] = cros[u'notes'].replace(u'\n', u'\\n')
+      row = {}
+      for attrib in cros:
+        if attrib in [u'kind', u'etag', u'recentUsers', u'activeTimeRanges']:
+          continue
+        if attrib not in titles:
+          titles.append(attrib)
+        row[attrib] = cros[attrib]
+      activeTimeRanges = cros.get(selectActiveTimeRanges, []) if selectActiveTimeRanges else []
+      recentUsers = cros.get(selectRecentUsers, []) if selectRecentUsers else []
+      if noLists or (not activeTimeRanges and not recentUsers):
+        csvRows.append(row)
+      else:
+        lenATR = len(activeTimeRanges)
+        lenRU = len(recentUsers)
+        for i in xrange(min(listLimit, max(lenATR, lenRU)) if listLimit else max(lenATR, lenRU)):
+          new_row = row.copy()
+          if i < lenATR:
+            new_row[u'activeTimeRanges.activeTime'] = str(activeTimeRanges[i][u'activeTime'])
+            new_row[u'activeTimeRanges.date'] = activeTimeRanges[i][u'date']
+          if i < lenRU:
+            new_row[u'recentUsers.email'] = recentUsers[i].get(u'email', u'')
+            new_row[u'recentUsers.type'] = recentUsers[i][u'type']
+          csvRows.append(new_row)
   if sortHeaders:
     sortCSVTitles([u'deviceId',], titles)
   writeCSVfile(csvRows, titles, u'CrOS', todrive)
@@ -5788,7 +7424,7 @@ def doUpdateMobileDevice():
   action_body = {}
   patch_body = {}
   doPatch = doAction = False
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'action':
       action_body[u'action'] = getChoice(MOBILE_ACTION_CHOICE_MAP, mapChoice=True)
@@ -5844,15 +7480,18 @@ MOBILE_PROJECTION_CHOICES_MAP = {
 def doPrintMobileDevices():
   cd = buildGAPIObject(GAPI_DIRECTORY_API)
   todrive = False
-  titles = [u'resourceId',]
-  csvRows = []
+  outputFormat = u'csv'
+  titles = CSVTitles([u'resourceId',])
+  csvRows = CSVRows()
   query = projection = orderBy = sortOrder = None
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'query':
       query = getString(OB_QUERY)
     elif myarg == u'todrive':
       todrive = True
+    elif myarg == u'format':
+      outputFormat = getChoice(OUTPUT_FORMAT_CHOICES)
     elif myarg == u'orderby':
       orderBy = getChoice(MOBILE_ORDERBY_CHOICES_MAP, mapChoice=True)
     elif myarg in SORTORDER_CHOICES_MAP:
@@ -5863,11 +7502,14 @@ def doPrintMobileDevices():
       unknownArgumentExit()
   sys.stderr.write(u'Retrieving All Mobile Devices for organization (may take some time for large accounts)...\n')
   page_message = u'Got %%num_items%% mobile devices...\n'
-  feed = callGAPIpages(cd.mobiledevices(), u'list', u'mobiledevices', page_message=page_message,
-                       customerId=GC_Values[GC_CUSTOMER_ID], query=query, projection=projection,
-                       orderBy=orderBy, sortOrder=sortOrder, maxResults=GC_Values[GC_DEVICE_MAX_RESULTS])
-  while feed:
-    mobile = feed.popleft()
+  jsonLines = JSONLinesWriter(u'Mobile', todrive) if outputFormat == u'jsonl' else None
+  for mobile in yieldGAPIpages(cd.mobiledevices(), u'list', u'mobiledevices', page_message=page_message,
+                               customerId=GC_Values[GC_CUSTOMER_ID], query=query, projection=projection,
+                               orderBy=orderBy, sortOrder=sortOrder, maxResults=GC_Values[GC_DEVICE_MAX_RESULTS],
+                               prefetch=GC_Values[GC_PREFETCH_PAGES]):
+    if jsonLines:
+      jsonLines.write(mobile)
+      continue
     row = {}
     for attrib in mobile:
       if attrib in [u'kind', u'etag', u'applications']:
@@ -5880,6 +7522,9 @@ def doPrintMobileDevices():
       else:
         row[attrib] = mobile[attrib]
     csvRows.append(row)
+  if jsonLines:
+    jsonLines.close()
+    return
   writeCSVfile(csvRows, titles, u'Mobile', todrive)
 
 GROUP_ATTRIBUTES = {
@@ -5969,7 +7614,7 @@ def doCreateGroup():
   cd = buildGAPIObject(GAPI_DIRECTORY_API)
   body = {u'email': getEmailAddress(noUid=True)}
   gs_body = {}
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'name':
       body[u'name'] = getString(OB_STRING)
@@ -5995,6 +7640,12 @@ GROUP_ROLES_MAP = {
   u'members': ROLE_MEMBER,
   }
 
+# Member progress is shown as each batched request completes, followed by any error
+def _showGroupMemberResult(progressFormat):
+  def _callback(user_email, result, reason):
+    sys.stderr.write(progressFormat.format(user_email))
+  return _callback
+
 def doUpdateGroup():
   cd = buildGAPIObject(GAPI_DIRECTORY_API)
   group = getEmailAddress()
@@ -6002,7 +7653,7 @@ def doUpdateGroup():
   if not myarg:
     body = {}
     gs_body = {}
-    while CL_argvI < CL_argvLen:
+    while CL.argvI < CL.argvLen:
       myarg = getArgument()
       if myarg == u'email':
         body[u'email'] = getEmailAddress(noUid=True)
@@ -6023,69 +7674,83 @@ def doUpdateGroup():
     checkNotSuspended = checkArgumentPresent(NOTSUSPENDED_ARGUMENT)
     _, users_email = getEntityToModify(checkNotSuspended=checkNotSuspended)
     checkForExtraneousArguments()
+    requests = []
     for user_email in users_email:
       user_email = normalizeEmailAddressOrUID(user_email)
       if user_email.find(u'@') != -1:
         body = {u'role': role, u'email': user_email}
       else:
         body = {u'role': role, u'id': user_email}
-      sys.stderr.write(u' adding %s %s...\n' % (role.lower(), user_email))
-      try:
-        callGAPI(cd.members(), u'insert', soft_errors=True, groupKey=group, body=body)
-      except googleapiclient.errors.HttpError:
-        pass
+      requests.append((user_email, {u'groupKey': group, u'body': body}))
+    callGAPIbatch(cd, u'members', u'insert', requests, _showGroupMemberResult(u' adding {0} {{0}}...\n'.format(role.lower())))
   elif myarg == u'sync':
     role = getChoice(GROUP_ROLES_MAP, defaultChoice=ROLE_MEMBER, mapChoice=True)
     body = {u'role': role}
     role = role.lower()
     checkNotSuspended = checkArgumentPresent(NOTSUSPENDED_ARGUMENT)
     _, users_email = getEntityToModify(checkNotSuspended=checkNotSuspended)
+    dryrun = checkArgumentPresent(DRYRUN_ARGUMENT)
     checkForExtraneousArguments()
     users_email = [x.lower() for x in users_email]
-    current_emails = getUsersToModify(u'group', group, member_type=role)
+    current_emails = getUsersToModify(u'group', group, member_type=role, useIndex=False)
     current_emails = [x.lower() for x in current_emails]
     to_add = list(set(users_email) - set(current_emails))
     to_remove = list(set(current_emails) - set(users_email))
     sys.stderr.write(u'Need to add %s %s and remove %s.\n' % (len(to_add), role, len(to_remove)))
-    items = []
+    if dryrun:
+      return
+    failed = []
+    def _syncCallback(progressFormat):
+      showResult = _showGroupMemberResult(progressFormat)
+      def _callback(user_email, result, reason):
+        showResult(user_email, result, reason)
+        if reason is not None:
+          failed.append(user_email)
+      return _callback
+    requests = []
     for user_email in to_add:
-      items.append([GAM_CMD, u'update', u'group', group, u'add', role, user_email])
-    for user_email in to_remove:
-      items.append([GAM_CMD, u'update', u'group', group, u'remove', user_email])
-    run_batch(items)
+      user_email = normalizeEmailAddressOrUID(user_email)
+      if user_email.find(u'@') != -1:
+        requests.append((user_email, {u'groupKey': group, u'body': {u'role': body[u'role'], u'email': user_email}}))
+      else:
+        requests.append((user_email, {u'groupKey': group, u'body': {u'role': body[u'role'], u'id': user_email}}))
+    callGAPIbatchThreads(GAPI_DIRECTORY_API, u'members', u'insert', requests, _syncCallback(u' adding {0} {{0}}...\n'.format(role)))
+    callGAPIbatchThreads(GAPI_DIRECTORY_API, u'members', u'delete', [(user_email, {u'groupKey': group, u'memberKey': user_email}) for user_email in to_remove],
+                         _syncCallback(u' removing {0}\n'))
+    if failed:
+      sys.stderr.write(u'Failed to add or remove %s of %s: %s\n' % (len(failed), len(to_add)+len(to_remove), u','.join(sorted(failed))))
+      setSysExitRC(GOOGLE_API_ERROR_RC)
   elif myarg in [u'delete', u'remove']:
     role = getChoice(GROUP_ROLES_MAP, defaultChoice=ROLE_MEMBER, mapChoice=True)
     _, users_email = getEntityToModify()
     checkForExtraneousArguments()
+    requests = []
     for user_email in users_email:
       user_email = normalizeEmailAddressOrUID(user_email)
-      sys.stderr.write(u' removing %s\n' % user_email)
-      callGAPI(cd.members(), u'delete', soft_errors=True, groupKey=group, memberKey=user_email)
+      requests.append((user_email, {u'groupKey': group, u'memberKey': user_email}))
+    callGAPIbatch(cd, u'members', u'delete', requests, _showGroupMemberResult(u' removing {0}\n'))
   elif myarg == u'update':
     role = getChoice(GROUP_ROLES_MAP, defaultChoice=ROLE_MEMBER, mapChoice=True)
     body = {u'role': role}
     role = role.lower()
     _, users_email = getEntityToModify()
     checkForExtraneousArguments()
+    requests = []
     for user_email in users_email:
       user_email = normalizeEmailAddressOrUID(user_email)
-      sys.stderr.write(u' updating %s to %s...\n' % (user_email, role))
-      try:
-        callGAPI(cd.members(), u'update', soft_errors=True, groupKey=group, memberKey=user_email, body=body)
-      except googleapiclient.errors.HttpError:
-        pass
+      requests.append((user_email, {u'groupKey': group, u'memberKey': user_email, u'body': body}))
+    callGAPIbatch(cd, u'members', u'update', requests, _showGroupMemberResult(u' updating {{0}} to {0}...\n'.format(role)))
   else: # clear
     roleList = []
-    while CL_argvI < CL_argvLen:
+    while CL.argvI < CL.argvLen:
       roleList.append(getChoice(GROUP_ROLES_MAP, mapChoice=True))
     if roleList:
       roles = u','.join(sorted(set(roleList)))
     else:
       roles = ROLE_MEMBER
-    user_emails = getUsersToModify(u'group', group, member_type=roles)
-    for user_email in user_emails:
-      sys.stderr.write(u' removing %s\n' % user_email)
-      callGAPI(cd.members(), u'delete', soft_errors=True, groupKey=group, memberKey=user_email)
+    user_emails = getUsersToModify(u'group', group, member_type=roles, useIndex=False)
+    callGAPIbatch(cd, u'members', u'delete', [(user_email, {u'groupKey': group, u'memberKey': user_email}) for user_email in user_emails],
+                  _showGroupMemberResult(u' removing {0}\n'))
 
 def doDeleteGroup():
   cd = buildGAPIObject(GAPI_DIRECTORY_API)
@@ -6113,7 +7778,7 @@ def doInfoGroup(group_name=None):
   settings = {}
   if group_name is None:
     group_name = getEmailAddress()
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'nousers':
       getUsers = False
@@ -6214,7 +7879,84 @@ def doInfoGroup(group_name=None):
           print u' member: %s (%s)' % (member[u'id'], member[u'type'].lower())
     print u'Total %s users in group' % len(members)
 
+# The members of all of the groups are retrieved by one pool of num_threads threads and the settings in batches,
+# num_threads batches at a time; the rows are then built in group order
 def doPrintGroups():
+  def _saveSettings(ri, result, reason):
+    groupSettings[ri] = result
+
+  def _getGroupRow(groupEntity, i):
+    groupEmail = groupEntity[u'email']
+    row = {}
+    for field in cdfieldsList:
+      if field in groupEntity:
+        if isinstance(groupEntity[field], list):
+          row[fieldsTitles[field]] = delimiter.join(groupEntity[field])
+        elif convertCRNL and field in GROUP_FIELDS_WITH_CRS_NLS:
+          row[fieldsTitles[field]] = convertCRsNLs(groupEntity[field])
+        else:
+          row[fieldsTitles[field]] = groupEntity[field]
+    if roles:
+      groupMembers = graph.get(groupEmail.lower()) or []
+      if members:
+        membersList = []
+        membersCount = 0
+      if managers:
+        managersList = []
+        managersCount = 0
+      if owners:
+        ownersList = []
+        ownersCount = 0
+      for member in groupMembers:
+        member_email = member.get(u'email', member.get(u'id', None))
+        if not member_email:
+          sys.stderr.write(u' Not sure what to do with: %s' % member)
+          continue
+        role = member.get(u'role', ROLE_MEMBER)
+        if role == ROLE_MEMBER:
+          if members:
+            membersCount += 1
+            if not membersCountOnly:
+              membersList.append(member_email)
+        elif role == ROLE_MANAGER:
+          if managers:
+            managersCount += 1
+            if not managersCountOnly:
+              managersList.append(member_email)
+        elif role == ROLE_OWNER:
+          if owners:
+            ownersCount += 1
+            if not ownersCountOnly:
+              ownersList.append(member_email)
+        elif members:
+          membersCount += 1
+          if not membersCountOnly:
+            membersList.append(member_email)
+      if members:
+        row[u'Members'] = membersCount if membersCountOnly else delimiter.join(membersList)
+      if managers:
+        row[u'Managers'] = managersCount if managersCountOnly else delimiter.join(managersList)
+      if owners:
+        row[u'Owners'] = ownersCount if ownersCountOnly else delimiter.join(ownersList)
+    if getSettings and not GroupIsAbuseOrPostmaster(groupEmail):
+      settings = groupSettings.get(i)
+      if settings:
+        for key in settings:
+          if key in [u'email', u'name', u'description', u'kind', u'etag']:
+            continue
+          setting_value = settings[key]
+          if setting_value is None:
+            setting_value = u''
+          if key not in titles:
+            addTitleToCSVfile(key, titles)
+          if convertCRNL and key in GROUP_FIELDS_WITH_CRS_NLS:
+            row[key] = convertCRsNLs(setting_value)
+          else:
+            row[key] = setting_value
+      else:
+        sys.stderr.write(u" Settings unavailable for group %s (%s/%s)...\r\n" % (groupEmail, i, count))
+    return row
+
   cd = buildGAPIObject(GAPI_DIRECTORY_API)
   getSettings = sortHeaders = False
   customer = GC_Values[GC_CUSTOMER_ID]
@@ -6226,12 +7968,12 @@ def doPrintGroups():
   cdfieldsList = []
   gsfieldsList = []
   fieldsTitles = {}
-  titles = []
+  titles = CSVTitles([])
   csvRows = []
   addFieldTitleToCSVfile(u'email', GROUP_ARGUMENT_TO_PROPERTY_TITLE_MAP, cdfieldsList, fieldsTitles, titles)
   maxResults = None
   roleList = []
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'todrive':
       todrive = True
@@ -6301,8 +8043,6 @@ def doPrintGroups():
     gsfields = u','.join(set(gsfieldsList))
   elif getSettings:
     gsfields = None
-  if getSettings:
-    gs = buildGAPIObject(GAPI_GROUPSSETTINGS_API)
   roles = u','.join(sorted(set(roleList)))
   sys.stderr.write(u"Retrieving All Groups for G Suite account (may take some time on a large account)...\n")
   page_message = u'Got %%num_items%% groups: %%first_item%% - %%last_item%%\n'
@@ -6310,121 +8050,114 @@ def doPrintGroups():
                              page_message=page_message, message_attribute=u'email',
                              customer=customer, domain=usedomain, userKey=usemember,
                              fields=cdfields, maxResults=maxResults)
-  i = 0
   count = len(entityList)
-  for groupEntity in entityList:
-    i += 1
-    groupEmail = groupEntity[u'email']
-    row = {}
-    for field in cdfieldsList:
-      if field in groupEntity:
-        if isinstance(groupEntity[field], list):
-          row[fieldsTitles[field]] = delimiter.join(groupEntity[field])
-        elif convertCRNL and field in GROUP_FIELDS_WITH_CRS_NLS:
-          row[fieldsTitles[field]] = convertCRsNLs(groupEntity[field])
-        else:
-          row[fieldsTitles[field]] = groupEntity[field]
-    if roles:
-      sys.stderr.write(u' Getting %s for %s%s' % (roles, groupEmail, currentCountNL(i, count)))
-      page_message = u'Got %%num_items%% members: %%first_item%% - %%last_item%%\n'
-      groupMembers = callGAPIpages(cd.members(), u'list', u'members',
-                                   page_message=page_message, message_attribute=u'email',
-                                   groupKey=groupEmail, roles=roles, fields=u'nextPageToken,members(email,id,role)', maxResults=GC_Values[GC_MEMBER_MAX_RESULTS])
-      if members:
-        membersList = []
-        membersCount = 0
-      if managers:
-        managersList = []
-        managersCount = 0
-      if owners:
-        ownersList = []
-        ownersCount = 0
-      for member in groupMembers:
-        member_email = member.get(u'email', member.get(u'id', None))
-        if not member_email:
-          sys.stderr.write(u' Not sure what to do with: %s' % member)
-          continue
-        role = member.get(u'role', ROLE_MEMBER)
-        if role == ROLE_MEMBER:
-          if members:
-            membersCount += 1
-            if not membersCountOnly:
-              membersList.append(member_email)
-        elif role == ROLE_MANAGER:
-          if managers:
-            managersCount += 1
-            if not managersCountOnly:
-              managersList.append(member_email)
-        elif role == ROLE_OWNER:
-          if owners:
-            ownersCount += 1
-            if not ownersCountOnly:
-              ownersList.append(member_email)
-        elif members:
-          membersCount += 1
-          if not membersCountOnly:
-            membersList.append(member_email)
-      if members:
-        row[u'Members'] = membersCount if membersCountOnly else delimiter.join(membersList)
-      if managers:
-        row[u'Managers'] = managersCount if managersCountOnly else delimiter.join(managersList)
-      if owners:
-        row[u'Owners'] = ownersCount if ownersCountOnly else delimiter.join(ownersList)
-    if getSettings and not GroupIsAbuseOrPostmaster(groupEmail):
-      sys.stderr.write(u" Retrieving Settings for group %s%s...\r\n" % (groupEmail, currentCount(i, count)))
-      settings = callGAPI(gs.groups(), u'get',
-                          soft_errors=True,
-                          retry_reasons=[GAPI_SERVICE_LIMIT, GAPI_INVALID],
-                          groupUniqueId=groupEmail, fields=gsfields)
-      if settings:
-        for key in settings:
-          if key in [u'email', u'name', u'description', u'kind', u'etag']:
-            continue
-          setting_value = settings[key]
-          if setting_value is None:
-            setting_value = u''
-          if key not in titles:
-            addTitleToCSVfile(key, titles)
-          if convertCRNL and key in GROUP_FIELDS_WITH_CRS_NLS:
-            row[key] = convertCRsNLs(setting_value)
-          else:
-            row[key] = setting_value
-      else:
-        sys.stderr.write(u" Settings unavailable for group %s (%s/%s)...\r\n" % (groupEmail, i, count))
-    csvRows.append(row)
+  if roles:
+    sys.stderr.write(u' Getting %s for %s groups\n' % (roles, count))
+    graph = getGroupMembersGraph([groupEntity[u'email'] for groupEntity in entityList], False,
+                                 roles=roles, fields=u'nextPageToken,members(email,id,role)')
+  if getSettings:
+    sys.stderr.write(u' Retrieving Settings for %s groups\n' % count)
+    groupSettings = {}
+    callGAPIbatchThreads(GAPI_GROUPSSETTINGS_API, u'groups', u'get',
+                         [(i, {u'groupUniqueId': groupEntity[u'email'], u'fields': gsfields})
+                          for i, groupEntity in enumerate(entityList, 1) if not GroupIsAbuseOrPostmaster(groupEntity[u'email'])],
+                         _saveSettings, retry_reasons=[GAPI_SERVICE_LIMIT, GAPI_INVALID])
+  for i, groupEntity in enumerate(entityList, 1):
+    csvRows.append(_getGroupRow(groupEntity, i))
   if sortHeaders:
     sortCSVTitles([u'Email',], titles)
   writeCSVfile(csvRows, titles, u'Groups', todrive)
 
-def getGroupMembers(cd, groupEmail, membersList, membersSet, i, count, noduplicates, recursive, level):
-  try:
-    sys.stderr.write(u'Getting members for %s%s' % (groupEmail, currentCountNL(i, count)))
-    groupMembers = callGAPIpages(cd.members(), u'list', u'members',
-                                 throw_reasons=[GAPI_GROUP_NOT_FOUND, GAPI_DOMAIN_NOT_FOUND, GAPI_FORBIDDEN],
-                                 groupKey=groupEmail, maxResults=GC_Values[GC_MEMBER_MAX_RESULTS])
-    if not recursive:
-      if noduplicates:
-        for member in groupMembers:
-          if member[u'id'] in membersSet:
-            continue
-          membersSet.add(member[u'id'])
-          membersList.append(member)
-      else:
-        membersList.extend(groupMembers)
-    else:
-      for member in groupMembers:
-        if member[u'type'] == u'USER':
-          if noduplicates:
-            if member[u'id'] in membersSet:
-              continue
-            membersSet.add(member[u'id'])
-          member[u'level'] = level
-          member[u'subgroup'] = groupEmail
-          membersList.append(member)
-        else:
-          getGroupMembers(cd, member[u'email'], membersList, membersSet, i, count, noduplicates, recursive, level+1)
-  except (GAPI_groupNotFound, GAPI_domainNotFound, GAPI_forbidden):
-    entityUnknownWarning(u'Group', groupEmail, i, count)
+# The members of each distinct group are retrieved once, num_threads groups at a time; with recursive, the groups
+# that are members of the groups are retrieved as they are found. Returns a dictionary mapping the lower case
+# group email address to its members or None if the group can not be accessed. roles and fields limit the members retrieved.
+def getGroupMembersGraph(groupEmails, recursive, roles=None, fields=None):
+  import Queue
+  def _getMembers():
+    cd = None
+    while True:
+      groupEmail = groupQueue.get()
+      if groupEmail is None:
+        return
+      try:
+        if threads.failures:
+          continue
+        if cd is None:
+          cd = buildGAPIObject(GAPI_DIRECTORY_API)
+        i, count = positions[groupEmail.lower()]
+        sys.stderr.write(u'Getting members for %s%s' % (groupEmail, currentCountNL(i, count)))
+        try:
+          groupMembers = callGAPIpages(cd.members(), u'list', u'members',
+                                       throw_reasons=[GAPI_GROUP_NOT_FOUND, GAPI_DOMAIN_NOT_FOUND, GAPI_FORBIDDEN],
+                                       groupKey=groupEmail, roles=roles, fields=fields, maxResults=GC_Values[GC_MEMBER_MAX_RESULTS])
+        except (GAPI_groupNotFound, GAPI_domainNotFound, GAPI_forbidden):
+          entityUnknownWarning(u'Group', groupEmail, i, count)
+          groupMembers = None
+        graph[groupEmail.lower()] = groupMembers
+        if recursive and groupMembers:
+          for member in groupMembers:
+            if member[u'type'] == u'GROUP':
+              _addGroup(member[u'email'], i, count)
+      # The thread carries on taking groups from the queue, skipping them, so that groupQueue.join returns
+      except BaseException:
+        threads.failures.append(sys.exc_info())
+      finally:
+        groupQueue.task_done()
+
+  def _addGroup(groupEmail, i, count):
+    with lock:
+      if groupEmail.lower() in positions:
+        return
+      positions[groupEmail.lower()] = (i, count)
+    groupQueue.put(groupEmail)
+
+  graph = {}
+  positions = {}
+  lock = threading.Lock()
+  groupQueue = Queue.Queue()
+  numThreads = max(1, min(GC_Values[GC_NUM_THREADS], len(groupEmails)))
+  threads = CommandThreads()
+  for _ in range(numThreads):
+    threads.start(_getMembers)
+  i = 0
+  count = len(groupEmails)
+  for groupEmail in groupEmails:
+    i += 1
+    _addGroup(groupEmail, i, count)
+  groupQueue.join()
+  for _ in range(numThreads):
+    groupQueue.put(None)
+  threads.join()
+  return graph
+
+# Returns the (member, level, subgroup) of the users in a group, the users of its member groups following
+# the member group as in a depth first walk. A member group that is already on the path from the top group
+# is a membership cycle and is skipped. The users of a group are computed once unless a cycle was skipped
+# below it, as its users then depend on the path.
+def expandGroupMembers(graph, groupEmail, expanded, path=None):
+  groupKey = groupEmail.lower()
+  if groupKey in expanded:
+    return (expanded[groupKey], False)
+  if path is None:
+    path = set([groupKey])
+  members = []
+  cycle = False
+  for member in graph.get(groupKey) or []:
+    if member[u'type'] == u'USER':
+      members.append((member, 0, groupEmail))
+    elif member[u'type'] == u'GROUP':
+      subgroupKey = member[u'email'].lower()
+      if subgroupKey in path:
+        cycle = True
+        continue
+      path.add(subgroupKey)
+      subgroupMembers, subgroupCycle = expandGroupMembers(graph, member[u'email'], expanded, path)
+      path.remove(subgroupKey)
+      cycle = cycle or subgroupCycle
+      members.extend([(subgroupMember, level+1, subgroup) for subgroupMember, level, subgroup in subgroupMembers])
+  if not cycle:
+    expanded[groupKey] = members
+  return (members, cycle)
 
 GROUPMEMBERS_FIELD_NAMES_MAP = {
   u'email': u'email',
@@ -6446,12 +8179,12 @@ def doPrintGroupMembers():
   domain = usemember = None
   fieldsList = []
   fieldsTitles = {}
-  titles = []
+  titles = CSVTitles([])
   csvRows = []
   groups_to_get = []
   userFieldsList = []
   userFieldsTitles = {}
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'todrive':
       todrive = True
@@ -6518,23 +8251,27 @@ def doPrintGroupMembers():
     groups_to_get = callGAPIpages(cd.groups(), u'list', u'groups', message_attribute=u'email',
                                   customer=customer, domain=domain, userKey=usemember, fields=u'nextPageToken,groups(email)')
   membersSet = set()
-  level = 0
-  i = 0
-  count = len(groups_to_get)
+  graph = getGroupMembersGraph([group[u'email'] for group in groups_to_get], recursive)
+  expanded = {}
   for group in groups_to_get:
-    i += 1
     groupEmail = group[u'email']
-    membersList = []
-    getGroupMembers(cd, groupEmail, membersList, membersSet, i, count, noduplicates, recursive, level)
-    for member in membersList:
+    if recursive:
+      membersList = expandGroupMembers(graph, groupEmail, expanded)[0]
+    else:
+      membersList = [(member, 0, groupEmail) for member in graph.get(groupEmail.lower()) or []]
+    for member, level, subgroup in membersList:
+      if noduplicates:
+        if member[u'id'] in membersSet:
+          continue
+        membersSet.add(member[u'id'])
       row = {}
       if groupname:
         row[u'group'] = groupEmail
       for title in fieldsList:
         row[title] = member[title]
       if recursive:
-        row[u'level'] = member[u'level']
-        row[u'subgroup'] = member[u'subgroup']
+        row[u'level'] = level
+        row[u'subgroup'] = subgroup
       if userFieldsList:
         if membernames:
           row[u'name'] = u'Unknown'
@@ -6568,15 +8305,16 @@ def doPrintGroupMembers():
     addTitlesToCSVfile([u'level', u'subgroup'], titles)
   writeCSVfile(csvRows, titles, u'Group Members', todrive)
 
-def doPrintLicenses(return_list=False, skus=None):
+# With return_list, the products/SKUs whose licenses can't be retrieved are appended to failed if it is a list
+def doPrintLicenses(return_list=False, skus=None, failed=None):
   lic = buildGAPIObject(GAPI_LICENSING_API)
   products = [u'Google-Apps', u'Google-Vault']
   feed = collections.deque()
-  titles = [u'userId', u'productId', u'skuId']
+  titles = CSVTitles([u'userId', u'productId', u'skuId'])
   csvRows = []
   todrive = False
   if not return_list:
-    while CL_argvI < CL_argvLen:
+    while CL.argvI < CL.argvLen:
       myarg = getArgument()
       if myarg == u'todrive':
         todrive = True
@@ -6595,7 +8333,8 @@ def doPrintLicenses(return_list=False, skus=None):
         feed += callGAPIpages(lic.licenseAssignments(), u'listForProductAndSku', u'items', page_message=page_message, throw_reasons=[GAPI_INVALID, GAPI_FORBIDDEN],
                               customerId=GC_Values[GC_DOMAIN], productId=GOOGLE_SKUS[skuId], skuId=skuId, fields=u'items(productId,skuId,userId),nextPageToken')
       except (GAPI_invalid, GAPI_forbidden):
-        pass
+        if failed is not None:
+          failed.append(skuId)
   else:
     for productId in products:
       page_message = u'Got %%%%total_items%%%% Licenses for %s...\n' % productId
@@ -6603,7 +8342,8 @@ def doPrintLicenses(return_list=False, skus=None):
         feed += callGAPIpages(lic.licenseAssignments(), u'listForProduct', u'items', page_message=page_message, throw_reasons=[GAPI_INVALID, GAPI_FORBIDDEN],
                               customerId=GC_Values[GC_DOMAIN], productId=productId, fields=u'items(productId,skuId,userId),nextPageToken')
       except (GAPI_invalid, GAPI_forbidden):
-        pass
+        if failed is not None:
+          failed.append(productId)
   while feed:
     u_license = feed.popleft()
     row = {}
@@ -6618,12 +8358,38 @@ def doPrintLicenses(return_list=False, skus=None):
     return csvRows
   writeCSVfile(csvRows, titles, u'Licenses', todrive)
 
+# Index the licenses of skus, or of all user products if skus is None, by lowercase user email address;
+# the index is an OrderedDict, in the order the licenses were retrieved, of lists of license rows.
+# The index is kept for the rest of the current command, e.g. for gam license <SKUIDList> info user,
+# unless the licenses of a product/SKU couldn't be retrieved and the index is incomplete
+def buildUserToLicensesMap(skus=None):
+  userLicenses = collections.OrderedDict()
+  failed = []
+  for u_license in doPrintLicenses(return_list=True, skus=skus, failed=failed):
+    userId = u_license.get(u'userId')
+    if userId:
+      userLicenses.setdefault(userId.lower(), []).append(u_license)
+  if not failed:
+    if GM_Globals[GM_MAP_USER_TO_LICENSES] is None:
+      GM_Globals[GM_MAP_USER_TO_LICENSES] = {}
+    GM_Globals[GM_MAP_USER_TO_LICENSES][u','.join(sorted(skus)) if skus else u''] = userLicenses
+  return userLicenses
+
+# The skuIds, in skus order, of a user's licenses from an index of the current command that includes all of skus;
+# None if there is no such index
+def getMappedUserLicenses(userEmail, skus):
+  for licensesKey, userLicenses in (GM_Globals[GM_MAP_USER_TO_LICENSES] or {}).items():
+    if set(licensesKey.split(u',') if licensesKey else GOOGLE_USER_SKUS).issuperset(skus):
+      userSkus = set([u_license[u'skuId'] for u_license in userLicenses.get(userEmail.lower(), [])])
+      return [skuId for skuId in skus if skuId in userSkus]
+  return None
+
 def doUpdateNotification():
   cd = buildGAPIObject(GAPI_DIRECTORY_API)
   notificationIds = []
   get_all = False
   isUnread = None
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'unread':
       isUnread = True
@@ -6661,7 +8427,7 @@ def doDeleteNotification():
   cd = buildGAPIObject(GAPI_DIRECTORY_API)
   notificationIds = []
   get_all = False
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'id':
       notificationId = getString(OB_NOTIFICATION_ID)
@@ -6685,7 +8451,7 @@ def doDeleteNotification():
 def doInfoNotifications():
   cd = buildGAPIObject(GAPI_DIRECTORY_API)
   unread_only = False
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'unreadonly':
       unread_only = True
@@ -6710,7 +8476,7 @@ def doCreateResourceCalendar():
   cd = buildGAPIObject(GAPI_DIRECTORY_API)
   body = {u'resourceId': getString(OB_RESOURCE_ID),
           u'resourceName': getString(OB_NAME)}
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'description':
       body[u'resourceDescription'] = getString(OB_STRING)
@@ -6726,7 +8492,7 @@ def doUpdateResourceCalendar():
   cd = buildGAPIObject(GAPI_DIRECTORY_API)
   resId = getString(OB_RESOURCE_ID)
   body = {}
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'name':
       body[u'resourceName'] = getString(OB_STRING)
@@ -6781,16 +8547,16 @@ def doPrintResourceCalendars():
   todrive = False
   fieldsList = []
   fieldsTitles = {}
-  titles = []
+  titles = CSVTitles([])
   csvRows = []
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'todrive':
       todrive = True
     elif myarg == u'allfields':
       fieldsList = []
       fieldsTitles = {}
-      titles = []
+      titles = CSVTitles([])
       for field in RESCAL_ALLFIELDS:
         addFieldToCSVfile(field, RESCAL_ARGUMENT_TO_PROPERTY_MAP, fieldsList, fieldsTitles, titles)
     elif myarg in RESCAL_ARGUMENT_TO_PROPERTY_MAP:
@@ -6842,14 +8608,13 @@ def getCRMService(login_hint):
   storage_dict = {}
   storage = DictionaryStorage(storage_dict, u'credentials')
   flags = cmd_flags(noLocalWebserver=GC_Values[GC_NO_BROWSER])
-  http = httplib2.Http(disable_ssl_certificate_validation=GC_Values[GC_NO_VERIFY_SSL])
+  http = getHttpObj()
   try:
     credentials = oauth2client.tools.run_flow(flow=flow, storage=storage, flags=flags, http=http)
   except httplib2.CertificateValidationUnsupported:
     noPythonSSLExit()
   credentials.user_agent = GAM_INFO
-  http = credentials.authorize(httplib2.Http(disable_ssl_certificate_validation=GC_Values[GC_NO_VERIFY_SSL],
-                                             cache=GC_Values[GC_CACHE_DIR]))
+  http = credentials.authorize(getHttpObj(cache=GC_Values[GC_CACHE_DIR]))
   return (googleapiclient.discovery.build(u'cloudresourcemanager', u'v1', http=http, cache_discovery=False), http)
 
 def doCreateProject():
@@ -7022,7 +8787,7 @@ def doCreateOrUpdateUserSchema(updateCmd):
       sys.exit(3)
   else:
     body = {u'schemaName': schemaKey, u'fields': []}
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'field':
       fieldName = getString(OB_FIELD_NAME)
@@ -7088,8 +8853,8 @@ def doPrintShowUserSchemas(csvFormat):
   if csvFormat:
     todrive = False
     csvRows = []
-    titles = []
-  while CL_argvI < CL_argvLen:
+    titles = CSVTitles([])
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if csvFormat and myarg == u'todrive':
       todrive = True
@@ -7244,7 +9009,7 @@ def getUserAttributes(cd, updateCmd=False, noUid=False):
     need_password = True
   need_to_hash_password = True
   admin_body = {}
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'admin':
       admin_body[u'status'] = getBoolean()
@@ -7286,7 +9051,7 @@ def getUserAttributes(cd, updateCmd=False, noUid=False):
         if checkArgumentPresent(UNSTRUCTURED_FORMATTED_ARGUMENT):
           entry[u'sourceIsStructured'] = False
           entry[u'formatted'] = getString(OB_STRING, minLen=0).replace(u'\\n', u'\n')
-        while CL_argvI < CL_argvLen:
+        while CL.argvI < CL.argvLen:
           argument = getArgument()
           if argument in ADDRESS_ARGUMENT_TO_FIELD_MAP:
             value = getString(OB_STRING, minLen=0)
@@ -7334,7 +9099,7 @@ def getUserAttributes(cd, updateCmd=False, noUid=False):
           clearBodyList(body, up)
           continue
         entry = {}
-        while CL_argvI < CL_argvLen:
+        while CL.argvI < CL.argvLen:
           argument = getArgument()
           if argument == u'type':
             entry[u'type'] = getChoice(ORGANIZATION_TYPES)
@@ -7357,7 +9122,7 @@ def getUserAttributes(cd, updateCmd=False, noUid=False):
           clearBodyList(body, up)
           continue
         entry = {}
-        while CL_argvI < CL_argvLen:
+        while CL.argvI < CL.argvLen:
           argument = getArgument()
           if argument == u'type':
             entry[u'type'] = getChoice(PHONE_TYPES)
@@ -7446,7 +9211,7 @@ def getUserAttributes(cd, updateCmd=False, noUid=False):
       else:
         body[up][schemaName][fieldName] = None
     elif myarg.find(u'.') >= 0:
-      schemaName, fieldName = _splitSchemaNameDotFieldName(CL_argv[CL_argvI-1])
+      schemaName, fieldName = _splitSchemaNameDotFieldName(CL.argv[CL.argvI-1])
       up = u'customSchemas'
       body.setdefault(up, {})
       body[up].setdefault(schemaName, {})
@@ -7549,7 +9314,7 @@ INFO_USER_OPTIONS = [u'noaliases', u'nogroups', u'nolicenses', u'nolicences', u'
 def doInfoUser(user_email=None):
   cd = buildGAPIObject(GAPI_DIRECTORY_API)
   if user_email is None:
-    if CL_argvI < CL_argvLen:
+    if CL.argvI < CL.argvLen:
       user_email = getEmailAddress(optional=True, minLen=0)
     else:
       storage = oauth2client.file.Storage(GC_Values[GC_OAUTH2_TXT])
@@ -7563,7 +9328,7 @@ def doInfoUser(user_email=None):
   fieldsList = []
   customFieldMask = viewType = None
   skus = sorted(GOOGLE_USER_SKUS)
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'noaliases':
       getAliases = False
@@ -7771,6 +9536,11 @@ def doInfoUser(user_email=None):
         print u'   %s <%s>' % (group[u'name'], group[u'email'])
   if getLicenses:
     print u'Licenses:'
+    userSkus = getMappedUserLicenses(user.get(u'primaryEmail', user_email), skus)
+    if userSkus is not None:
+      for skuId in userSkus:
+        print u' %s' % skuId
+      return
     lic = buildGAPIObject(GAPI_LICENSING_API)
     for skuId in skus:
       try:
@@ -7847,13 +9617,33 @@ USERS_ORDERBY_CHOICES_MAP = {
   u'email': u'email',
   }
 
+# With more users than this, print users groups lists the members of every group once rather than the groups of each user
+USER_GROUPS_REVERSE_JOIN_MIN_USERS = 100
+
+# Index the groups of which users are direct members by lowercase user email address; the members of all
+# of the customer's groups are listed, num_threads groups at a time, and each user's groups are in group list order
+def buildUserToGroupsMap(cd):
+  sys.stderr.write(u'Getting all groups in G Suite account (may take some time on a large account)...\n')
+  page_message = u'Got %%total_items%% groups: %%first_item%% - %%last_item%%\n'
+  groupEmails = [group[u'email'] for group in callGAPIpages(cd.groups(), u'list', u'groups', page_message=page_message,
+                                                            message_attribute=u'email', customer=GC_Values[GC_CUSTOMER_ID],
+                                                            fields=u'nextPageToken,groups(email)')]
+  graph = getGroupMembersGraph(groupEmails, False)
+  userGroups = {}
+  for groupEmail in groupEmails:
+    for member in graph.get(groupEmail.lower()) or []:
+      if member.get(u'type') == u'USER' and member.get(u'email'):
+        userGroups.setdefault(member[u'email'].lower(), []).append(groupEmail)
+  return userGroups
+
 def doPrintUsers():
   cd = buildGAPIObject(GAPI_DIRECTORY_API)
   todrive = False
+  outputFormat = u'csv'
   fieldsList = []
   fieldsTitles = {}
-  titles = []
-  csvRows = []
+  titles = CSVTitles([])
+  csvRows = CSVRows()
   addFieldToCSVfile(u'primaryemail', USER_ARGUMENT_TO_PROPERTY_MAP, fieldsList, fieldsTitles, titles)
   customer = GC_Values[GC_CUSTOMER_ID]
   domain = None
@@ -7863,10 +9653,12 @@ def doPrintUsers():
   sortHeaders = getGroupFeed = getLicenseFeed = email_parts = False
   viewType = deleted_only = orderBy = sortOrder = None
   delimiter = GC_Values[GC_CSV_OUTPUT_FIELD_DELIMITER]
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'todrive':
       todrive = True
+    elif myarg == u'format':
+      outputFormat = getChoice(OUTPUT_FORMAT_CHOICES)
     elif myarg == u'domain':
       domain = getString(OB_DOMAIN_NAME).lower()
       customer = None
@@ -7922,43 +9714,78 @@ def doPrintUsers():
       unknownArgumentExit()
   if fieldsList:
     fields = u'nextPageToken,users(%s)' % u','.join(set(fieldsList)).replace(u'.', u'/')
+    wantedFields = set(fieldsList+[u'primaryEmailLocal', u'primaryEmailDomain'])
   else:
-    fields = None
+    fields = wantedFields = None
   sys.stderr.write(u"Getting all users in G Suite account (may take some time on a large account)...\n")
-  page_message = u'Got %%total_items%% users: %%first_item%% - %%last_item%%\n'
-  feed = callGAPIpages(cd.users(), u'list', u'users', page_message=page_message,
-                       message_attribute=u'primaryEmail', customer=customer, domain=domain, fields=fields,
-                       showDeleted=deleted_only, orderBy=orderBy, sortOrder=sortOrder, viewType=viewType,
-                       query=query, projection=projection, customFieldMask=customFieldMask, maxResults=GC_Values[GC_USER_MAX_RESULTS])
-  while feed:
-    user = feed.popleft()
+  partitions = getUserListPartitions()
+  if partitions and not deleted_only and orderBy in [None, u'email']:
+    users = getUsersPartitioned(partitions, query=query, sortOrder=sortOrder,
+                                customer=customer, domain=domain, fields=fields, viewType=viewType,
+                                projection=projection, customFieldMask=customFieldMask, maxResults=GC_Values[GC_USER_MAX_RESULTS])
+  else:
+    page_message = u'Got %%total_items%% users: %%first_item%% - %%last_item%%\n'
+    users = yieldGAPIpages(cd.users(), u'list', u'users', page_message=page_message,
+                           message_attribute=u'primaryEmail', customer=customer, domain=domain, fields=fields,
+                           showDeleted=deleted_only, orderBy=orderBy, sortOrder=sortOrder, viewType=viewType,
+                           query=query, projection=projection, customFieldMask=customFieldMask, maxResults=GC_Values[GC_USER_MAX_RESULTS],
+                           prefetch=GC_Values[GC_PREFETCH_PAGES])
+  if outputFormat == u'jsonl':
+    jsonLines = JSONLinesWriter(u'Users', todrive)
+    if getLicenseFeed:
+      userLicenses = buildUserToLicensesMap()
+  else:
+    jsonLines = None
+  userGroups = None
+  i = 0
+  for user in users:
+    i += 1
     if email_parts and (u'primaryEmail' in user):
       userEmail = user[u'primaryEmail']
       if userEmail.find(u'@') != -1:
         user[u'primaryEmailLocal'], user[u'primaryEmailDomain'] = splitEmailAddress(userEmail)
-    addRowTitlesToCSVfile(flattenJSON(user), csvRows, titles)
+    if jsonLines:
+      if getGroupFeed:
+        # The number of users is not known in advance, switch to the groups index once there are enough of them;
+        # the users are still being listed, so the groups are listed over connections of their own
+        if userGroups is None and i > USER_GROUPS_REVERSE_JOIN_MIN_USERS:
+          userGroups = buildUserToGroupsMap(getServiceWithOwnConnections(cd))
+        if userGroups is not None:
+          user[u'Groups'] = userGroups.get(user[u'primaryEmail'].lower(), [])
+        else:
+          sys.stderr.write(u'Getting Group Membership for %s\n' % user[u'primaryEmail'])
+          user[u'Groups'] = [groupname[u'email'] for groupname in callGAPIpages(cd.groups(), u'list', u'groups', userKey=user[u'primaryEmail'])]
+      if getLicenseFeed:
+        user[u'Licenses'] = [u_license[u'skuId'] for u_license in userLicenses.get(user[u'primaryEmail'].lower(), [])]
+      jsonLines.write(user)
+      continue
+    addRowTitlesToCSVfile(flattenJSON(user, wantedFields=wantedFields), csvRows, titles)
+  if jsonLines:
+    jsonLines.close()
+    return
   if sortHeaders:
     sortCSVTitles([u'primaryEmail',], titles)
   if getGroupFeed:
     titles.append(u'Groups')
     i = 0
     count = len(csvRows)
-    for user in csvRows:
-      i += 1
-      userEmail = user[u'primaryEmail']
-      sys.stderr.write(u"Getting Group Membership for %s%s" % (userEmail, currentCountNL(i, count)))
-      groups = callGAPIpages(cd.groups(), u'list', u'groups', userKey=userEmail)
-      user[u'Groups'] = delimiter.join([groupname[u'email'] for groupname in groups])
+    if count > USER_GROUPS_REVERSE_JOIN_MIN_USERS:
+      userGroups = buildUserToGroupsMap(cd)
+      for user in csvRows.rewrite():
+        user[u'Groups'] = delimiter.join(userGroups.get(user[u'primaryEmail'].lower(), []))
+    else:
+      for user in csvRows.rewrite():
+        i += 1
+        userEmail = user[u'primaryEmail']
+        sys.stderr.write(u"Getting Group Membership for %s%s" % (userEmail, currentCountNL(i, count)))
+        groups = callGAPIpages(cd.groups(), u'list', u'groups', userKey=userEmail)
+        user[u'Groups'] = delimiter.join([groupname[u'email'] for groupname in groups])
   if getLicenseFeed:
     titles.append(u'Licenses')
-    licenses = doPrintLicenses(return_list=True)
-    if len(licenses) > 1:
-      for user in csvRows:
-        user_licenses = []
-        for u_license in licenses:
-          if u_license[u'userId'].lower() == user[u'primaryEmail'].lower():
-            user_licenses.append(u_license[u'skuId'])
-        user[u'Licenses'] = delimiter.join(user_licenses)
+    userLicenses = buildUserToLicensesMap()
+    if userLicenses:
+      for user in csvRows.rewrite():
+        user[u'Licenses'] = delimiter.join([u_license[u'skuId'] for u_license in userLicenses.get(user[u'primaryEmail'].lower(), [])])
   writeCSVfile(csvRows, titles, u'Users', todrive)
 
 SITEVERIFICATION_SITE_TYPE_INET_DOMAIN = u'INET_DOMAIN'
@@ -8129,7 +9956,7 @@ def doDeleteGuardian():
   invitationsOnly = False
   guardianId = normalizeStudentGuardianEmailAddressOrUID(getString(OB_GUARDIAN_ITEM))
   studentId = normalizeStudentGuardianEmailAddressOrUID(getString(OB_STUDENT_ITEM))
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg in [u'invitation', u'invitations']:
       invitationsOnly = True
@@ -8174,8 +10001,8 @@ def doPrintShowGuardians(csvFormat):
   if csvFormat:
     todrive = False
     csvRows = []
-    titles = [u'studentEmail', u'studentId', u'invitedEmailAddress', u'guardianId']
-  while CL_argvI < CL_argvLen:
+    titles = CSVTitles([u'studentEmail', u'studentId', u'invitedEmailAddress', u'guardianId'])
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if csvFormat and myarg == u'todrive':
       todrive = True
@@ -8187,7 +10014,7 @@ def doPrintShowGuardians(csvFormat):
       service = croom.userProfiles().guardianInvitations()
       items = u'guardianInvitations'
       itemName = 'Guardian Invitations'
-      titles = [u'studentEmail', u'studentId', u'invitedEmailAddress', u'invitationId']
+      titles = CSVTitles([u'studentEmail', u'studentId', u'invitedEmailAddress', u'invitationId'])
       if states is None:
         states = GUARDIAN_STATES
     elif myarg == u'states':
@@ -8253,7 +10080,7 @@ def getCourseAttribute(myarg, body):
 def doCreateCourse():
   croom = buildGAPIObject(GAPI_CLASSROOM_API)
   body = {u'ownerId': u'me', u'name': u'Unknown Course'}
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg in [u'alias', u'id']:
       body[u'id'] = getCourseAlias()
@@ -8268,7 +10095,7 @@ def doUpdateCourse():
   croom = buildGAPIObject(GAPI_CLASSROOM_API)
   courseId = getCourseId()
   body = {}
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     getCourseAttribute(myarg, body)
   updateMask = u','.join(body.keys())
@@ -8344,14 +10171,14 @@ def doPrintCourses():
 
   croom = buildGAPIObject(GAPI_CLASSROOM_API)
   todrive = False
-  titles = [u'id',]
+  titles = CSVTitles([u'id',])
   csvRows = []
   teacherId = None
   studentId = None
   showAliases = False
   delimiter = GC_Values[GC_CSV_OUTPUT_FIELD_DELIMITER]
   showMembers = u''
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'teacher':
       teacherId = getEmailAddress()
@@ -8482,13 +10309,13 @@ def doCourseSyncParticipants(courseId):
 def doPrintCourseParticipants():
   croom = buildGAPIObject(GAPI_CLASSROOM_API)
   todrive = False
-  titles = [u'courseId',]
+  titles = CSVTitles([u'courseId',])
   csvRows = []
   courses = []
   teacherId = None
   studentId = None
   showMembers = u'all'
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg in [u'course', u'class']:
       courses.append(getCourseId())
@@ -8644,7 +10471,7 @@ def doUpdatePrinter():
   cp = buildGAPIObject(GAPI_CLOUDPRINT_API)
   printerId = getString(OB_PRINTER_ID)
   kwargs = {}
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getChoice(PRINTER_UPDATE_ITEMS_CHOICES_MAP, mapChoice=True)
     if myarg in [u'isTosAccepted', u'public', u'quotaEnabled']:
       value = getBoolean()
@@ -8668,7 +10495,7 @@ def doInfoPrinter():
   cp = buildGAPIObject(GAPI_CLOUDPRINT_API)
   printerId = getString(OB_PRINTER_ID)
   everything = False
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'everything':
       everything = True
@@ -8689,14 +10516,14 @@ def doInfoPrinter():
 def doPrintPrinters():
   cp = buildGAPIObject(GAPI_CLOUDPRINT_API)
   todrive = False
-  titles = [u'id',]
+  titles = CSVTitles([u'id',])
   csvRows = []
   query = None
   printer_type = None
   connection_status = None
   extra_fields = None
   delimiter = GC_Values[GC_CSV_OUTPUT_FIELD_DELIMITER]
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'query':
       query = getString(OB_QUERY)
@@ -8873,7 +10700,7 @@ def doPrintJobFetch(printerId):
   if printerId == u'any':
     printerId = None
   parameters = initPrintjobListParameters()
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     getPrintjobListParameters(myarg, parameters)
   if parameters[u'sortorder'] and (parameters[u'ascDesc'] == u'DESCENDING'):
@@ -8923,12 +10750,12 @@ def doPrintJobFetch(printerId):
 def doPrintPrintJobs():
   cp = buildGAPIObject(GAPI_CLOUDPRINT_API)
   todrive = False
-  titles = [u'printerid', u'id']
+  titles = CSVTitles([u'printerid', u'id'])
   csvRows = []
   printerid = None
   parameters = initPrintjobListParameters()
   delimiter = GC_Values[GC_CSV_OUTPUT_FIELD_DELIMITER]
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'todrive':
       todrive = True
@@ -8980,7 +10807,7 @@ def doPrintJobSubmit(printerId):
                  u'title': content,
                  u'ticket': u'{"version": "1.0"}',
                  u'tags': [u'GAM', GAM_URL]}
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'tag':
       form_fields[u'tags'].append(getString(OB_STRING))
@@ -9112,7 +10939,7 @@ CALENDAR_NOTIFICATION_TYPES_MAP = {
 
 def getCalendarAttributes(body):
   colorRgbFormat = False
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'selected':
       body[u'selected'] = getBoolean()
@@ -9221,9 +11048,9 @@ def infoCalendar(users):
 def printShowCalendars(users, csvFormat):
   if csvFormat:
     todrive = False
-    titles = []
+    titles = CSVTitles([])
     csvRows = []
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if csvFormat and myarg == u'todrive':
       todrive = True
@@ -9277,7 +11104,7 @@ def updateCalendarAttendees(users):
   do_it = True
   allevents = False
   start_date = end_date = None
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'csv':
       csv_file = getString(OB_FILE_NAME)
@@ -9356,7 +11183,7 @@ def transferSecCals(users):
   target_user = getEmailAddress()
   addBody = {u'role': u'owner', u'scope': {u'type': u'user', u'value': target_user}}
   remove_source_user = True
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'keepuser':
       remove_source_user = False
@@ -9564,9 +11391,9 @@ def printDriveActivity(users):
   drive_ancestorId = u'root'
   drive_fileId = None
   todrive = False
-  titles = [u'user.name', u'user.permissionId', u'target.id', u'target.name', u'target.mimeType']
+  titles = CSVTitles([u'user.name', u'user.permissionId', u'target.id', u'target.name', u'target.mimeType'])
   csvRows = []
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'fileid':
       drive_fileId = getString(OB_DRIVE_FILE_ID)
@@ -9593,7 +11420,7 @@ def printDriveActivity(users):
 
 def printDriveSettings(users):
   todrive = False
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'todrive':
       todrive = True
@@ -9601,7 +11428,7 @@ def printDriveSettings(users):
       unknownArgumentExit()
   dont_show = [u'kind', u'selfLink', u'exportFormats', u'importFormats', u'maxUploadSizes', u'additionalRoleInfo', u'etag', u'features', u'user', u'isCurrentAppInstalled']
   csvRows = []
-  titles = [u'email',]
+  titles = CSVTitles([u'email',])
   i = 0
   count = len(users)
   for user in users:
@@ -9762,7 +11589,7 @@ def showDriveFileInfo(users):
   skip_objects = []
   fileIdSelection = getDriveFileEntity()
   body, parameters = initializeDriveFileAttributes()
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'filepath':
       filepath = True
@@ -9970,13 +11797,13 @@ def printDriveFileList(users):
   labelsList = []
   orderByList = []
   skip_objects = [u'printed',]
-  titles = [u'Owner',]
-  csvRows = []
+  titles = CSVTitles([u'Owner',])
+  csvRows = CSVRows()
   query = ME_IN_OWNERS
   fileIdSelection = None
   body, parameters = initializeDriveFileAttributes()
   delimiter = GC_Values[GC_CSV_OUTPUT_FIELD_DELIMITER]
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'todrive':
       todrive = True
@@ -10049,13 +11876,13 @@ def printDriveFileList(users):
     try:
       sys.stderr.write(u'Getting all files for %s%s' % (user, currentCountNL(i, count)))
       page_message = u' got %%%%total_items%%%% files for %s...\n' % user
-      feed = callGAPIpages(drive.files(), u'list', DRIVE_FILES_LIST,
-                           page_message=page_message,
-                           throw_reasons=GAPI_DRIVE_THROW_REASONS+[GAPI_INVALID_QUERY, GAPI_FILE_NOT_FOUND],
-                           q=query, orderBy=orderBy, fields=fields, maxResults=GC_Values[GC_DRIVE_MAX_RESULTS])
+      feed = yieldGAPIpages(drive.files(), u'list', DRIVE_FILES_LIST,
+                            page_message=page_message,
+                            throw_reasons=GAPI_DRIVE_THROW_REASONS+[GAPI_INVALID_QUERY, GAPI_FILE_NOT_FOUND],
+                            q=query, orderBy=orderBy, fields=fields, maxResults=GC_Values[GC_DRIVE_MAX_RESULTS])
       if fileIdSelection is None:
-        while feed:
-          _printFileInfo(feed.popleft())
+        for f_file in feed:
+          _printFileInfo(f_file)
       else:
         user, drive, _ = validateUserGetFileIDs(user, i, count, fileIdSelection, body, parameters, drive=drive)
         for fileId in fileIdSelection[u'fileIds']:
@@ -10069,7 +11896,7 @@ def printDriveFileList(users):
       entityServiceNotApplicableWarning(u'User', user, i, count)
   if allfields:
     sortCSVTitles([u'Owner', u'id', DRIVE_FILE_NAME], titles)
-  writeCSVfile(csvRows, titles, u'%s %s Drive Files' % (CL_argv[1], CL_argv[2]), todrive)
+  writeCSVfile(csvRows, titles, u'%s %s Drive Files' % (CL.argv[1], CL.argv[2]), todrive)
 
 def showDriveFilePath(users):
   fileIdSelection = getDriveFileEntity()
@@ -10122,7 +11949,7 @@ def showDriveFileTree(users):
   fileIdSelection = None
   body, parameters = initializeDriveFileAttributes()
   orderByList = []
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'anyowner':
       anyowner = True
@@ -10184,7 +12011,7 @@ def showDriveFileTree(users):
 def addDriveFile(users):
   media_body = None
   body, parameters = initializeDriveFileAttributes()
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'drivefilename':
       body[DRIVE_FILE_NAME] = getString(OB_DRIVE_FOLDER_NAME)
@@ -10216,7 +12043,7 @@ def doUpdateDriveFile(users):
   operation = u'update'
   fileIdSelection = getDriveFileEntity()
   body, parameters = initializeDriveFileAttributes()
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'copy':
       operation = u'copy'
@@ -10265,7 +12092,7 @@ def deleteDriveFile(users):
   fileIdSelection = getDriveFileEntity()
   body, parameters = initializeDriveFileAttributes()
   function = u'trash'
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'purge':
       function = u'delete'
@@ -10328,7 +12155,7 @@ def getDriveFile(users):
   exportFormats = DOCUMENT_FORMATS_MAP[exportFormatName]
   targetFolder = GC_Values[GC_DRIVE_DIR]
   safe_filename_chars = "-_.() %s%s" % (string.ascii_letters, string.digits)
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'format':
       exportFormatChoices = getString(OB_FORMAT_LIST).replace(u',', u' ').lower().split()
@@ -10401,7 +12228,7 @@ def getDriveFile(users):
 def transferDriveFiles(users):
   target_user = getEmailAddress()
   remove_source_user = True
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'keepuser':
       remove_source_user = False
@@ -10578,7 +12405,7 @@ def addDriveFileACL(users):
     permissionId = body[u'value']
   else:
     permissionId = u'anyone'
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'withlink':
       body[u'withLink'] = True
@@ -10621,7 +12448,7 @@ def updateDriveFileACL(users):
   body, parameters = initializeDriveFileAttributes()
   isEmail, permissionId = getPermissionId()
   removeExpiration = transferOwnership = None
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'withlink':
       body[u'withLink'] = True
@@ -10772,7 +12599,7 @@ def addUserToGroups(users):
 
 def deleteUserFromGroups(users):
   cd = buildGAPIObject(GAPI_DIRECTORY_API)
-  if CL_argvI < CL_argvLen:
+  if CL.argvI < CL.argvLen:
     groupList = [normalizeEmailAddressOrUID(group) for group in getStringReturnInList(OB_GROUP_ENTITY)]
     jcount = len(groupList)
     checkForExtraneousArguments()
@@ -10873,7 +12700,7 @@ def getPhoto(users):
   cd = buildGAPIObject(GAPI_DIRECTORY_API)
   targetFolder = os.getcwd()
   showPhotoData = True
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'drivedir':
       targetFolder = GC_Values[GC_DRIVE_DIR]
@@ -10973,11 +12800,11 @@ def printShowTokens(entityType, users, csvFormat):
   cd = buildGAPIObject(GAPI_DIRECTORY_API)
   if csvFormat:
     todrive = False
-    titles = [u'user', u'clientId', u'displayText', u'anonymous', u'nativeApp', u'userKey', u'scopes']
+    titles = CSVTitles([u'user', u'clientId', u'displayText', u'anonymous', u'nativeApp', u'userKey', u'scopes'])
     csvRows = []
   clientId = None
   delimiter = GC_Values[GC_CSV_OUTPUT_FIELD_DELIMITER]
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if csvFormat and myarg == u'todrive':
       todrive = True
@@ -11070,9 +12897,9 @@ def deprovisionUser(users):
 def printShowGmailProfile(users, csvFormat):
   if csvFormat:
     todrive = False
-    titles = []
+    titles = CSVTitles([])
     csvRows = []
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if csvFormat and myarg == u'todrive':
       todrive = True
@@ -11190,9 +13017,9 @@ def _showGplusProfile(user, i, count, result):
 def printShowGplusProfile(users, csvFormat):
   if csvFormat:
     todrive = False
-    titles = []
+    titles = CSVTitles([])
     csvRows = []
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if csvFormat and myarg == u'todrive':
       todrive = True
@@ -11257,7 +13084,7 @@ LABEL_MESSAGE_LIST_VISIBILITY_CHOICES = [u'hide', u'show',]
 def addLabel(users):
   label = getString(OB_LABEL_NAME)
   body = {u'name': label}
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'labellistvisibility':
       body[u'labelListVisibility'] = getChoice(LABEL_LABEL_LIST_VISIBILITY_CHOICES_MAP, mapChoice=True)
@@ -11279,7 +13106,7 @@ def updateLabelSettings(users):
   label_name = getString(OB_LABEL_NAME)
   label_name_lower = label_name.lower()
   body = {}
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'name':
       body[u'name'] = getString(OB_STRING)
@@ -11311,7 +13138,7 @@ def updateLabels(users):
   search = u'^Inbox/(.*)$'
   replace = u'%s'
   merge = False
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'search':
       search = getString(OB_RE_PATTERN)
@@ -11418,7 +13245,7 @@ def deleteLabel(users):
 
 def showLabels(users):
   onlyUser = showCounts = False
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'onlyuser':
       onlyUser = True
@@ -11504,7 +13331,7 @@ def processMessages(users, function):
   doIt = False
   maxToProcess = 1
   body = {}
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'query':
       query = getString(OB_QUERY)
@@ -11628,10 +13455,10 @@ def printShowDelegates(users, csvFormat):
   if csvFormat:
     todrive = False
     csvRows = []
-    titles = [u'User', u'delegateName', u'delegateAddress', u'delegationStatus']
+    titles = CSVTitles([u'User', u'delegateName', u'delegateAddress', u'delegationStatus'])
   else:
     csvStyle = False
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if not csvFormat and myarg == u'csv':
       csvStyle = True
@@ -11773,7 +13600,7 @@ def addFilter(users):
   addLabelName = None
   addLabelIds = []
   removeLabelIds = []
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg in FILTER_CRITERIA_CHOICES_MAP:
       myarg = FILTER_CRITERIA_CHOICES_MAP[myarg]
@@ -11869,8 +13696,8 @@ def printShowFilters(users, csvFormat):
   if csvFormat:
     todrive = False
     csvRows = []
-    titles = [u'User', u'id']
-  while CL_argvI < CL_argvLen:
+    titles = CSVTitles([u'User', u'id'])
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if csvFormat and myarg == u'todrive':
       todrive = True
@@ -11946,14 +13773,14 @@ def setForward(users):
   enable = getBoolean()
   body = {u'enabled': enable}
   if enable:
-    while CL_argvI < CL_argvLen:
+    while CL.argvI < CL.argvLen:
       myarg = getArgument()
       if myarg in EMAILSETTINGS_FORWARD_POP_ACTION_CHOICES_MAP:
         body[u'disposition'] = EMAILSETTINGS_FORWARD_POP_ACTION_CHOICES_MAP[myarg]
       elif myarg == u'confirm':
         pass
       elif myarg.find(u'@') != -1:
-        body[u'emailAddress'] = normalizeEmailAddressOrUID(CL_argv[CL_argvI-1])
+        body[u'emailAddress'] = normalizeEmailAddressOrUID(CL.argv[CL.argvI-1])
       else:
         unknownArgumentExit()
     if not body.get(u'disposition'):
@@ -12006,8 +13833,8 @@ def printShowForward(users, csvFormat):
   if csvFormat:
     todrive = False
     csvRows = []
-    titles = [u'User', u'forwardEnabled', u'forwardTo', u'disposition']
-  while CL_argvI < CL_argvLen:
+    titles = CSVTitles([u'User', u'forwardEnabled', u'forwardTo', u'disposition'])
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if csvFormat and myarg == u'todrive':
       todrive = True
@@ -12082,8 +13909,8 @@ def printShowForwardingAddresses(users, csvFormat):
   if csvFormat:
     todrive = False
     csvRows = []
-    titles = [u'User', u'forwardingEmail', u'verificationStatus']
-  while CL_argvI < CL_argvLen:
+    titles = CSVTitles([u'User', u'forwardingEmail', u'verificationStatus'])
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if csvFormat and myarg == u'todrive':
       todrive = True
@@ -12128,7 +13955,7 @@ EMAILSETTINGS_IMAP_MAX_FOLDER_SIZE_CHOICES = [u'0', u'1000', u'2000', u'5000', u
 def setImap(users):
   enable = getBoolean()
   body = {u'enabled': enable, u'autoExpunge': True, u'expungeBehavior': u'archive', u'maxFolderSize': 0}
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'noautoexpunge':
       body[u'autoExpunge'] = False
@@ -12188,7 +14015,7 @@ EMAILSETTINGS_FORWARD_POP_ACTION_CHOICES_MAP = {
 def setPop(users):
   enable = getBoolean()
   body = {u'accessWindow': [u'disabled', u'allMail'][enable], u'disposition': u'leaveInInbox'}
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'for':
       body[u'accessWindow'] = getChoice(EMAILSETTINGS_POP_ENABLE_FOR_CHOICES_MAP, mapChoice=True)
@@ -12333,7 +14160,7 @@ def addUpdateSendAs(users, addCmd):
   signature = None
   tagReplacements = {}
   html = False
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg in [u'signature', u'sig']:
       if checkArgumentPresent(FILE_ARGUMENT):
@@ -12381,7 +14208,7 @@ def deleteSendAs(users):
 def infoSendAs(users):
   emailAddress = getEmailAddress()
   formatSig = False
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'format':
       formatSig = True
@@ -12404,10 +14231,10 @@ def infoSendAs(users):
 def printShowSendAs(users, csvFormat):
   if csvFormat:
     todrive = False
-    titles = [u'User', u'displayName', u'sendAsEmail', u'replyToAddress', u'isPrimary', u'isDefault', u'treatAsAlias', u'verificationStatus']
+    titles = CSVTitles([u'User', u'displayName', u'sendAsEmail', u'replyToAddress', u'isPrimary', u'isDefault', u'treatAsAlias', u'verificationStatus'])
     csvRows = []
   formatSig = False
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if csvFormat and myarg == u'todrive':
       todrive = True
@@ -12469,7 +14296,7 @@ def setSignature(users):
     signature = getString(OB_STRING, minLen=0)
   body = {}
   html = primary = False
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'primary':
       primary = True
@@ -12505,7 +14332,7 @@ def setSignature(users):
 
 def showSignature(users):
   formatSig = primary = False
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'primary':
       primary = True
@@ -12569,7 +14396,7 @@ def setVacation(users):
     responseBodyType = u'responseBodyPlainText'
     message = None
     tagReplacements = {}
-    while CL_argvI < CL_argvLen:
+    while CL.argvI < CL.argvLen:
       myarg = getArgument()
       if myarg == u'subject':
         body[u'responseSubject'] = getString(OB_STRING, checkBlank=True)
@@ -12619,7 +14446,7 @@ def setVacation(users):
 
 def showVacation(users):
   formatReply = False
-  while CL_argvI < CL_argvLen:
+  while CL.argvI < CL.argvLen:
     myarg = getArgument()
     if myarg == u'format':
       formatReply = True
@@ -12680,18 +14507,36 @@ def resetDefaultEncodingToUTF8():
     if hasattr(sys, u'setdefaultencoding'):
       sys.setdefaultencoding(u'UTF-8')
 
+# Always return so that run_batch's pool callback releases the concurrency held by this command
 def ProcessGAMCommandNoQueue(args):
   resetDefaultEncodingToUTF8()
-  ProcessGAMCommand(args)
+  try:
+    return ProcessGAMCommand(args)
+  except SystemExit as e:
+    return e.code
+  except Exception as e:
+    stderrErrorMsg(u'{0}: {1}'.format(makeQuotedList(args), e))
+    return GM_Globals[GM_SYSEXITRC]
+  # The output is written when the command finishes, not when the worker exits, as run_batch may terminate the worker
+  finally:
+    sys.stdout.flush()
+    sys.stderr.flush()
 
 # Process GAM command
 def ProcessGAMCommand(args):
   setSysExitRC(0)
+  GM_Globals[GM_SVCACCT_TOKEN_WARMUP] = None
+  GM_Globals[GM_MAP_USER_TO_LICENSES] = None
+  GM_Globals[GM_UID_CACHE] = {}
   initializeArguments(args)
   try:
-    if not SetGlobalVariables():
+    if GM_Globals[GM_BATCH_THREAD]:
+      if checkArgumentPresent([u'config',]):
+        putArgumentBack()
+        usageErrorExit(MESSAGE_CONFIG_BATCH_MODE_THREADS_INCOMPATIBLE)
+    elif not SetGlobalVariables():
       sys.exit(GM_Globals[GM_SYSEXITRC])
-    if CL_argvI == CL_argvLen:
+    if CL.argvI == CL.argvLen:
       showUsage()
       sys.exit(GM_Globals[GM_SYSEXITRC])
     command = getArgument()
@@ -12704,6 +14549,9 @@ def ProcessGAMCommand(args):
     if command == u'version':
       doVersion()
       sys.exit(GM_Globals[GM_SYSEXITRC])
+    if command == u'serve':
+      doServe()
+      sys.exit(GM_Globals[GM_SYSEXITRC])
     if command == u'create':
       argument = getArgument()
       if argument == u'user':
@@ -13027,6 +14875,13 @@ def ProcessGAMCommand(args):
     if command == u'report':
       showReport()
       sys.exit(GM_Globals[GM_SYSEXITRC])
+    if command == u'refresh':
+      argument = getArgument()
+      if argument == u'index':
+        doRefreshIndex()
+      else:
+        unknownArgumentExit()
+      sys.exit(GM_Globals[GM_SYSEXITRC])
     if command == u'whatis':
       doWhatIs()
       sys.exit(GM_Globals[GM_SYSEXITRC])
@@ -13044,8 +14899,10 @@ def ProcessGAMCommand(args):
       sys.exit(GM_Globals[GM_SYSEXITRC])
     putArgumentBack()
     users = getUsersToModify(getChoice(usergroup_types), getString(OB_ENTITY))
+    resolveUserUIDs(users)
+    setSvcAcctTokenWarmupUsers(users)
     command = getArgument()
-    if command == u'print' and CL_argvI == CL_argvLen:
+    if command == u'print' and CL.argvI == CL.argvLen:
       for user in users:
         print user
       sys.exit(GM_Globals[GM_SYSEXITRC])
@@ -13149,7 +15006,7 @@ def ProcessGAMCommand(args):
         unknownArgumentExit()
       sys.exit(GM_Globals[GM_SYSEXITRC])
     if (GC_Values[GC_AUTO_BATCH_MIN] > 0) and (len(users) > GC_Values[GC_AUTO_BATCH_MIN]):
-      run_batch([[u'gam', u'user', user]+CL_argv[CL_argvI-1:] for user in users])
+      run_batch([[u'gam', u'user', user]+CL.argv[CL.argvI-1:] for user in users])
       sys.exit(GM_Globals[GM_SYSEXITRC])
     if command == u'transfer':
       transferWhat = getArgument()
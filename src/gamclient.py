@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# GAM
+#
+# Copyright 2015, LLC All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+u"""Thin client for gam serve.
+
+Forwards its arguments to a running gam serve and writes the command's output and return code
+as if gam itself had been run: gamclient.py print users is the same as gam print users.
+"""
+
+__author__ = u'Ross Scroggs <ross.scroggs@gmail.com>'
+__license__ = u'Apache License 2.0 (http://www.apache.org/licenses/LICENSE-2.0)'
+
+import json
+import os
+import socket
+import sys
+
+# Return codes match gam.py
+SOCKET_ERROR_RC = 3
+
+# The socket is located the same way that gam.py locates serve_socket
+def getSocketFile():
+  socketFile = os.path.expanduser(os.environ.get(u'GAM_SERVE_SOCKET', u'gam.sock'))
+  if not os.path.isabs(socketFile):
+    configDir = os.path.expanduser(os.environ.get(u'GAMUSERCONFIGDIR', u''))
+    if (not configDir) or (not os.path.isabs(configDir)):
+      configDir = os.path.join(os.path.dirname(os.path.realpath(__file__)), configDir)
+    socketFile = os.path.join(configDir, socketFile)
+  return socketFile
+
+def writeStream(stream, data):
+  if sys.version_info[0] == 2:
+    stream.write(data.encode(u'utf-8'))
+  else:
+    stream.write(data)
+
+def main(argv):
+  socketFile = getSocketFile()
+  if sys.version_info[0] == 2:
+    argv = [arg.decode(sys.getfilesystemencoding() or u'utf-8') for arg in argv]
+  client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  try:
+    client.connect(socketFile)
+    client.sendall((json.dumps({u'argv': [u'gam']+argv})+u'\n').encode(u'utf-8'))
+    rc = SOCKET_ERROR_RC
+    for line in client.makefile(u'rb'):
+      frame = json.loads(line.decode(u'utf-8'))
+      if u'stdout' in frame:
+        writeStream(sys.stdout, frame[u'stdout'])
+      elif u'stderr' in frame:
+        writeStream(sys.stderr, frame[u'stderr'])
+      elif u'rc' in frame:
+        rc = frame[u'rc']
+    sys.stdout.flush()
+    return rc if rc is not None else 0
+  except socket.error as e:
+    sys.stderr.write(u'\nERROR: gam serve {0}: {1}\n'.format(socketFile, e))
+    return SOCKET_ERROR_RC
+  finally:
+    client.close()
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv[1:]))
@@ -125,6 +125,11 @@ class RsaVerifier(object):
         return cls(pubkey)
 
 
+# Parsed private keys, by PEM string, so that each key is decoded once per
+# process however many signers are created from it.
+_PRIVATE_KEYS = {}
+
+
 class RsaSigner(object):
     """Signs messages with a private key.
 
@@ -164,6 +169,9 @@ class RsaSigner(object):
             PEM format.
         """
         key = _helpers._from_bytes(key)  # pem expects str in Py3
+        pkey = _PRIVATE_KEYS.get(key)
+        if pkey is not None:
+            return cls(pkey)
         marker_id, key_bytes = pem.readPemBlocksFromFile(
             six.StringIO(key), _PKCS1_MARKER, _PKCS8_MARKER)
 
@@ -181,4 +189,5 @@ class RsaSigner(object):
         else:
             raise ValueError('No key could be detected.')
 
+        _PRIVATE_KEYS[key] = pkey
         return cls(pkey)
@@ -55,3 +55,22 @@ def decrypt_int(cyphertext, dkey, n):
 
     message = pow(cyphertext, dkey, n)
     return message
+
+
+def decrypt_int_crt(cyphertext, p, q, exp1, exp2, coef):
+    """Decrypts a cypher text using the Chinese Remainder Theorem.
+
+    Gives the same result as decrypt_int(cyphertext, d, p * q) when
+    exp1 = d mod (p - 1), exp2 = d mod (q - 1) and coef = q^-1 mod p, but
+    exponentiates modulo the half-size primes, which is about four times
+    faster.
+    """
+
+    assert_int(cyphertext, 'cyphertext')
+    assert_int(p, 'p')
+    assert_int(q, 'q')
+
+    m1 = pow(cyphertext, exp1, p)
+    m2 = pow(cyphertext, exp2, q)
+    h = (coef * (m1 - m2)) % p
+    return m2 + h * q
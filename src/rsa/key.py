@@ -395,7 +395,7 @@ class PrivateKey(AbstractKey):
 
         blind_r = rsa.randnum.randint(self.n - 1)
         blinded = self.blind(encrypted, blind_r)  # blind before decrypting
-        decrypted = rsa.core.decrypt_int(blinded, self.d, self.n)
+        decrypted = self._private_exponentiation(blinded)
 
         return self.unblind(decrypted, blind_r)
 
@@ -411,9 +411,29 @@ class PrivateKey(AbstractKey):
 
         blind_r = rsa.randnum.randint(self.n - 1)
         blinded = self.blind(message, blind_r)  # blind before encrypting
-        encrypted = rsa.core.encrypt_int(blinded, self.d, self.n)
+        encrypted = self._private_exponentiation(blinded)
         return self.unblind(encrypted, blind_r)
 
+    def _private_exponentiation(self, value):
+        """Raises the value to the power d modulo n, using the CRT parameters.
+
+        The result is checked with the public exponent, as a CRT result that
+        was corrupted by a fault would reveal the factors of n; the plain
+        exponentiation with d is used when the check fails.
+
+        :param value: the (blinded) value, 0 <= value < n
+        :type value: int
+
+        :returns: value ** d % n
+        :rtype: int
+        """
+
+        result = rsa.core.decrypt_int_crt(value, self.p, self.q,
+                                          self.exp1, self.exp2, self.coef)
+        if rsa.core.encrypt_int(result, self.e, self.n) != value:
+            result = rsa.core.decrypt_int(value, self.d, self.n)
+        return result
+
     @classmethod
     def _load_pkcs1_der(cls, keyfile):
         """Loads a key in PKCS#1 DER format.